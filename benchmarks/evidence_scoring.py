@@ -0,0 +1,143 @@
+"""
+Replays the evidence of a slips db through the old from-scratch accumulated
+threat level computation of EvidenceProcess and through AccumulatedThreatLevels,
+makes sure both generate the same alerts, and compares their speed.
+
+Usage, from the root of the repo:
+    python3 -m benchmarks.evidence_scoring [redis_port]
+
+the db on the given port (32850 by default) should have the evidence of an
+analysis, for example the evidence of one of the integration datasets:
+    ./slips.py -f dataset/test7-malicious.pcap -s
+    ./slips.py -d output/test7-malicious/<saved db>.rdb
+"""
+import json
+import sys
+import time
+
+import redis
+
+from slips_files.common.config_parser import ConfigParser
+from slips_files.common.slips_utils import utils
+from slips_files.core.accumulated_threat_levels import AccumulatedThreatLevels
+
+DEFAULT_PORT = 32850
+# replay the evidence of each tw this many times to get measurable times
+ROUNDS = 20
+
+
+def is_evidence_done_by_profile(evidence: dict) -> bool:
+    return evidence.get('attacker_direction', '') in ('srcip', 'sport', 'srcport')
+
+
+def read_evidence(db) -> dict:
+    """
+    returns the evidence of every tw in the db
+    {(profileid, twid): [(evidence ID, serialized evidence)]} sorted by the time they were added
+    """
+    all_evidence = {}
+    for profileid in db.smembers('profiles'):
+        for twid in db.zrange(f'tws{profileid}', 0, -1):
+            evidence_key = f'{profileid}_{twid}_evidence'
+            if IDs := db.zrange(f'{evidence_key}_order', 0, -1):
+                evidence = list(zip(IDs, db.hmget(evidence_key, IDs)))
+            elif legacy_evidence := db.hget(f'{profileid}_{twid}', 'Evidence'):
+                # dbs saved by older versions of slips
+                evidence = list(json.loads(legacy_evidence).items())
+            else:
+                continue
+            all_evidence[(profileid, twid)] = [
+                (ID, evidence_details) for ID, evidence_details in evidence if evidence_details
+            ]
+    return all_evidence
+
+
+def replay_from_scratch(tw_evidence: list, threshold: float) -> list:
+    """
+    how EvidenceProcess used to decide: on every evidence, reload all the evidence
+    of the tw, drop the alerted ones and the ones done by others, and sum the rest
+    returns the IDs of the evidence of each alert
+    """
+    alerts = []
+    alerted = set()
+    for received in range(1, len(tw_evidence) + 1):
+        pending = {}
+        for ID, evidence_details in tw_evidence[:received]:
+            evidence = json.loads(evidence_details)
+            if ID not in alerted and is_evidence_done_by_profile(evidence):
+                pending[ID] = evidence
+        if not pending:
+            continue
+
+        accumulated_threat_level = 0.0
+        for evidence in pending.values():
+            accumulated_threat_level += utils.get_weighted_threat_level(evidence)
+        if accumulated_threat_level >= threshold:
+            alerts.append(list(pending))
+            alerted.update(pending)
+    return alerts
+
+
+def replay_incrementally(tw_evidence: list, threshold: float) -> list:
+    """how EvidenceProcess decides now, returns the IDs of the evidence of each alert"""
+    alerts = []
+    accumulated_threat_levels = AccumulatedThreatLevels()
+    for ID, evidence_details in tw_evidence:
+        evidence = json.loads(evidence_details)
+        if is_evidence_done_by_profile(evidence):
+            accumulated_threat_levels.add(
+                'profile', 'tw', ID, utils.get_weighted_threat_level(evidence)
+            )
+        if (
+            accumulated_threat_levels.get_evidence_IDs('profile', 'tw')
+            and accumulated_threat_levels.get('profile', 'tw') >= threshold
+        ):
+            alerts.append(accumulated_threat_levels.reset('profile', 'tw'))
+    return alerts
+
+
+def run(replay, all_evidence: dict, threshold: float) -> tuple:
+    """returns the alerts of every tw and the time it took to replay all the evidence"""
+    start = time.time()
+    for _ in range(ROUNDS):
+        alerts = {
+            profile_tw: replay(tw_evidence, threshold)
+            for profile_tw, tw_evidence in all_evidence.items()
+        }
+    return alerts, (time.time() - start) / ROUNDS
+
+
+def main():
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PORT
+    db = redis.StrictRedis(port=port, decode_responses=True)
+    all_evidence = read_evidence(db)
+    evidence_count = sum(len(tw_evidence) for tw_evidence in all_evidence.values())
+    if not evidence_count:
+        sys.exit(f'No evidence found in the db on port {port}')
+
+    conf = ConfigParser()
+    threshold = conf.evidence_detection_threshold() * conf.get_tw_width_as_float() / 60
+
+    print(
+        f'Replaying {evidence_count} evidence of {len(all_evidence)} timewindows. '
+        f'Detection threshold: {threshold}'
+    )
+    old_alerts, old_time = run(replay_from_scratch, all_evidence, threshold)
+    new_alerts, new_time = run(replay_incrementally, all_evidence, threshold)
+
+    alerts_count = sum(len(alerts) for alerts in new_alerts.values())
+    print(f'{"from scratch":<14} alerts: {sum(len(a) for a in old_alerts.values())} '
+          f'evidence/sec: {evidence_count / old_time:.0f}')
+    print(f'{"incremental":<14} alerts: {alerts_count} '
+          f'evidence/sec: {evidence_count / new_time:.0f}')
+
+    if old_alerts != new_alerts:
+        for profile_tw in all_evidence:
+            if old_alerts[profile_tw] != new_alerts[profile_tw]:
+                print(f'Different alerts in {profile_tw}')
+        sys.exit(1)
+    print('Both generate the same alerts.')
+
+
+if __name__ == '__main__':
+    main()
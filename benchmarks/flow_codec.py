@@ -0,0 +1,112 @@
+"""
+Compares the flow codecs: the redis memory used by the flows hashes,
+and the time the modules spend decoding the stored flows and the new_flow msgs.
+
+Usage, from the root of the repo with a redis server and msgpack available:
+    python3 -m benchmarks.flow_codec [zeek_dir]
+
+if no zeek dir is given, zeek is used to generate the logs of
+dataset/test7-malicious.pcap
+"""
+import sys
+import time
+from multiprocessing import Queue
+
+from benchmarks.profile_flow_round_trips import (
+    REDIS_PORT,
+    do_nothing,
+    generate_zeek_logs,
+    read_flows,
+)
+from slips_files.core.database.database import __database__
+from slips_files.core.database.flow_codec import (
+    FLOW_CODECS,
+    decode_msg,
+    get_flow_codec,
+    msgpack,
+)
+from slips_files.core.profilerProcess import ProfilerProcess
+
+# decode everything this many times to get measurable times
+ROUNDS = 20
+
+
+def store_flows(lines: list):
+    """stores the given lines in a clean db using the current codec"""
+    __database__.r.flushdb()
+    __database__.setSlipsInternalTime(0)
+    __database__.is_localnet_set = False
+    profiler = ProfilerProcess(Queue(), Queue(), 0, 0, REDIS_PORT)
+    profiler.print = do_nothing
+    profiler.analysis_direction = 'out'
+    for line in lines:
+        if profiler.process_zeek_input(line):
+            profiler.add_flow_to_profile()
+
+
+def get_flows_memory() -> int:
+    """returns the bytes used by all the flows hashes"""
+    return sum(
+        __database__.r.memory_usage(key, samples=0)
+        for key in __database__.r.scan_iter(match='*_flows')
+    )
+
+
+def time_db_decoding() -> tuple:
+    """returns the number of stored flows and the time it takes to read and decode all of them"""
+    start = time.time()
+    for _ in range(ROUNDS):
+        flows = __database__.get_all_flows()
+    return len(flows), (time.time() - start) / ROUNDS
+
+
+def time_msg_decoding(flows: list) -> float:
+    """returns the time it takes to decode the new_flow msgs of the given flows"""
+    msgs = [
+        __database__.flow_codec.encode_msg(
+            {
+                'profileid': f'profile_{flow["saddr"]}',
+                'twid': 'timewindow1',
+                'uid': str(uid),
+                'flow': flow,
+                'stime': flow['ts'],
+            }
+        )
+        for uid, flow in enumerate(flows)
+    ]
+    start = time.time()
+    for _ in range(ROUNDS):
+        for msg in msgs:
+            decode_msg(msg)
+    return (time.time() - start) / ROUNDS
+
+
+def main():
+    if msgpack is None:
+        sys.exit('msgpack is not installed.')
+    zeek_dir = sys.argv[1] if len(sys.argv) > 1 else generate_zeek_logs()
+    lines = read_flows(zeek_dir)
+    if not lines:
+        sys.exit(f'No flows found in {zeek_dir}/conn.log')
+
+    __database__.start(REDIS_PORT)
+    __database__.print = do_nothing
+    __database__.outputqueue = Queue()
+
+    print(f'Storing {len(lines)} flows from {zeek_dir}')
+    for name in FLOW_CODECS:
+        __database__.flow_codec = get_flow_codec(name)
+        store_flows(lines)
+        memory = get_flows_memory()
+        flows_count, db_time = time_db_decoding()
+        msg_time = time_msg_decoding(__database__.get_all_flows())
+        print(
+            f'{name:<8} flows: {flows_count} '
+            f'flows memory: {memory / 1024:.1f} KB '
+            f'db flows decoded/sec: {flows_count / db_time:.0f} '
+            f'new_flow msgs decoded/sec: {flows_count / msg_time:.0f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
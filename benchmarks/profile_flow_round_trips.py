@@ -0,0 +1,138 @@
+"""
+Counts the redis round-trips slips needs to store each flow, with and without
+the per-flow pipeline in ProfilingFlowsDatabase.
+
+Usage, from the root of the repo with a redis server available:
+    python3 -m benchmarks.profile_flow_round_trips [zeek_dir]
+
+if no zeek dir is given, zeek is used to generate the logs of
+dataset/test7-malicious.pcap
+"""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from multiprocessing import Queue
+
+import redis
+
+from slips_files.core.database.database import __database__
+from slips_files.core.profilerProcess import ProfilerProcess
+
+REDIS_PORT = 6390
+PCAP = 'dataset/test7-malicious.pcap'
+
+
+class RoundTripsCounter:
+    """
+    Counts the commands sent to redis on their own and the executed pipelines,
+    each of them is 1 round-trip
+    """
+
+    def __init__(self):
+        self.round_trips = 0
+        self.execute_command = redis.Redis.execute_command
+        self.execute_pipeline = redis.client.Pipeline.execute
+
+    def __enter__(self):
+        counter = self
+
+        def execute_command(client, *args, **kwargs):
+            counter.round_trips += 1
+            return counter.execute_command(client, *args, **kwargs)
+
+        def execute_pipeline(pipe, *args, **kwargs):
+            counter.round_trips += 1
+            return counter.execute_pipeline(pipe, *args, **kwargs)
+
+        redis.Redis.execute_command = execute_command
+        redis.client.Pipeline.execute = execute_pipeline
+        return self
+
+    def __exit__(self, *args):
+        redis.Redis.execute_command = self.execute_command
+        redis.client.Pipeline.execute = self.execute_pipeline
+
+
+def do_nothing(*args):
+    pass
+
+
+def generate_zeek_logs() -> str:
+    """runs zeek on the test pcap and returns the dir of the generated logs"""
+    zeek = shutil.which('zeek') or shutil.which('bro')
+    if not zeek:
+        sys.exit('zeek is not installed. Pass a zeek dir to use instead.')
+    zeek_dir = tempfile.mkdtemp()
+    subprocess.run(
+        [zeek, '-C', '-r', os.path.abspath(PCAP), 'tcp_inactivity_timeout=60mins',
+         'local', '-e', 'redef LogAscii::use_json=T;'],
+        cwd=zeek_dir,
+        check=True,
+    )
+    return zeek_dir
+
+
+def read_flows(zeek_dir: str) -> list:
+    """returns the conn.log lines in the format the input process sends them"""
+    lines = []
+    with open(os.path.join(zeek_dir, 'conn.log')) as f:
+        for line in f:
+            if line.startswith('#'):
+                continue
+            lines.append({'type': 'conn', 'data': json.loads(line)})
+    return lines
+
+
+def run(lines: list, pipelined: bool) -> tuple:
+    """
+    stores the given lines in a clean db
+    returns the number of round-trips and the time it took
+    """
+    __database__.r.flushdb()
+    __database__.setSlipsInternalTime(0)
+    __database__.is_localnet_set = False
+    profiler = ProfilerProcess(Queue(), Queue(), 0, 0, REDIS_PORT)
+    profiler.print = do_nothing
+    profiler.analysis_direction = 'out'
+    if not pipelined:
+        # send each command on its own like before
+        __database__.start_pipeline = do_nothing
+
+    start = time.time()
+    with RoundTripsCounter() as counter:
+        for line in lines:
+            if profiler.process_zeek_input(line):
+                profiler.add_flow_to_profile()
+    elapsed = time.time() - start
+
+    if not pipelined:
+        del __database__.start_pipeline
+    return counter.round_trips, elapsed
+
+
+def main():
+    zeek_dir = sys.argv[1] if len(sys.argv) > 1 else generate_zeek_logs()
+    lines = read_flows(zeek_dir)
+    if not lines:
+        sys.exit(f'No flows found in {zeek_dir}/conn.log')
+
+    __database__.start(REDIS_PORT)
+    __database__.print = do_nothing
+    __database__.outputqueue = Queue()
+
+    print(f'Storing {len(lines)} flows from {zeek_dir}')
+    for pipelined in (False, True):
+        round_trips, elapsed = run(lines, pipelined)
+        print(
+            f'{"pipelined" if pipelined else "unpipelined":<12} '
+            f'round-trips per flow: {round_trips / len(lines):.2f} '
+            f'flows/sec: {len(lines) / elapsed:.0f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
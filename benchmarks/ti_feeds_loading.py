@@ -0,0 +1,111 @@
+"""
+Compares the time it takes to load the TI feeds into the cache db when they're
+stored in 1 chunk per feed one after the other, like the update manager did
+before, in chunks, and in chunks by parallel TI workers.
+
+Usage, from the root of the repo with a redis server available:
+    python3 -m benchmarks.ti_feeds_loading [feeds] [iocs_per_feed]
+
+the feeds are generated with random public IPs and domains, 20 feeds of
+50000 IoCs by default.
+The IoCs in the cache db are replaced by the generated ones and the info of the
+TI files is deleted, so slips downloads all the feeds again the next time it starts
+"""
+import asyncio
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from multiprocessing import Queue
+
+from benchmarks.profile_flow_round_trips import REDIS_PORT, do_nothing
+from slips_files.core.database.database import __database__
+from modules.update_manager.update_file_manager import UpdateFileManager
+
+FEEDS = 20
+IOCS_PER_FEED = 50000
+# the keys of the cache db the loaded feeds are stored in
+IOC_KEYS = ('IoC_ips', 'IoC_domains', 'IoC_ip_ranges', 'IPsInfo', 'TI_files_info')
+# (name, ti_chunk_size, ti_workers)
+SETUPS = (
+    ('1 chunk per feed, serial', float('inf'), 1),
+    ('chunked, serial', 10000, 1),
+    ('chunked, 4 workers', 10000, 4),
+)
+
+
+def generate_feeds(feeds: int, iocs_per_feed: int) -> dict:
+    """writes the feeds to a tmp dir and returns {url: path}"""
+    feeds_dir = tempfile.mkdtemp()
+    paths = {}
+    for feed in range(feeds):
+        path = os.path.join(feeds_dir, f'feed{feed}.csv')
+        with open(path, 'w') as f:
+            f.write('# ioc,description\n')
+            for ioc in range(iocs_per_feed):
+                if ioc % 4:
+                    # 1.0.0.0 to 99.x.x.x are mostly public
+                    ip = '.'.join(
+                        str(random.randint(1, 99 if octet == 0 else 254))
+                        for octet in range(4)
+                    )
+                    f.write(f'{ip},malicious ip\n')
+                else:
+                    f.write(f'malicious-{feed}-{ioc}.com,malicious domain\n')
+        paths[f'https://example.com/feed{feed}.csv'] = path
+    return paths
+
+
+async def load_feeds(update_manager: UpdateFileManager, feeds: dict) -> bool:
+    update_manager.start_ti_workers()
+    try:
+        loaded = await asyncio.gather(
+            *(update_manager.load_ti_feed(url, path) for url, path in feeds.items())
+        )
+    finally:
+        update_manager.stop_ti_workers()
+    return all(loaded)
+
+
+def get_max_rss() -> int:
+    """returns the max MB used by this process and by its biggest worker"""
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    workers_usage = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(usage, workers_usage) // 1024
+
+
+def main():
+    feeds = int(sys.argv[1]) if len(sys.argv) > 1 else FEEDS
+    iocs_per_feed = int(sys.argv[2]) if len(sys.argv) > 2 else IOCS_PER_FEED
+    feeds = generate_feeds(feeds, iocs_per_feed)
+
+    __database__.start(REDIS_PORT)
+    __database__.print = do_nothing
+    __database__.outputqueue = Queue()
+    update_manager = UpdateFileManager(Queue(), REDIS_PORT)
+    update_manager.print = do_nothing
+    update_manager.url_feeds = {
+        url: {'threat_level': 'medium', 'tags': ['benchmark']} for url in feeds
+    }
+
+    print(f'Loading {len(feeds)} feeds of {iocs_per_feed} IoCs')
+    for name, chunk_size, workers in SETUPS:
+        __database__.r.flushdb()
+        __database__.rcache.delete(*IOC_KEYS)
+        update_manager.ti_chunk_size = chunk_size
+        update_manager.ti_workers = workers
+        start = time.time()
+        if not asyncio.run(load_feeds(update_manager, feeds)):
+            sys.exit(f'Error loading the feeds with {name}')
+        elapsed = time.time() - start
+        print(
+            f'{name:<26} seconds: {elapsed:.1f} '
+            f'IoCs/sec: {len(feeds) * iocs_per_feed / elapsed:.0f} '
+            f'max RSS so far: {get_max_rss()} MB'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -271,7 +271,7 @@ class Module(Module, multiprocessing.Process):
 
                 src_ips.update({srcip: json.dumps(event_info)})
 
-        __database__.add_ips_to_IoC(src_ips)
+        __database__.add_runtime_ips_to_IoC(src_ips)
 
     def shutdown_gracefully(self):
         # Confirm that the module is done processing
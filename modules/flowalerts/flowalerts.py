@@ -87,29 +87,19 @@ class Module(Module, multiprocessing.Process):
             target=self.wait_for_ssl_flows_to_appear_in_connlog, daemon=True
         )
     def subscribe_to_channels(self):
-        self.c1 = __database__.subscribe('new_flow')
-        self.c2 = __database__.subscribe('new_ssh')
-        self.c3 = __database__.subscribe('new_notice')
-        self.c4 = __database__.subscribe('new_ssl')
-        self.c5 = __database__.subscribe('tw_closed')
-        self.c6 = __database__.subscribe('new_dns')
-        self.c7 = __database__.subscribe('new_downloaded_file')
-        self.c8 = __database__.subscribe('new_smtp')
-        self.c9 = __database__.subscribe('new_software')
-        self.c10 = __database__.subscribe('new_weird')
-        self.c11 = __database__.subscribe('new_tunnel')
-        self.channels = {
-            'new_flow': self.c1,
-            'new_ssh': self.c2,
-            'new_notice': self.c3,
-            'new_ssl': self.c4,
-            'tw_closed': self.c5,
-            'new_dns': self.c6,
-            'new_downloaded_file': self.c7,
-            'new_smtp': self.c8,
-            'new_software': self.c9,
-            'new_weird': self.c10,
-            'new_tunnel': self.c11,
+        # all the channels are handled using 1 pubsub, see Module.dispatch_msgs()
+        self.handlers = {
+            'new_flow': self.handle_new_flow,
+            'new_ssh': self.handle_new_ssh,
+            'new_notice': self.handle_new_notice,
+            'new_ssl': self.handle_new_ssl,
+            'tw_closed': self.handle_tw_closed,
+            'new_dns': self.handle_new_dns,
+            'new_downloaded_file': self.handle_new_downloaded_file,
+            'new_smtp': self.handle_new_smtp,
+            'new_software': self.handle_new_software,
+            'new_weird': self.handle_new_weird,
+            'new_tunnel': self.handle_new_tunnel,
         }
 
     def read_configuration(self):
@@ -358,7 +348,6 @@ class Module(Module, multiprocessing.Process):
                 # always returns a dict, never returns None
                 flow: dict = __database__.get_flow(profileid, twid, uid)
                 if flow := flow.get(uid):
-                    flow = json.loads(flow)
                     if 'ts' in flow:
                         # this means the flow is found in conn.log
                         self.check_pastebin_download(*ssl_flow, flow)
@@ -830,9 +819,7 @@ class Module(Module, multiprocessing.Process):
         original_ssh_flow = __database__.search_tws_for_flow(profileid, twid, uid)
         original_flow_uid = next(iter(original_ssh_flow))
         if original_ssh_flow[original_flow_uid]:
-            ssh_flow_dict = json.loads(
-                original_ssh_flow[original_flow_uid]
-            )
+            ssh_flow_dict = original_ssh_flow[original_flow_uid]
             daddr = ssh_flow_dict['daddr']
             saddr = ssh_flow_dict['saddr']
             size = ssh_flow_dict['allbytes']
@@ -873,9 +860,7 @@ class Module(Module, multiprocessing.Process):
         original_ssh_flow = __database__.get_flow(profileid, twid, uid)
         original_flow_uid = next(iter(original_ssh_flow))
         if original_ssh_flow[original_flow_uid]:
-            ssh_flow_dict = json.loads(
-                original_ssh_flow[original_flow_uid]
-            )
+            ssh_flow_dict = original_ssh_flow[original_flow_uid]
             size = ssh_flow_dict['allbytes']
             if size > self.ssh_succesful_detection_threshold:
                 daddr = ssh_flow_dict['daddr']
@@ -1762,382 +1747,382 @@ class Module(Module, multiprocessing.Process):
         utils.drop_root_privs()
         self.ssl_waiting_thread.start()
 
-    def main(self):
-        # if timewindows are not updated for a long time, Slips is stopped automatically.
-        if msg:= self.get_msg('new_flow'):
-            new_flow = json.loads(msg['data'])
-            profileid = new_flow['profileid']
-            twid = new_flow['twid']
-            flow = new_flow['flow']
-            flow = json.loads(flow)
-            uid = next(iter(flow))
-            flow_dict = json.loads(flow[uid])
-            # Flow type is 'conn' or 'dns', etc.
-            flow_type = flow_dict['flow_type']
-            dur = flow_dict['dur']
-            saddr = flow_dict['saddr']
-            daddr = flow_dict['daddr']
-            origstate = flow_dict['origstate']
-            state = flow_dict['state']
-            timestamp = new_flow['stime']
-            sport: int = flow_dict['sport']
-            dport: int = flow_dict.get('dport', None)
-            proto = flow_dict.get('proto')
-            sbytes = flow_dict.get('sbytes', 0)
-            appproto = flow_dict.get('appproto', '')
-            smac = flow_dict.get('smac', '')
-            if not appproto or appproto == '-':
-                appproto = flow_dict.get('type', '')
-            # dmac = flow_dict.get('dmac', '')
-            # stime = flow_dict['ts']
-            # timestamp = new_flow['stime']
-            # pkts = flow_dict['pkts']
-            # allbytes = flow_dict['allbytes']
-
-            self.check_long_connection(
-                dur, daddr, saddr, profileid, twid, uid, timestamp
-            )
-            self.check_unknown_port(
-                dport,
-                proto.lower(),
-                daddr,
-                profileid,
-                twid,
-                uid,
-                timestamp,
-                state
-            )
-            self.check_multiple_reconnection_attempts(
-                    origstate,
-                    saddr,
-                    daddr,
-                    dport,
-                    uid,
-                    profileid,
-                    twid,
-                    timestamp
-            )
-            self.check_conn_to_port_0(
-                sport,
-                dport,
-                proto,
-                saddr,
-                daddr,
-                profileid,
-                twid,
-                uid,
-                timestamp
-            )
-            self.check_different_localnet_usage(
+    def handle_new_flow(self, msg):
+        new_flow = __database__.decode_new_flow(msg['data'])
+        profileid = new_flow['profileid']
+        twid = new_flow['twid']
+        uid = new_flow['uid']
+        if not (flow_dict := __database__.get_flow_from_msg(new_flow)):
+            return
+        # Flow type is 'conn' or 'dns', etc.
+        flow_type = flow_dict['flow_type']
+        dur = flow_dict['dur']
+        saddr = flow_dict['saddr']
+        daddr = flow_dict['daddr']
+        origstate = flow_dict['origstate']
+        state = flow_dict['state']
+        timestamp = flow_dict['ts']
+        sport: int = flow_dict['sport']
+        dport: int = flow_dict.get('dport', None)
+        proto = flow_dict.get('proto')
+        sbytes = flow_dict.get('sbytes', 0)
+        appproto = flow_dict.get('appproto', '')
+        smac = flow_dict.get('smac', '')
+        if not appproto or appproto == '-':
+            appproto = flow_dict.get('type', '')
+        # dmac = flow_dict.get('dmac', '')
+        # stime = flow_dict['ts']
+        # timestamp = new_flow['stime']
+        # pkts = flow_dict['pkts']
+        # allbytes = flow_dict['allbytes']
+
+        self.check_long_connection(
+            dur, daddr, saddr, profileid, twid, uid, timestamp
+        )
+        self.check_unknown_port(
+            dport,
+            proto.lower(),
+            daddr,
+            profileid,
+            twid,
+            uid,
+            timestamp,
+            state
+        )
+        self.check_multiple_reconnection_attempts(
+                origstate,
                 saddr,
                 daddr,
                 dport,
-                proto,
-                profileid,
-                timestamp,
-                twid,
                 uid,
-                what_to_check='srcip'
-            )
-            self.check_different_localnet_usage(
-                saddr,
-                daddr,
-                dport,
-                proto,
                 profileid,
-                timestamp,
                 twid,
-                uid,
-                what_to_check='dstip'
-            )
+                timestamp
+        )
+        self.check_conn_to_port_0(
+            sport,
+            dport,
+            proto,
+            saddr,
+            daddr,
+            profileid,
+            twid,
+            uid,
+            timestamp
+        )
+        self.check_different_localnet_usage(
+            saddr,
+            daddr,
+            dport,
+            proto,
+            profileid,
+            timestamp,
+            twid,
+            uid,
+            what_to_check='srcip'
+        )
+        self.check_different_localnet_usage(
+            saddr,
+            daddr,
+            dport,
+            proto,
+            profileid,
+            timestamp,
+            twid,
+            uid,
+            what_to_check='dstip'
+        )
 
-            self.check_connection_without_dns_resolution(
-                flow_type, appproto, daddr, twid, profileid, timestamp, uid
-            )
+        self.check_connection_without_dns_resolution(
+            flow_type, appproto, daddr, twid, profileid, timestamp, uid
+        )
 
-            self.detect_connection_to_multiple_ports(
-                saddr,
-                daddr,
-                proto,
-                state,
-                appproto,
-                dport,
-                timestamp,
-                profileid,
-                twid
-            )
-            self.check_data_upload(
-                sbytes,
-                daddr,
-                uid,
-                profileid,
-                twid
-            )
+        self.detect_connection_to_multiple_ports(
+            saddr,
+            daddr,
+            proto,
+            state,
+            appproto,
+            dport,
+            timestamp,
+            profileid,
+            twid
+        )
+        self.check_data_upload(
+            sbytes,
+            daddr,
+            uid,
+            profileid,
+            twid
+        )
 
-            self.check_non_http_port_80_conns(
-                state,
-                daddr,
-                dport,
-                proto,
-                appproto,
-                profileid,
-                twid,
-                uid,
-                timestamp
-            )
-            self.check_non_ssl_port_443_conns(
-                state,
-                daddr,
-                dport,
-                proto,
-                appproto,
-                profileid,
-                twid,
-                uid,
-                timestamp
-            )
-            self.check_connection_to_local_ip(
-                daddr,
-                dport,
-                proto,
-                saddr,
-                profileid,
-                twid,
-                uid,
-                timestamp,
-            )
+        self.check_non_http_port_80_conns(
+            state,
+            daddr,
+            dport,
+            proto,
+            appproto,
+            profileid,
+            twid,
+            uid,
+            timestamp
+        )
+        self.check_non_ssl_port_443_conns(
+            state,
+            daddr,
+            dport,
+            proto,
+            appproto,
+            profileid,
+            twid,
+            uid,
+            timestamp
+        )
+        self.check_connection_to_local_ip(
+            daddr,
+            dport,
+            proto,
+            saddr,
+            profileid,
+            twid,
+            uid,
+            timestamp,
+        )
 
-            self.check_device_changing_ips(
-                flow_type, smac, profileid, twid, uid, timestamp
-            )
-            self.conn_counter += 1
+        self.check_device_changing_ips(
+            flow_type, smac, profileid, twid, uid, timestamp
+        )
+        self.conn_counter += 1
 
+    def handle_new_ssh(self, msg):
         # --- Detect successful SSH connections ---
-        if msg:= self.get_msg('new_ssh'):
-            data = msg['data']
-            data = json.loads(data)
-            profileid = data['profileid']
-            twid = data['twid']
-            # Get flow as a json
-            flow = data['flow']
-            flow = json.loads(flow)
-            timestamp = flow['stime']
-            uid = flow['uid']
-            daddr = flow['daddr']
-            # it's set to true in zeek json files, T in zeke tab files
-            auth_success = flow['auth_success']
-
-            self.check_successful_ssh(
-                uid,
-                timestamp,
-                profileid,
-                twid,
-                auth_success
-            )
+        data = msg['data']
+        data = json.loads(data)
+        profileid = data['profileid']
+        twid = data['twid']
+        # Get flow as a json
+        flow = data['flow']
+        flow = json.loads(flow)
+        timestamp = flow['stime']
+        uid = flow['uid']
+        daddr = flow['daddr']
+        # it's set to true in zeek json files, T in zeke tab files
+        auth_success = flow['auth_success']
 
-            self.check_ssh_password_guessing(
-                daddr,
-                uid,
-                timestamp,
-                profileid,
-                twid,
-                auth_success
-            )
-        # --- Detect alerts from Zeek: Self-signed certs,
-        # invalid certs, port-scans and address scans, and password guessing ---
-        if msg:= self.get_msg('new_notice'):
-            data = msg['data']
-            # Convert from json to dict
-            data = json.loads(data)
-            profileid = data['profileid']
-            twid = data['twid']
-            # Get flow as a json
-            flow = data['flow']
-            # Convert flow to a dict
-            flow = json.loads(flow)
-            timestamp = flow['stime']
-            uid = data['uid']
-            msg = flow['msg']
-            note = flow['note']
-
-            # --- Detect port scans from Zeek logs ---
-            # We're looking for port scans in notice.log in the note field
-            if 'Port_Scan' in note:
-                # Vertical port scan
-                scanning_ip = flow.get('scanning_ip', '')
-                self.helper.set_evidence_vertical_portscan(
-                    msg,
-                    scanning_ip,
-                    timestamp,
-                    profileid,
-                    twid,
-                    uid,
-                )
+        self.check_successful_ssh(
+            uid,
+            timestamp,
+            profileid,
+            twid,
+            auth_success
+        )
 
-            # --- Detect horizontal portscan by zeek ---
-            if 'Address_Scan' in note:
-                # Horizontal port scan
-                # scanned_port = flow.get('scanned_port', '')
-                self.helper.set_evidence_horizontal_portscan(
-                    msg,
-                    timestamp,
-                    profileid,
-                    twid,
-                    uid,
-                )
-            # --- Detect password guessing by zeek ---
-            if 'Password_Guessing' in note:
-                self.helper.set_evidence_pw_guessing(
-                    msg,
-                    timestamp,
-                    profileid,
-                    twid,
-                    uid,
-                    by='Zeek'
-                )
-        # --- Detect maliciuos JA3 TLS servers ---
-        if msg:= self.get_msg('new_ssl'):
-            # Check for self signed certificates in new_ssl channel (ssl.log)
-            data = msg['data']
-            # Convert from json to dict
-            data = json.loads(data)
-            # Get flow as a json
-            flow = data['flow']
-            # Convert flow to a dict
-            flow = json.loads(flow)
-            uid = flow['uid']
-            timestamp = flow['stime']
-            ja3 = flow.get('ja3', False)
-            ja3s = flow.get('ja3s', False)
-            issuer = flow.get('issuer', False)
-            profileid = data['profileid']
-            twid = data['twid']
-            daddr = flow['daddr']
-            saddr = profileid.split('_')[1]
-            server_name = flow.get('server_name')
-
-            # we'll be checking pastebin downloads of this ssl flow
-            # later
-            self.pending_ssl_flows.put(
-                (daddr, server_name, uid, timestamp, profileid, twid)
-            )
+        self.check_ssh_password_guessing(
+            daddr,
+            uid,
+            timestamp,
+            profileid,
+            twid,
+            auth_success
+        )
 
-            self.check_self_signed_certs(
-                flow['validation_status'],
-                daddr,
-                server_name,
+    def handle_new_notice(self, msg):
+        # --- Detect alerts from Zeek: Self-signed certs,
+        # invalid certs, port-scans and address scans, and password guessing ---
+        data = msg['data']
+        # Convert from json to dict
+        data = json.loads(data)
+        profileid = data['profileid']
+        twid = data['twid']
+        # Get flow as a json
+        flow = data['flow']
+        # Convert flow to a dict
+        flow = json.loads(flow)
+        timestamp = flow['stime']
+        uid = data['uid']
+        msg = flow['msg']
+        note = flow['note']
+
+        # --- Detect port scans from Zeek logs ---
+        # We're looking for port scans in notice.log in the note field
+        if 'Port_Scan' in note:
+            # Vertical port scan
+            scanning_ip = flow.get('scanning_ip', '')
+            self.helper.set_evidence_vertical_portscan(
+                msg,
+                scanning_ip,
+                timestamp,
                 profileid,
                 twid,
-                timestamp,
-                uid
+                uid,
             )
 
-            self.detect_malicious_ja3(
-                saddr,
-                daddr,
-                ja3,
-                ja3s,
+        # --- Detect horizontal portscan by zeek ---
+        if 'Address_Scan' in note:
+            # Horizontal port scan
+            # scanned_port = flow.get('scanned_port', '')
+            self.helper.set_evidence_horizontal_portscan(
+                msg,
+                timestamp,
                 profileid,
                 twid,
                 uid,
-                timestamp
             )
-
-            self.detect_incompatible_CN(
-                daddr,
-                server_name,
-                issuer,
+        # --- Detect password guessing by zeek ---
+        if 'Password_Guessing' in note:
+            self.helper.set_evidence_pw_guessing(
+                msg,
+                timestamp,
                 profileid,
                 twid,
                 uid,
-                timestamp
+                by='Zeek'
             )
 
-        if msg:= self.get_msg('tw_closed'):
-            profileid_tw = msg['data'].split('_')
-            profileid, twid = f'{profileid_tw[0]}_{profileid_tw[1]}', profileid_tw[-1]
-            self.detect_data_upload_in_twid(profileid, twid)
+    def handle_new_ssl(self, msg):
+        # --- Detect maliciuos JA3 TLS servers ---
+        # Check for self signed certificates in new_ssl channel (ssl.log)
+        data = msg['data']
+        # Convert from json to dict
+        data = json.loads(data)
+        # Get flow as a json
+        flow = data['flow']
+        # Convert flow to a dict
+        flow = json.loads(flow)
+        uid = flow['uid']
+        timestamp = flow['stime']
+        ja3 = flow.get('ja3', False)
+        ja3s = flow.get('ja3s', False)
+        issuer = flow.get('issuer', False)
+        profileid = data['profileid']
+        twid = data['twid']
+        daddr = flow['daddr']
+        saddr = profileid.split('_')[1]
+        server_name = flow.get('server_name')
 
-        # --- Detect DNS issues: 1) DNS resolutions without connection, 2) DGA, 3) young domains, 4) ARPA SCANs
-        if msg:= self.get_msg('new_dns'):
-            data = json.loads(msg['data'])
-            profileid = data['profileid']
-            twid = data['twid']
-            uid = data['uid']
-            daddr = data.get('daddr', False)
-            flow_data = json.loads(
-                data['flow']
-            )   # this is a dict {'uid':json flow data}
-            domain = flow_data.get('query', False)
-            answers = flow_data.get('answers', False)
-            rcode_name = flow_data.get('rcode_name', False)
-            stime = data.get('stime', False)
-
-            # only check dns without connection if we have answers(we're sure the query is resolved)
-            # sometimes we have 2 dns flows, 1 for ipv4 and 1 fo ipv6, both have the
-            # same uid, this causes FP dns without connection,
-            # so make sure we only check the uid once
-            if answers and uid not in self.connections_checked_in_dns_conn_timer_thread:
-                self.check_dns_without_connection(
-                    domain, answers, rcode_name, stime, profileid, twid, uid
-                )
+        # we'll be checking pastebin downloads of this ssl flow
+        # later
+        self.pending_ssl_flows.put(
+            (daddr, server_name, uid, timestamp, profileid, twid)
+        )
 
-            self.check_suspicious_dns_answers(
-                domain, answers, daddr, profileid, twid, stime, uid
-            )
+        self.check_self_signed_certs(
+            flow['validation_status'],
+            daddr,
+            server_name,
+            profileid,
+            twid,
+            timestamp,
+            uid
+        )
 
-            self.check_invalid_dns_answers(
-                domain, answers, daddr, profileid, twid, stime, uid
-            )
+        self.detect_malicious_ja3(
+            saddr,
+            daddr,
+            ja3,
+            ja3s,
+            profileid,
+            twid,
+            uid,
+            timestamp
+        )
 
-            self.detect_DGA(
-                rcode_name, domain, stime, daddr, profileid, twid, uid
-            )
+        self.detect_incompatible_CN(
+            daddr,
+            server_name,
+            issuer,
+            profileid,
+            twid,
+            uid,
+            timestamp
+        )
 
-            # TODO: not sure how to make sure IP_info is done adding domain age to the db or not
-            self.detect_young_domains(
-                domain, stime, profileid, twid, uid
-            )
-            self.check_dns_arpa_scan(
-                domain, stime, profileid, twid, uid
+    def handle_tw_closed(self, msg):
+        profileid_tw = msg['data'].split('_')
+        profileid, twid = f'{profileid_tw[0]}_{profileid_tw[1]}', profileid_tw[-1]
+        self.detect_data_upload_in_twid(profileid, twid)
+
+    def handle_new_dns(self, msg):
+        # --- Detect DNS issues: 1) DNS resolutions without connection, 2) DGA, 3) young domains, 4) ARPA SCANs
+        data = json.loads(msg['data'])
+        profileid = data['profileid']
+        twid = data['twid']
+        uid = data['uid']
+        daddr = data.get('daddr', False)
+        flow_data = json.loads(
+            data['flow']
+        )   # this is a dict {'uid':json flow data}
+        domain = flow_data.get('query', False)
+        answers = flow_data.get('answers', False)
+        rcode_name = flow_data.get('rcode_name', False)
+        stime = data.get('stime', False)
+
+        # only check dns without connection if we have answers(we're sure the query is resolved)
+        # sometimes we have 2 dns flows, 1 for ipv4 and 1 fo ipv6, both have the
+        # same uid, this causes FP dns without connection,
+        # so make sure we only check the uid once
+        if answers and uid not in self.connections_checked_in_dns_conn_timer_thread:
+            self.check_dns_without_connection(
+                domain, answers, rcode_name, stime, profileid, twid, uid
             )
 
-        if msg:= self.get_msg('new_downloaded_file'):
-            ssl_info = json.loads(msg['data'])
-            self.check_malicious_ssl(ssl_info)
+        self.check_suspicious_dns_answers(
+            domain, answers, daddr, profileid, twid, stime, uid
+        )
+
+        self.check_invalid_dns_answers(
+            domain, answers, daddr, profileid, twid, stime, uid
+        )
 
+        self.detect_DGA(
+            rcode_name, domain, stime, daddr, profileid, twid, uid
+        )
+
+        # TODO: not sure how to make sure IP_info is done adding domain age to the db or not
+        self.detect_young_domains(
+            domain, stime, profileid, twid, uid
+        )
+        self.check_dns_arpa_scan(
+            domain, stime, profileid, twid, uid
+        )
+
+    def handle_new_downloaded_file(self, msg):
+        ssl_info = json.loads(msg['data'])
+        self.check_malicious_ssl(ssl_info)
+
+    def handle_new_smtp(self, msg):
         # --- Detect Bad SMTP logins ---
-        if msg:= self.get_msg('new_smtp'):
-            smtp_info = json.loads(msg['data'])
-            profileid = smtp_info['profileid']
-            twid = smtp_info['twid']
-            flow: dict = smtp_info['flow']
+        smtp_info = json.loads(msg['data'])
+        profileid = smtp_info['profileid']
+        twid = smtp_info['twid']
+        flow: dict = smtp_info['flow']
 
-            self.check_smtp_bruteforce(
-                profileid,
-                twid,
-                flow
-            )
+        self.check_smtp_bruteforce(
+            profileid,
+            twid,
+            flow
+        )
+
+    def handle_new_software(self, msg):
         # --- Detect multiple used SSH versions ---
-        if msg:= self.get_msg('new_software'):
-            msg = json.loads(msg['data'])
-            flow:dict = msg['sw_flow']
-            twid = msg['twid']
-            self.check_multiple_ssh_versions(
-                flow,
-                twid,
-                role='SSH::CLIENT'
-            )
-            self.check_multiple_ssh_versions(
-                flow,
-                twid,
-                role='SSH::SERVER'
-            )
+        msg = json.loads(msg['data'])
+        flow:dict = msg['sw_flow']
+        twid = msg['twid']
+        self.check_multiple_ssh_versions(
+            flow,
+            twid,
+            role='SSH::CLIENT'
+        )
+        self.check_multiple_ssh_versions(
+            flow,
+            twid,
+            role='SSH::SERVER'
+        )
 
-        if msg:=self.get_msg('new_weird'):
-            msg = json.loads(msg['data'])
-            self.check_weird_http_method(msg)
+    def handle_new_weird(self, msg):
+        msg = json.loads(msg['data'])
+        self.check_weird_http_method(msg)
 
-        if msg:= self.get_msg('new_tunnel'):
-            msg = json.loads(msg['data'])
-            self.check_GRE_tunnel(msg)
+    def handle_new_tunnel(self, msg):
+        msg = json.loads(msg['data'])
+        self.check_GRE_tunnel(msg)
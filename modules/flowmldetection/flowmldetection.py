@@ -7,8 +7,9 @@ from sklearn.linear_model import SGDClassifier
 from sklearn.preprocessing import StandardScaler
 import pickle
 import pandas as pd
-import json
+import numpy as np
 import datetime
+import time
 import traceback
 # Only for debbuging
 # from matplotlib import pyplot as plt
@@ -22,6 +23,11 @@ import warnings
 
 warnings.warn = warn
 
+# the features the model is trained with, in the order process_features() leaves them
+FEATURES = ['dur', 'sport', 'dport', 'proto', 'state', 'pkts', 'allbytes', 'spkts', 'sbytes']
+# flows of these protocols dont have ports and are discarded
+DISCARDED_PROTOS = ('arp', 'ARP', 'icmp', 'igmp', 'ipv6-icmp')
+
 
 class Module(Module, multiprocessing.Process):
     # Name: short name of the module. Do not use spaces
@@ -52,10 +58,21 @@ class Module(Module, multiprocessing.Process):
         # self.scores = []
         # The scaler trained during training and to use during testing
         self.scaler = StandardScaler()
+        # flows waiting to be detected in the next batch in test mode
+        # [(profileid, twid, uid, flow dict)]
+        self.pending_flows = []
+        self.last_batch_time = time.time()
+        # labeled flows received since the last incremental training
+        self.new_training_flows = []
+        self.last_checkpoint_time = time.time()
 
     def read_configuration(self):
         conf = ConfigParser()
         self.mode = conf.get_ml_mode()
+        self.batch_size = conf.ml_batch_size()
+        self.batch_timeout = conf.ml_batch_timeout()
+        self.incremental_training = conf.ml_incremental_training()
+        self.checkpoint_interval = conf.ml_checkpoint_interval()
 
 
 
@@ -113,6 +130,52 @@ class Module(Module, multiprocessing.Process):
             self.print(traceback.print_exc(), 0, 1)
 
 
+    @staticmethod
+    def normalize_label(label: str):
+        """
+        returns 'Normal' or 'Malware' like the replaces in train() do,
+        or None if the label is neither of them
+        """
+        label = str(label)
+        if 'ormal' in label:
+            return 'Normal'
+        if 'alware' in label or 'alicious' in label:
+            return 'Malware'
+        return None
+
+    def train_incrementally(self):
+        """
+        Trains the model and the scaler only with the flows received since the last training,
+        instead of reading and retraining on all the flows in the DB.
+        The model and scaler are stored on disk every checkpoint_interval seconds
+        """
+        flows, self.new_training_flows = self.new_training_flows, []
+        try:
+            X_flows = self.get_features(flows)
+            y_flows = np.array([self.normalize_label(flow['label']) for flow in flows])
+            # the flows with features that can't be converted to numbers can't be used
+            valid = ~np.isnan(X_flows).any(axis=1)
+            if not valid.any():
+                return
+            X_flows, y_flows = X_flows[valid], y_flows[valid]
+
+            # update the mean and variance of the scaler with the new flows
+            self.scaler.partial_fit(X_flows)
+            X_flows = self.scaler.transform(X_flows)
+            self.clf.partial_fit(
+                X_flows, y_flows, classes=['Malware', 'Normal']
+            )
+            score = self.clf.score(X_flows, y_flows)
+            self.print(f'	Training Score: {score}. Trained with {len(y_flows)} new flows.', 0, 1)
+        except Exception:
+            self.print('Error in train_incrementally()', 0 , 1)
+            self.print(traceback.print_exc(), 0, 1)
+            return
+
+        if time.time() - self.last_checkpoint_time >= self.checkpoint_interval:
+            self.store_model()
+            self.last_checkpoint_time = time.time()
+
     def process_features(self, dataset):
         """
         Discards some features of the dataset and can create new.
@@ -120,8 +183,7 @@ class Module(Module, multiprocessing.Process):
         """
         try:
             # Discard some type of flows that dont have ports
-            to_discard = ['arp', 'ARP', 'icmp', 'igmp', 'ipv6-icmp']
-            for proto in to_discard:
+            for proto in DISCARDED_PROTOS:
                 dataset = dataset[dataset.proto != proto]
 
             # For now, discard the ports
@@ -292,44 +354,140 @@ class Module(Module, multiprocessing.Process):
             self.print('Error in process_flows()')
             self.print(traceback.print_exc(),0,1)
 
-    def process_flow(self):
+    @staticmethod
+    def to_float_column(values: list) -> np.ndarray:
         """
-        Process one flow. Only used during detection in testing
-        Store the pandas df in self.flow
+        converts the given values to a float array,
+        the values that can't be converted are NaN
         """
         try:
-            # Convert the flow to a pandas dataframe
-            raw_flow = pd.DataFrame(self.flow_dict, index=[0])
-            # Process features
-            dflow = self.process_features(raw_flow)
-            # Update the flow to the processed version
-            self.flow = dflow
-        except Exception:
-            # Stop the timer
-            self.print('Error in process_flow()')
-            self.print(traceback.print_exc(),0,1)
+            return np.array(values, dtype=np.float64)
+        except (ValueError, TypeError):
+            column = np.empty(len(values), dtype=np.float64)
+            for i, value in enumerate(values):
+                try:
+                    column[i] = float(value)
+                except (ValueError, TypeError):
+                    column[i] = np.nan
+            return column
+
+    def get_features(self, flows: list) -> np.ndarray:
+        """
+        Converts the given flow dicts to 1 array with 1 row per flow and the
+        columns in FEATURES, the same conversions process_features() does to a dataframe.
+        The rows of the flows that can't be converted have NaNs
+        """
+        protos = np.char.lower(np.array([str(flow.get('proto', '')) for flow in flows]))
+        # the first matching pattern wins, like the replaces in process_features()
+        protos = np.select(
+            [
+                np.char.find(protos, 'tcp') >= 0,
+                np.char.find(protos, 'udp') >= 0,
+                np.char.find(protos, 'icmp') >= 0,
+                np.char.find(protos, 'arp') >= 0,
+            ],
+            [0, 1, 2, 4],
+            default=np.nan,
+        )
+        states = np.array([str(flow.get('state', '')) for flow in flows])
+        states = np.select(
+            [
+                np.char.find(states, 'NotEstablished') >= 0,
+                np.char.find(states, 'Established') >= 0,
+            ],
+            [0, 1],
+            default=np.nan,
+        )
+
+        columns = []
+        for feature in FEATURES:
+            if feature == 'proto':
+                columns.append(protos)
+            elif feature == 'state':
+                columns.append(states)
+            else:
+                columns.append(
+                    self.to_float_column([flow.get(feature) for flow in flows])
+                )
+        return np.column_stack(columns)
 
-    def detect(self):
+    def should_detect_batch(self) -> bool:
         """
-        Detect this flow with the current model stored
+        Checks if the pending flows are batch_size flows,
+        or if batch_timeout ms passed since the last batch was detected
         """
+        if not self.pending_flows:
+            return False
+        elapsed_ms = (time.time() - self.last_batch_time) * 1000
+        return (
+            len(self.pending_flows) >= self.batch_size
+            or elapsed_ms >= self.batch_timeout
+        )
+
+    def detect_batch(self):
+        """
+        Detects all the pending flows with 1 call to the scaler and the model
+        and handles the prediction of each flow
+        """
+        pending_flows, self.pending_flows = self.pending_flows, []
+        self.last_batch_time = time.time()
         try:
-            # Store the real label if there is one
-            y_flow = self.flow['label']
-            # remove the real label column
-            self.flow = self.flow.drop('label', axis=1)
-            # remove the label predictions column of the other modules
-            X_flow = self.flow.drop('module_labels', axis=1)
-            # Scale the flow
-            X_flow = self.scaler.transform(X_flow)
-            pred = self.clf.predict(X_flow)
-            return pred
+            X_flows = self.get_features([flow for *_, flow in pending_flows])
+            # the flows with features that can't be converted to numbers can't be detected
+            valid = ~np.isnan(X_flows).any(axis=1)
+            if not valid.any():
+                return
+            X_flows = self.scaler.transform(X_flows[valid])
+            preds = self.clf.predict(X_flows)
+            valid_flows = [
+                pending_flow
+                for pending_flow, is_valid in zip(pending_flows, valid)
+                if is_valid
+            ]
+            for (profileid, twid, uid, flow), pred in zip(valid_flows, preds):
+                self.handle_prediction(profileid, twid, uid, flow, pred)
         except Exception:
-            # Stop the timer
-            self.print('Error in detect() X_flow:')
-            self.print(X_flow)
+            self.print('Error in detect_batch()')
             self.print(traceback.print_exc(),0,1)
 
+    def handle_prediction(self, profileid, twid, uid, flow: dict, pred: str):
+        """
+        Reports the prediction of 1 flow and sets an evidence if it's malicious
+        """
+        label = flow['label']
+        if (
+            label
+            and label != 'unknown'
+            and label != pred
+        ):
+            # If the user specified a label in test mode, and the label
+            # is diff from the prediction, print in debug mode
+            self.print(
+                f'Report Prediction {pred} for label {label} flow {flow["saddr"]}:'
+                f'{flow["sport"]} -> {flow["daddr"]}:'
+                f'{flow["dport"]}/{flow["proto"]}',
+                0,
+                3,
+            )
+        if pred == 'Malware':
+            # Generate an alert
+            self.set_evidence_malicious_flow(
+                flow['saddr'],
+                flow['sport'],
+                flow['daddr'],
+                flow['dport'],
+                profileid,
+                twid,
+                uid,
+            )
+            self.print(
+                f'Prediction {pred} for label {label} flow {flow["saddr"]}:'
+                f'{flow["sport"]} -> {flow["daddr"]}:'
+                f'{flow["dport"]}/{flow["proto"]}',
+                0,
+                2,
+            )
+
     def store_model(self):
         """
         Store the trained model on disk
@@ -390,7 +548,11 @@ class Module(Module, multiprocessing.Process):
     def shutdown_gracefully(self):
         # Confirm that the module is done processing
         if self.mode == 'train':
+            if self.new_training_flows:
+                self.train_incrementally()
             self.store_model()
+        elif self.pending_flows:
+            self.detect_batch()
         __database__.publish('finished_modules', self.name)
 
     def pre_main(self):
@@ -400,22 +562,23 @@ class Module(Module, multiprocessing.Process):
 
     def main(self):
         if msg:= self.get_msg('new_flow'):
-            data = msg['data']
-            # Convert from json to dict
-            data = json.loads(data)
+            data = __database__.decode_new_flow(msg['data'])
             profileid = data['profileid']
             twid = data['twid']
-            # Get flow that is now in json format
-            flow = data['flow']
-            # Convert flow to a dict
-            flow = json.loads(flow)
-            # Convert the common fields to something that can
-            # be interpreted
-            # Get the uid which is the key
-            uid = next(iter(flow))
-            self.flow_dict = json.loads(flow[uid])
-
-            if self.mode == 'train':
+            uid = data['uid']
+
+            if self.mode == 'train' and self.incremental_training:
+                # only the labeled flows received since the last training are used
+                flow = __database__.get_flow_from_msg(data)
+                if (
+                    flow
+                    and flow.get('proto') not in DISCARDED_PROTOS
+                    and self.normalize_label(flow.get('label'))
+                ):
+                    self.new_training_flows.append(flow)
+                if len(self.new_training_flows) >= self.minimum_lables_to_retrain:
+                    self.train_incrementally()
+            elif self.mode == 'train':
                 # We are training
 
                 # Is the amount in the DB of labels enough to retrain?
@@ -439,45 +602,15 @@ class Module(Module, multiprocessing.Process):
                     self.train()
             elif self.mode == 'test':
                 # We are testing, which means using the model to detect
-                self.process_flow()
-
-                # After processing the flow, it may happen that we delete icmp/arp/etc
-                # so the dataframe can be empty
-                if not self.flow.empty:
-                    # Predict
-                    pred = self.detect()
-                    label = self.flow_dict['label']
-
-                    # Report
-                    if (
-                        label
-                        and label != 'unknown'
-                        and label != pred[0]
-                    ):
-                        # If the user specified a label in test mode, and the label
-                        # is diff from the prediction, print in debug mode
-                        self.print(
-                            f'Report Prediction {pred[0]} for label {label} flow {self.flow_dict["saddr"]}:'
-                            f'{self.flow_dict["sport"]} -> {self.flow_dict["daddr"]}:'
-                            f'{self.flow_dict["dport"]}/{self.flow_dict["proto"]}',
-                            0,
-                            3,
-                        )
-                    if pred[0] == 'Malware':
-                        # Generate an alert
-                        self.set_evidence_malicious_flow(
-                            self.flow_dict['saddr'],
-                            self.flow_dict['sport'],
-                            self.flow_dict['daddr'],
-                            self.flow_dict['dport'],
-                            profileid,
-                            twid,
-                            uid,
-                        )
-                        self.print(
-                            f'Prediction {pred[0]} for label {label} flow {self.flow_dict["saddr"]}:'
-                            f'{self.flow_dict["sport"]} -> {self.flow_dict["daddr"]}:'
-                            f'{self.flow_dict["dport"]}/{self.flow_dict["proto"]}',
-                            0,
-                            2,
-                        )
+                # Discard some type of flows that dont have ports
+                # before reading the flow
+                if (
+                    data['proto'] not in DISCARDED_PROTOS
+                    and (flow := __database__.get_flow_from_msg(data))
+                ):
+                    self.pending_flows.append((profileid, twid, uid, flow))
+
+        # detect the pending flows when there are enough of them or when they
+        # waited for too long, even if no new flow arrived
+        if self.mode == 'test' and self.should_detect_batch():
+            self.detect_batch()
@@ -22,9 +22,9 @@ class Module(Module, multiprocessing.Process):
         # The outputqueue is connected to another process called OutputProcess
         self.outputqueue = outputqueue
         __database__.start(redis_port)
-        self.c1 = __database__.subscribe('new_http')
-        self.channels = {
-            'new_http': self.c1
+        # block on new_http instead of polling it in main()
+        self.handlers = {
+            'new_http': self.handle_new_http
         }
 
         self.connections_counter = {}
@@ -469,96 +469,95 @@ class Module(Module, multiprocessing.Process):
     def pre_main(self):
         utils.drop_root_privs()
 
-    def main(self):
-        if msg:= self.get_msg('new_http'):
-            message = json.loads(msg['data'])
-            profileid = message['profileid']
-            twid = message['twid']
-            flow = json.loads(message['flow'])
-            uid = flow['uid']
-            host = flow['host']
-            uri = flow['uri']
-            daddr = flow['daddr']
-            timestamp = flow.get('stime', '')
-            user_agent = flow.get('user_agent', False)
-            request_body_len = flow.get('request_body_len')
-            response_body_len = flow.get('response_body_len')
-            method = flow.get('method')
-            resp_mime_types = flow.get('resp_mime_types')
-
-            self.check_suspicious_user_agents(
-                uid, host, uri, timestamp, user_agent, profileid, twid
-            )
-            self.check_multiple_empty_connections(
-                uid, host, timestamp, request_body_len, profileid, twid
-            )
-            # find the UA of this profileid if we don't have it
-            # get the last used ua of this profile
-            cached_ua = __database__.get_user_agent_from_profile(
-                profileid
-            )
-            if cached_ua:
-                self.check_multiple_UAs(
-                    cached_ua,
-                    user_agent,
-                    timestamp,
-                    profileid,
-                    twid,
-                    uid,
-                )
-
-            if (
-                not cached_ua
-                or (type(cached_ua) == dict
-                    and cached_ua.get('user_agent', '') != user_agent
-                    and 'server-bag' not in user_agent)
-            ):
-                # only UAs of type dict are browser UAs, skips str UAs as they are SSH clients
-                self.get_user_agent_info(
-                    user_agent,
-                    profileid
-                )
-
-            if 'server-bag' in user_agent:
-                self.extract_info_from_UA(
-                    user_agent,
-                    profileid
-                )
-
-            if self.detect_executable_mime_types(resp_mime_types):
-                self.report_executable_mime_type(
-                    resp_mime_types,
-                    daddr,
-                    profileid,
-                    twid,
-                    uid,
-                    timestamp
-                )
-
-            self.check_incompatible_user_agent(
-                host,
-                uri,
+    def handle_new_http(self, msg):
+        message = json.loads(msg['data'])
+        profileid = message['profileid']
+        twid = message['twid']
+        flow = json.loads(message['flow'])
+        uid = flow['uid']
+        host = flow['host']
+        uri = flow['uri']
+        daddr = flow['daddr']
+        timestamp = flow.get('stime', '')
+        user_agent = flow.get('user_agent', False)
+        request_body_len = flow.get('request_body_len')
+        response_body_len = flow.get('response_body_len')
+        method = flow.get('method')
+        resp_mime_types = flow.get('resp_mime_types')
+
+        self.check_suspicious_user_agents(
+            uid, host, uri, timestamp, user_agent, profileid, twid
+        )
+        self.check_multiple_empty_connections(
+            uid, host, timestamp, request_body_len, profileid, twid
+        )
+        # find the UA of this profileid if we don't have it
+        # get the last used ua of this profile
+        cached_ua = __database__.get_user_agent_from_profile(
+            profileid
+        )
+        if cached_ua:
+            self.check_multiple_UAs(
+                cached_ua,
+                user_agent,
                 timestamp,
                 profileid,
                 twid,
-                uid
+                uid,
             )
 
-            self.check_pastebin_downloads(
-                daddr,
-                response_body_len,
-                method,
-                profileid,
-                twid,
-                timestamp,
-                uid
+        if (
+            not cached_ua
+            or (type(cached_ua) == dict
+                and cached_ua.get('user_agent', '') != user_agent
+                and 'server-bag' not in user_agent)
+        ):
+            # only UAs of type dict are browser UAs, skips str UAs as they are SSH clients
+            self.get_user_agent_info(
+                user_agent,
+                profileid
             )
 
+        if 'server-bag' in user_agent:
+            self.extract_info_from_UA(
+                user_agent,
+                profileid
+            )
 
-            self.set_evidence_http_traffic(
+        if self.detect_executable_mime_types(resp_mime_types):
+            self.report_executable_mime_type(
+                resp_mime_types,
                 daddr,
                 profileid,
                 twid,
                 uid,
                 timestamp
             )
+
+        self.check_incompatible_user_agent(
+            host,
+            uri,
+            timestamp,
+            profileid,
+            twid,
+            uid
+        )
+
+        self.check_pastebin_downloads(
+            daddr,
+            response_body_len,
+            method,
+            profileid,
+            twid,
+            timestamp,
+            uid
+        )
+
+
+        self.set_evidence_http_traffic(
+            daddr,
+            profileid,
+            twid,
+            uid,
+            timestamp
+        )
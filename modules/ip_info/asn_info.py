@@ -1,7 +1,7 @@
 from slips_files.core.database.database import __database__
 from slips_files.common.slips_utils import utils
+from slips_files.common.ip_prefix_trie import IPPrefixTrie
 import time
-import ipaddress
 import ipwhois
 import json
 import requests
@@ -17,38 +17,71 @@ class ASN:
         except Exception:
             # errors are printed in IP_info
             pass
+        # process-local index of the ranges cached in the db
+        # {range: {'org': .., 'number': ..}}
+        self.asn_cache = IPPrefixTrie()
 
-    def get_cached_asn(self, ip) :
+    def load_asn_cache(self):
         """
-        If this ip belongs to a cached ip range, return the cached asn info of it
-        :param ip: str
-        if teh range of this ip was found, this function returns a dict with {'number' , 'org'}
+        Fills the in-memory index with the ranges cached in the db
         """
-        first_octet: str = utils.get_first_octet(ip)
-        if not first_octet:
-            # invalid ip or no cached asns
-            return
+        __database__.migrate_asn_cache()
+        for asn_range, range_info in __database__.get_asn_cache().items():
+            try:
+                self.asn_cache.insert(asn_range, json.loads(range_info))
+            except (ValueError, json.decoder.JSONDecodeError):
+                # invalid range
+                continue
+
+    def preload_geolite_asn(self):
+        """
+        Caches every range in the GeoLite2 ASN db in the db and in the in-memory index.
+        The db is only rewritten once per GeoLite2 release, call load_asn_cache()
+        first so the ranges already cached are in the index
+        returns the number of ranges in the index
+        """
+        if not hasattr(self, 'asn_db'):
+            return 0
 
-        cached_asn: str = __database__.get_asn_cache(first_octet=first_octet)
-        if not cached_asn:
-            return
+        build_epoch = str(self.asn_db.metadata().build_epoch)
+        if __database__.get_asn_preload_epoch() == build_epoch:
+            # the ranges of this release are already cached in the db and were
+            # loaded by load_asn_cache(), don't read the whole GeoLite2 db again
+            return len(self.asn_cache)
 
-        cached_asn: dict = json.loads(cached_asn)
+        try:
+            geolite_ranges = iter(self.asn_db)
+        except TypeError:
+            # the Reader of maxminddb < 2.3.0 isn't iterable,
+            # the ranges are cached as their IPs are looked up instead
+            return 0
+
+        ranges = {}
+        for network, asninfo in geolite_ranges:
+            try:
+                range_info = {
+                    'org': asninfo['autonomous_system_organization'],
+                    'number': f'AS{asninfo["autonomous_system_number"]}'
+                }
+            except (KeyError, TypeError):
+                continue
+            asn_range = str(network)
+            self.asn_cache.insert(asn_range, range_info)
+            ranges[asn_range] = range_info
 
-        for range, range_info in cached_asn.items():
-            # convert to objects
-            ip_range = ipaddress.ip_network(range)
-            ip = ipaddress.ip_address(ip)
-            if ip in ip_range:
-                asn_info = {
-                    'asn': {
-                        'org': range_info['org'],
+        __database__.set_asn_cache_ranges(ranges)
+        __database__.set_asn_preload_epoch(build_epoch)
+        return len(self.asn_cache)
 
-                    }
-                }
-                if 'number' in range_info:
-                    asn_info['asn'].update({"number": range_info['number']})
-                return asn_info
+    def get_cached_asn(self, ip):
+        """
+        If this ip belongs to a cached ip range, return the cached asn info of it
+        :param ip: str
+        if the range of this ip was found, this function returns a dict with {'asn': {'number' , 'org'}}
+        """
+        if match := self.asn_cache.longest_match(ip):
+            _, range_info = match
+            return {'asn': dict(range_info)}
 
     def update_asn(self, cached_data, update_period) -> bool:
         """
@@ -111,6 +144,11 @@ class ASN:
                         'org': asnorg
                     }
                 }
+                try:
+                    self.asn_cache.insert(asn_cidr, asn_info['asn'])
+                except ValueError:
+                    # whois returned more than one range
+                    pass
                 return asn_info
         except (
             ipwhois.exceptions.IPDefinedError,
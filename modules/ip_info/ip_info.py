@@ -2,8 +2,11 @@ from slips_files.common.abstracts import Module
 import multiprocessing
 from slips_files.core.database.database import __database__
 from slips_files.common.slips_utils import utils
+from slips_files.common.config_parser import ConfigParser
 from modules.ip_info.jarm import JARM
 from .asn_info import ASN
+from .rdns_resolver import RDNSResolver
+from slips_files.common.oui_index import OUIIndex
 import platform
 import sys
 import traceback
@@ -11,7 +14,6 @@ import datetime
 import maxminddb
 import ipaddress
 import whois
-import socket
 import requests
 import json
 from contextlib import redirect_stdout, redirect_stderr
@@ -187,7 +189,7 @@ class Module(Module, multiprocessing.Process):
     async def read_macdb(self):
         while True:
             try:
-                self.mac_db = open('databases/macaddress-db.json', 'r')
+                self.mac_db = OUIIndex.load()
                 return True
             except OSError:
                 # update manager hasn't downloaded it yet
@@ -222,36 +224,19 @@ class Module(Module, multiprocessing.Process):
         return data
 
     # RDNS functions
-    def get_ip_family(self, ip):
-        """
-        returns the family of the IP, AF_INET or AF_INET6
-        :param ip: str
-        """
-        return socket.AF_INET6 if ':' in ip else socket.AF_INET
-
     def get_rdns(self, ip):
         """
-        get reverse DNS of an ip
-        returns RDNS of the given ip or False if not found
+        starts looking up the reverse DNS of the given ip in the background,
+        store_rdns() stores it in the db when it's found
+        returns a concurrent.futures.Future of the reverse DNS,
+        or None if the ip had no reverse DNS recently
         :param ip: str
         """
-        data = {}
-        try:
-            # works with both ipv4 and ipv6
-            reverse_dns = socket.gethostbyaddr(ip)[0]
-            # if there's no reverse dns record for this ip, reverse_dns will be an ip.
-            try:
-                # reverse_dns is an ip. there's no reverse dns. don't store
-                socket.inet_pton(self.get_ip_family(reverse_dns), reverse_dns)
-                return False
-            except socket.error:
-                # all good, store it
-                data['reverse_dns'] = reverse_dns
-                __database__.setInfoForIPs(ip, data)
-        except (socket.gaierror, socket.herror, OSError):
-            # not an ip or multicast, can't get the reverse dns record of it
-            return False
-        return data
+        return self.rdns_resolver.lookup(ip)
+
+    def store_rdns(self, ip, reverse_dns):
+        """called by the rdns resolver when the reverse DNS of an ip is found"""
+        __database__.setInfoForIPs(ip, {'reverse_dns': reverse_dns})
 
     # MAC functions
 
@@ -279,7 +264,7 @@ class Module(Module, multiprocessing.Process):
 
     def get_vendor_offline(self, mac_addr, host_name, profileid):
         """
-        Gets vendor from Slips' offline database databases/macaddr-db.json
+        Gets vendor from the index of Slips' offline database databases/macaddr-db.json
         """
         if not hasattr(self, 'mac_db'):
             # when update manager is done updating the mac db, we should ask
@@ -287,19 +272,7 @@ class Module(Module, multiprocessing.Process):
             self.pending_mac_queries.put((mac_addr, host_name, profileid))
             return False
 
-        oui = mac_addr[:8].upper()
-        # parse the mac db and search for this oui
-        self.mac_db.seek(0)
-        while True:
-            line = self.mac_db.readline()
-            if line == '':
-                # reached the end of file without finding the vendor
-                # set the vendor to unknown to avoid searching for it again
-                return False
-
-            if oui in line:
-                line = json.loads(line)
-                return line['vendorName']
+        return self.mac_db.get_vendor(mac_addr)
 
     def get_vendor(self, mac_addr: str, host_name: str, profileid: str):
         """
@@ -389,8 +362,8 @@ class Module(Module, multiprocessing.Process):
             self.asn_db.close()
         if hasattr(self, 'country_db'):
             self.country_db.close()
-        if hasattr(self, 'mac_db'):
-            self.mac_db.close()
+        if hasattr(self, 'rdns_resolver'):
+            self.rdns_resolver.stop()
         # confirm that the module is done processing
         __database__.publish('finished_modules', self.name)
 
@@ -481,12 +454,12 @@ class Module(Module, multiprocessing.Process):
         if hasattr(self, 'mac_db') and not self.pending_mac_queries.empty():
             while True:
                 try:
-                    mac, host_name, profileid = self.pending_mac_queries.get(timeout=0.5)
-                    self.get_vendor(mac, host_name, profileid)
-
+                    mac, host_name, profileid = self.pending_mac_queries.get_nowait()
                 except Exception:
                     # queue is empty
                     return
+                # the mac db index is loaded, so this is 1 lookup per MAC
+                self.get_vendor(mac, host_name, profileid)
 
     def wait_for_dbs(self):
         """
@@ -534,6 +507,11 @@ class Module(Module, multiprocessing.Process):
     def pre_main(self):
         utils.drop_root_privs()
         self.wait_for_dbs()
+        # resolves the reverse DNS of the new IPs without blocking the main loop
+        self.rdns_resolver = RDNSResolver(on_result=self.store_rdns)
+        self.asn.load_asn_cache()
+        if ConfigParser().preload_asn_ranges():
+            self.asn.preload_geolite_asn()
         # the following method only works when running on an interface
         if ip := self.get_gateway_ip():
             __database__.set_default_gateway('IP', ip)
@@ -0,0 +1,150 @@
+import asyncio
+import concurrent.futures
+import socket
+import threading
+import time
+
+
+class RDNSResolver:
+    """
+    Resolves the reverse DNS of IPs in the background so a slow PTR lookup
+    doesn't block the main loop of ip_info.
+    The lookups run in an asyncio loop in a thread of the module's process,
+    at most max_concurrent at the same time, and each one is given up after running
+    for timeout seconds.
+    IPs without a reverse DNS are not looked up again for negative_ttl seconds,
+    at most max_negative_cache of them are remembered
+    """
+
+    def __init__(
+        self,
+        on_result=None,
+        resolve=None,
+        max_concurrent: int = 10,
+        timeout: float = 2,
+        negative_ttl: float = 3600,
+        max_negative_cache: int = 10000,
+    ):
+        """
+        :param on_result: called with (ip, reverse dns) from the resolver thread
+        when the reverse DNS of an ip is found
+        :param resolve: function that returns the reverse DNS of an ip,
+        socket.gethostbyaddr() is used if not given. tests can use a stub resolver
+        """
+        self.on_result = on_result
+        self.resolve = resolve or self.gethostbyaddr
+        self.timeout = timeout
+        self.negative_ttl = negative_ttl
+        self.max_negative_cache = max_negative_cache
+        # {ip: time when it can be looked up again}, all the ips have the same ttl
+        # so they're sorted by the time they expire
+        self.negative_cache = {}
+        # {ip: future of the lookup} of the lookups that aren't done yet
+        self.pending = {}
+        self.lock = threading.Lock()
+        # a lookup holds its slot of the semaphore until its thread is done, so
+        # there's always a free thread for the lookups that start
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_concurrent, thread_name_prefix='rdns'
+        )
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(
+            target=self.loop.run_forever, daemon=True, name='rdns_resolver'
+        )
+        self.thread.start()
+        self.semaphore = asyncio.run_coroutine_threadsafe(
+            self.create_semaphore(max_concurrent), self.loop
+        ).result()
+
+    @staticmethod
+    async def create_semaphore(max_concurrent: int) -> asyncio.Semaphore:
+        """the semaphore has to be created in the loop of the resolver thread"""
+        return asyncio.Semaphore(max_concurrent)
+
+    @staticmethod
+    def get_ip_family(ip):
+        return socket.AF_INET6 if ':' in ip else socket.AF_INET
+
+    def gethostbyaddr(self, ip):
+        """
+        returns the reverse DNS of the given ip or False if not found
+        works with both ipv4 and ipv6
+        """
+        try:
+            reverse_dns = socket.gethostbyaddr(ip)[0]
+        except (socket.gaierror, socket.herror, OSError):
+            # not an ip or multicast, can't get the reverse dns record of it
+            return False
+        try:
+            # if there's no reverse dns record for this ip, reverse_dns will be an ip.
+            socket.inet_pton(self.get_ip_family(reverse_dns), reverse_dns)
+            return False
+        except OSError:
+            return reverse_dns
+
+    def is_negatively_cached(self, ip) -> bool:
+        """checks if the ip had no reverse DNS in the last negative_ttl seconds"""
+        retry_time = self.negative_cache.get(ip)
+        if retry_time is None:
+            return False
+        if time.time() < retry_time:
+            return True
+        del self.negative_cache[ip]
+        return False
+
+    def negatively_cache(self, ip):
+        """remembers that the ip has no reverse DNS, forgetting the expired and oldest ips"""
+        now = time.time()
+        self.negative_cache.pop(ip, None)
+        self.negative_cache[ip] = now + self.negative_ttl
+        while self.negative_cache:
+            oldest_ip = next(iter(self.negative_cache))
+            if (
+                len(self.negative_cache) <= self.max_negative_cache
+                and self.negative_cache[oldest_ip] > now
+            ):
+                break
+            del self.negative_cache[oldest_ip]
+
+    def lookup(self, ip):
+        """
+        starts looking up the reverse DNS of the given ip in the background
+        returns a concurrent.futures.Future of the reverse DNS or False,
+        or None if the ip had no reverse DNS recently
+        """
+        with self.lock:
+            if self.is_negatively_cached(ip):
+                return None
+            if future := self.pending.get(ip):
+                # already being looked up
+                return future
+            future = asyncio.run_coroutine_threadsafe(self.resolve_ip(ip), self.loop)
+            self.pending[ip] = future
+            return future
+
+    async def resolve_ip(self, ip):
+        await self.semaphore.acquire()
+        # the lookup only starts when a thread is free, so the timeout doesn't count
+        # the time waiting for one. lookups that time out keep running in their
+        # thread until the OS gives up, their slot is released when they're done
+        lookup = self.loop.run_in_executor(self.executor, self.resolve, ip)
+        lookup.add_done_callback(lambda _: self.semaphore.release())
+        try:
+            # shield it so timing out doesn't cancel the lookup and release its slot
+            reverse_dns = await asyncio.wait_for(asyncio.shield(lookup), self.timeout)
+        except Exception:
+            # timed out or the resolver failed
+            reverse_dns = False
+
+        with self.lock:
+            self.pending.pop(ip, None)
+            if not reverse_dns:
+                self.negatively_cache(ip)
+
+        if reverse_dns and self.on_result:
+            self.on_result(ip, reverse_dns)
+        return reverse_dns
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.executor.shutdown(wait=False)
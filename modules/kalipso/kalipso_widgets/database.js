@@ -67,11 +67,26 @@ class Redis{
       });})
     }
 
-    /*Get evidence for specific profile and timewindow*/
+    /*Get evidence for specific profile and timewindow as a json string {evidence_ID: evidence}.
+    Each evidence is stored in its own field of the evidence hash of the timewindow,
+    databases saved by older versions have all of them in the 'Evidence' field of the timewindow*/
     getEvidence(ip, timewindow){
-      return new Promise ((resolve, reject)=>{this.db.hget("profile_"+ip+"_"+timewindow,'Evidence',(err,reply)=>{
-        if(err){console.log("Error in getEvidence() in kalipso_redis.js. Error: ",err); reject(err);}
-        else{resolve(reply);}
+      let evidence_key = "profile_"+ip+"_"+timewindow+"_evidence"
+      return new Promise ((resolve, reject)=>{this.db.zrange(evidence_key+"_order",0,-1,(err,IDs)=>{
+        if(err){console.log("Error in getEvidence() in kalipso_redis.js. Error: ",err); reject(err); return;}
+        if(IDs==null || IDs.length==0){
+          this.db.hget("profile_"+ip+"_"+timewindow,'Evidence',(err,reply)=>{
+            if(err){console.log("Error in getEvidence() in kalipso_redis.js. Error: ",err); reject(err);}
+            else{resolve(reply);}
+          });
+          return;
+        }
+        this.db.hmget(evidence_key,IDs,(err,evidence)=>{
+          if(err){console.log("Error in getEvidence() in kalipso_redis.js. Error: ",err); reject(err); return;}
+          let json_evidence = {}
+          IDs.forEach((ID, index)=>{if(evidence[index]!=null){json_evidence[ID] = evidence[index]}})
+          resolve(JSON.stringify(json_evidence));
+        });
       });})
     }
 
@@ -99,52 +114,112 @@ class Redis{
       });})
     }
 
+    /*Get the in/out tuples for specific profile and timewindow as a json string {tuple: [letters, previous_two_timestamps]}.
+    The letters of each tuple are stored in their own key, and the timestamps in the hash of the tuples*/
+    getTuples(ip,timewindow,direction){
+      let tuples_key = "profile_"+ip+"_"+timewindow+"_"+direction
+      return new Promise ((resolve, reject)=>{this.db.hgetall(tuples_key,(err,timestamps)=>{
+        if(err){console.log("Error in getTuples in kalipso_redis.js. Error: ",err); reject(err); return;}
+        if(timestamps==null){resolve(null); return;}
+        let tuples = Object.keys(timestamps)
+        this.db.mget(tuples.map(tuple=>tuples_key+"_"+tuple),(err,letters)=>{
+          if(err){console.log("Error in getTuples in kalipso_redis.js. Error: ",err); reject(err); return;}
+          let json_tuples = {}
+          tuples.forEach((tuple, index)=>{json_tuples[tuple] = [letters[index], JSON.parse(timestamps[tuple])]})
+          resolve(JSON.stringify(json_tuples));
+        });
+      });})
+    }
+
     /*Get outtuples for specific profile and timewindow.*/
     getOutTuples(ip,timewindow){
-      return new Promise ((resolve, reject)=>{this.db.hget("profile_"+ip+"_"+timewindow,'OutTuples',(err,reply)=>{
-        if(err){console.log("Error in getOutTuples in kalipso_redis.js. Error: ",err); reject(err);}
-        else{resolve(reply);}
-      });})
+      return this.getTuples(ip,timewindow,'OutTuples')
     }
 
     /*Get intuples for specific profile and timewindow*/
     getInTuples(ip,timewindow){
-      return new Promise ((resolve, reject)=>{this.db.hget("profile_"+ip+"_"+timewindow,'InTuples',(err,reply)=>{
-        if(err){console.log("Error in getInTuples in kalipso_redis.js. Error: ",err); reject(err);}
-        else{resolve(reply);}
+      return this.getTuples(ip,timewindow,'InTuples')
+    }
+
+    /*Build the old {port: {totalflows, totalpkt, totalbytes, dstips/srcips: {ip: {pkts, spkts, stime, uid}}}} dict
+    from the counters of the ports stored by slips as {'port|totalflows': 1, 'port|ip|pkts': 2, ..} and the uids as ['port|ip|uid', ..]*/
+    buildPortsData(counters, uids, ip_key){
+      let ports = {}
+      Object.keys(counters).forEach(field=>{
+        let [port, ...rest] = field.split('|')
+        if(!(port in ports)){ports[port] = {'totalflows':0, 'totalpkt':0, 'totalbytes':0, [ip_key]:{}}}
+        if(rest.length == 1){ports[port][rest[0]] = parseInt(counters[field]); return;}
+        let [ip, counter] = rest
+        let ips = ports[port][ip_key]
+        if(!(ip in ips)){ips[ip] = {'pkts':0, 'spkts':0, 'stime':'', 'uid':[]}}
+        ips[ip][counter] = counter == 'stime' ? counters[field] : parseInt(counters[field])
+      })
+      uids.forEach(entry=>{
+        let [port, ip, uid] = entry.split('|')
+        if(port in ports && ip in ports[port][ip_key]){ports[port][ip_key][ip]['uid'].push(uid)}
+      })
+      return ports
+    }
+
+    /*Build the old {ip: {totalflows, totalpkt, totalbytes, stime, uid, dstports: {port: spkts}}} dict
+    from the counters of the ips stored by slips as {'ip|totalflows': 1, 'ip|dstports|port': 2, ..} and the uids as ['ip|uid', ..]*/
+    buildIPsData(counters, uids){
+      let ips = {}
+      Object.keys(counters).forEach(field=>{
+        let [ip, ...rest] = field.split('|')
+        if(!(ip in ips)){ips[ip] = {'totalflows':0, 'totalpkt':0, 'totalbytes':0, 'stime':'', 'uid':[], 'dstports':{}}}
+        if(rest[0] == 'dstports'){ips[ip]['dstports'][rest[1]] = parseInt(counters[field])}
+        else if(rest[0] == 'stime'){ips[ip]['stime'] = counters[field]}
+        else{ips[ip][rest[0]] = parseInt(counters[field])}
+      })
+      uids.forEach(entry=>{
+        let [ip, uid] = entry.split('|')
+        if(ip in ips){ips[ip]['uid'].push(uid)}
+      })
+      return ips
+    }
+
+    /*Get the dst/src ports/ips client/server data of a key like DstPortsClientTCPEstablished for specific profile and timewindow as a json string.
+    The counters are stored in the hash profile_ip_timewindow_key and the uids in the list profile_ip_timewindow_key_uids*/
+    getTWData(ip, timewindow, key){
+      let data_key = "profile_"+ip+"_"+timewindow+"_"+key
+      return new Promise ((resolve, reject)=>{this.db.hget("profile_"+ip+"_"+timewindow, key,(err,reply)=>{
+        if(err){console.log("Error in getTWData in kalipso_redis.js. Error: ",err); reject(err); return;}
+        // stored as 1 json string by older versions of slips
+        if(reply != null){resolve(reply); return;}
+        this.db.hgetall(data_key,(err,counters)=>{
+          if(err){console.log("Error in getTWData in kalipso_redis.js. Error: ",err); reject(err); return;}
+          if(counters==null || Object.keys(counters).length == 0){resolve(null); return;}
+          this.db.lrange(data_key+"_uids", 0, -1,(err,uids)=>{
+            if(err){console.log("Error in getTWData in kalipso_redis.js. Error: ",err); reject(err); return;}
+            if(key.includes('Ports')){
+              let ip_key = key.includes('Server') ? 'srcips' : 'dstips'
+              resolve(JSON.stringify(this.buildPortsData(counters, uids, ip_key)));
+            }
+            else{resolve(JSON.stringify(this.buildIPsData(counters, uids)));}
+          });
+        });
       });})
     }
 
     /*Get data for UDP established connections (dst/src ports/ips client/server) for specific profile and timewindow*/
     getUDPest(ip, timewindow,udp_key){
-      return new Promise ((resolve, reject)=>{this.db.hget("profile_"+ip+"_"+timewindow, udp_key,(err,reply)=>{
-        if(err){console.log("Error in getUDPest in kalipso_redis.js. Error: ",err); reject(err);}
-        else{resolve(reply);}
-      });})
+      return this.getTWData(ip, timewindow, udp_key)
     }
 
     /*Get data for TCP established (dst/src ports/IPs client/server) for specific profile and timewindow.*/
     getTCPest(ip, timewindow,tcp_key){
-      return new Promise ((resolve, reject)=>{this.db.hget("profile_"+ip+"_"+timewindow,tcp_key,(err,reply)=>{
-        if(err){console.log("Error in getTCPest in kalipso_redis.js. Error: ",err); reject(err);}
-        else{resolve(reply);}
-      });})
+      return this.getTWData(ip, timewindow, tcp_key)
     }
 
     /*Get data for UDP notestablished (dst/src ports/IPs client/server) for specific profile and timewindow*/
     getUDPnotest(ip, timewindow,udp_key){
-      return new Promise ((resolve, reject)=>{this.db.hget("profile_"+ip+"_"+timewindow, udp_key,(err,reply)=>{
-        if(err){console.log("Error in getUDPnotest in kalipso_redis.js. Error: ",err); reject(err);}
-        else{resolve(reply);}
-      });})
+      return this.getTWData(ip, timewindow, udp_key)
     }
 
     /*Get data for TCP notestablished (dst/src port/ips client/server) for specific profile and timewindow*/
     getTCPnotest(ip, timewindow,tcp_key){
-      return new Promise ((resolve, reject)=>{this.db.hget("profile_"+ip+"_"+timewindow,tcp_key,(err,reply)=>{
-        if(err){console.log("Error in getTCPnotest in kalipso_redis.js. Error: ",err); reject(err);}
-        else{resolve(reply);}
-      });})
+      return this.getTWData(ip, timewindow, tcp_key)
     }
 
     /*Get all evidence for specific profile.*/
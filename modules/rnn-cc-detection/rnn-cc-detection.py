@@ -10,12 +10,28 @@ import traceback
 # Your imports
 import numpy as np
 import sys
+import time
+from collections import OrderedDict
 from tensorflow.python.keras.models import load_model
 
 
 warnings.filterwarnings('ignore', category=FutureWarning)
 warnings.filterwarnings('ignore', category=DeprecationWarning)
 
+# Length of behavioral model with which we trained our module
+MAX_LENGTH = 500
+# Convert each of the stratosphere letters to an integer. There are 50
+VOCABULARY = 'abcdefghiABCDEFGHIrstuvwxyzRSTUVWXYZ1234567890,.+*'
+INT_OF_LETTERS = {letter: float(i) for i, letter in enumerate(VOCABULARY)}
+# the pending sequences are scored with 1 predict() when there are BATCH_SIZE of them,
+# or when the oldest one waited BATCH_TIMEOUT ms
+BATCH_SIZE = 64
+BATCH_TIMEOUT = 200
+# number of recent (tupleid, sequence) scores kept to avoid scoring the same sequence again
+SCORES_CACHE_SIZE = 1000
+# seconds between the throughput reports
+THROUGHPUT_REPORT_INTERVAL = 60
+
 
 class Module(Module, multiprocessing.Process):
     # Name: short name of the module. Do not use spaces
@@ -34,6 +50,16 @@ class Module(Module, multiprocessing.Process):
         self.channels = {
             'new_letters': self.c1,
         }
+        # new_letters msgs of tcp tuples waiting to be scored in the next batch
+        self.pending_msgs = []
+        self.first_pending_time = None
+        # LRU of {(tupleid, sequence): score}
+        self.scores = OrderedDict()
+        # to report the throughput
+        self.scored_sequences = 0
+        self.predicted_sequences = 0
+        self.prediction_time = 0
+        self.last_report_time = time.time()
 
     def set_evidence(
         self,
@@ -77,43 +103,156 @@ class Module(Module, multiprocessing.Process):
         to whatever is needed by the model
         The pre_behavioral_model is a 1D array of letters in an array
         """
-        # TODO: set the max_length in the function call
+        return self.convert_batch_for_module([pre_behavioral_model])
 
-        # Length of behavioral model with which we trained our module
-        max_length = 500
+    def convert_batch_for_module(self, pre_behavioral_models: list):
+        """
+        Converts the given sequences of letters to 1 array of shape (number of sequences, 500, 1)
+        so all of them are scored with 1 call to the model
+        """
+        batch = np.zeros((len(pre_behavioral_models), MAX_LENGTH, 1))
+        for row, pre_behavioral_model in enumerate(pre_behavioral_models):
+            # Be sure only max_length chars come. Not sure why we receive more
+            pre_behavioral_model = pre_behavioral_model[:MAX_LENGTH]
+            # Add padding to the letters passed
+            batch[row, :, 0] = INT_OF_LETTERS['0']
+            batch[row, :len(pre_behavioral_model), 0] = [
+                INT_OF_LETTERS[letter] for letter in pre_behavioral_model
+            ]
+        return batch
 
-        # Convert each of the stratosphere letters to an integer. There are 50
-        vocabulary = list('abcdefghiABCDEFGHIrstuvwxyzRSTUVWXYZ1234567890,.+*')
-        int_of_letters = {}
-        for i, letter in enumerate(vocabulary):
-            int_of_letters[letter] = float(i)
+    def get_cached_score(self, tupleid, pre_behavioral_model):
+        key = (tupleid, pre_behavioral_model)
+        if key in self.scores:
+            self.scores.move_to_end(key)
+            return self.scores[key]
 
-        # String to test
-        # pre_behavioral_model = "88*y*y*h*h*h*h*h*h*h*y*y*h*h*h*y*y*"
+    def cache_score(self, tupleid, pre_behavioral_model, score):
+        self.scores[(tupleid, pre_behavioral_model)] = score
+        if len(self.scores) > SCORES_CACHE_SIZE:
+            # forget the least recently used score
+            self.scores.popitem(last=False)
 
-        # Be sure only max_length chars come. Not sure why we receive more
-        pre_behavioral_model = pre_behavioral_model[:max_length]
+    def should_score_batch(self) -> bool:
+        """
+        Checks if there are BATCH_SIZE pending msgs,
+        or if the oldest one waited for BATCH_TIMEOUT ms
+        """
+        if not self.pending_msgs:
+            return False
+        elapsed_ms = (time.time() - self.first_pending_time) * 1000
+        return len(self.pending_msgs) >= BATCH_SIZE or elapsed_ms >= BATCH_TIMEOUT
 
-        # Add padding to the letters passed
-        # self.print(f'Seq sent: {pre_behavioral_model}')
-        pre_behavioral_model += '0' * (max_length - len(pre_behavioral_model))
-        # self.print(f'Padded Seq sent: {pre_behavioral_model}')
+    def score_batch(self):
+        """
+        Scores all the pending sequences with 1 call to the model.
+        Sequences already scored for the same tuple and sequences repeated
+        in the batch are only scored once
+        """
+        pending_msgs, self.pending_msgs = self.pending_msgs, []
+        self.first_pending_time = None
 
-        # Convert to ndarray
-        pre_behavioral_model = np.array(
-            [[int_of_letters[i]] for i in pre_behavioral_model]
-        )
-        # self.print(f'The sequence has shape {pre_behavioral_model.shape}')
+        to_predict = []
+        for msg in pending_msgs:
+            key = (msg['tupleid'], msg['new_symbol'])
+            if key not in to_predict and self.get_cached_score(*key) is None:
+                to_predict.append(key)
+
+        if to_predict:
+            # predict the score of behavioral model being c&c channel
+            start_time = time.time()
+            scores = self.tcpmodel.predict(
+                self.convert_batch_for_module([sequence for _, sequence in to_predict])
+            )
+            self.prediction_time += time.time() - start_time
+            self.predicted_sequences += len(to_predict)
+            for (tupleid, sequence), score in zip(to_predict, scores):
+                # get a float instead of numpy array
+                self.cache_score(tupleid, sequence, score[0])
 
-        # Reshape into (1, 500, 1) We need the first 1, because this is one sample only, but keras expects a 3d vector
-        pre_behavioral_model = np.reshape(
-            pre_behavioral_model, (1, max_length, 1)
+        for msg in pending_msgs:
+            score = self.get_cached_score(msg['tupleid'], msg['new_symbol'])
+            self.print(
+                f' >> sequence: {msg["new_symbol"]}. final prediction score: {score:.20f}', 3, 0,
+            )
+            self.handle_score(msg, score)
+        self.scored_sequences += len(pending_msgs)
+        self.report_throughput()
+
+    def report_throughput(self):
+        """Prints how many sequences per second are scored every THROUGHPUT_REPORT_INTERVAL seconds"""
+        now = time.time()
+        if now - self.last_report_time < THROUGHPUT_REPORT_INTERVAL:
+            return
+        elapsed = now - self.last_report_time
+        predicted_per_second = (
+            self.predicted_sequences / self.prediction_time if self.prediction_time else 0
+        )
+        self.print(
+            f'Scored {self.scored_sequences / elapsed:.1f} sequences/s. '
+            f'The model predicted {self.predicted_sequences} of {self.scored_sequences} sequences, '
+            f'the rest were already scored. Model throughput: {predicted_per_second:.1f} sequences/s',
+            2,
+            0,
         )
+        self.scored_sequences = 0
+        self.predicted_sequences = 0
+        self.prediction_time = 0
+        self.last_report_time = now
+
+    def handle_score(self, msg: dict, score):
+        """
+        Sets an evidence if the score of the sequence of the given new_letters msg
+        is above the threshold
+        """
+        # to reduce false positives
+        threshold = 0.99
+        if score <= threshold:
+            return
 
-        # self.print(f'Post Padded Seq sent: {pre_behavioral_model}. Shape: {pre_behavioral_model.shape}')
-        return pre_behavioral_model
+        pre_behavioral_model = msg['new_symbol']
+        profileid = msg['profileid']
+        twid = msg['twid']
+        tupleid = msg['tupleid']
+        flow = msg['flow']
+        threshold_confidence = 100
+        if (
+            len(pre_behavioral_model)
+            >= threshold_confidence
+        ):
+            confidence = 1
+        else:
+            confidence = (
+                len(pre_behavioral_model)
+                / threshold_confidence
+            )
+        uid = msg['uid']
+        stime = flow['starttime']
+        self.set_evidence(
+            score,
+            confidence,
+            uid,
+            stime,
+            tupleid,
+            profileid,
+            twid,
+        )
+        attacker = tupleid.split('-')[0]
+        # port = int(tupleid.split('-')[1])
+        to_send = {
+            'attacker': attacker,
+            'attacker_type': utils.detect_data_type(attacker),
+            'profileid' : profileid,
+            'twid' : twid,
+            'flow': flow,
+            'uid': uid,
+        }
+        __database__.publish('check_jarm_hash', json.dumps(to_send))
 
     def shutdown_gracefully(self):
+        # score the sequences that are still waiting
+        if self.pending_msgs:
+            self.score_batch()
         # Confirm that the module is done processing
         __database__.publish('finished_modules', self.name)
         return True
@@ -133,63 +272,15 @@ class Module(Module, multiprocessing.Process):
         if msg:= self.get_msg('new_letters'):
             msg = msg['data']
             msg = json.loads(msg)
-            pre_behavioral_model = msg['new_symbol']
-            profileid = msg['profileid']
-            twid = msg['twid']
             tupleid = msg['tupleid']
-            flow = msg['flow']
 
             if 'tcp' in tupleid.lower():
-                # to reduce false positives
-                threshold = 0.99
-                # function to convert each letter of behavioral model to ascii
-                behavioral_model = self.convert_input_for_module(
-                    pre_behavioral_model
-                )
-                # predict the score of behavioral model being c&c channel
                 self.print(
-                    f'predicting the sequence: {pre_behavioral_model}', 3, 0,
+                    f'predicting the sequence: {msg["new_symbol"]}', 3, 0,
                 )
-                score = self.tcpmodel.predict(behavioral_model)
-                self.print(
-                    f' >> sequence: {pre_behavioral_model}. final prediction score: {score[0][0]:.20f}', 3, 0,
-                )
-                # get a float instead of numpy array
-                score = score[0][0]
-                if score > threshold:
-                    threshold_confidence = 100
-                    if (
-                        len(pre_behavioral_model)
-                        >= threshold_confidence
-                    ):
-                        confidence = 1
-                    else:
-                        confidence = (
-                            len(pre_behavioral_model)
-                            / threshold_confidence
-                        )
-                    uid = msg['uid']
-                    stime = flow['starttime']
-                    self.set_evidence(
-                        score,
-                        confidence,
-                        uid,
-                        stime,
-                        tupleid,
-                        profileid,
-                        twid,
-                    )
-                    attacker = tupleid.split('-')[0]
-                    # port = int(tupleid.split('-')[1])
-                    to_send = {
-                        'attacker': attacker,
-                        'attacker_type': utils.detect_data_type(attacker),
-                        'profileid' : profileid,
-                        'twid' : twid,
-                        'flow': flow,
-                        'uid': uid,
-                    }
-                    __database__.publish('check_jarm_hash', json.dumps(to_send))
+                if not self.pending_msgs:
+                    self.first_pending_time = time.time()
+                self.pending_msgs.append(msg)
 
             """
             elif 'udp' in tupleid.lower():
@@ -206,3 +297,8 @@ class Module(Module, multiprocessing.Process):
                 if score > threshold:
                     self.set_evidence(score, tupleid, profileid, twid)
             """
+
+        # score the pending sequences when there are enough of them or when they
+        # waited for too long, even if no new msg arrived
+        if self.should_score_batch():
+            self.score_batch()
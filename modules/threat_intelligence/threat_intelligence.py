@@ -5,6 +5,8 @@ import multiprocessing
 from slips_files.core.database.database import __database__
 from slips_files.common.config_parser import ConfigParser
 from modules.threat_intelligence.urlhaus import URLhaus
+from slips_files.common.ip_prefix_trie import IPPrefixTrie
+from slips_files.common.ioc_snapshot import IoCSnapshot, IoCSnapshotReader
 import sys
 
 # Your imports
@@ -33,10 +35,18 @@ class Module(Module, multiprocessing.Process, URLhaus):
         self.separator = __database__.getFieldSeparator()
         self.c1 = __database__.subscribe('give_threat_intelligence')
         self.c2 = __database__.subscribe('new_downloaded_file')
+        # to add the ranges loaded by the update manager to our index
+        self.c3 = __database__.subscribe('new_ip_ranges')
+        # to look up the ips stored after writing the IoC snapshot
+        self.c4 = __database__.subscribe('new_runtime_ips')
         self.channels = {
             'give_threat_intelligence': self.c1,
             'new_downloaded_file': self.c2,
+            'new_ip_ranges': self.c3,
+            'new_runtime_ips': self.c4,
         }
+        # {ip: json info} of the IoC ips that aren't in the IoC snapshot yet
+        self.runtime_ips = {}
 
         self.__read_configuration()
         self.get_malicious_ip_ranges()
@@ -74,33 +84,64 @@ class Module(Module, multiprocessing.Process, URLhaus):
 
     def get_malicious_ip_ranges(self):
         """
-        Cache the IoC IP ranges instead of retrieving them from the db
+        Builds the longest prefix match index of the IoC IP ranges
+        instead of retrieving them from the db on every lookup
         """
-        ip_ranges = __database__.get_malicious_ip_ranges()
-        self.cached_ipv6_ranges = {}
-        self.cached_ipv4_ranges = {}
-        for range in ip_ranges.keys():
-            if '.' in range:
-                first_octet = range.split('.')[0]
-                try:
-                    self.cached_ipv4_ranges[first_octet].append(range)
-                except KeyError:
-                    # first time seeing this octet
-                    self.cached_ipv4_ranges[first_octet] = [range]
-            else:
-                # ipv6 range
-                first_octet = range.split(':')[0]
-                try:
-                    self.cached_ipv6_ranges[first_octet].append(range)
-                except KeyError:
-                    # first time seeing this octet
-                    self.cached_ipv6_ranges[first_octet] = [range]
+        self.ip_ranges = IPPrefixTrie()
+        if self.get_ioc_snapshot() is not None:
+            # the ranges were added to the index when opening the snapshot
+            return
+        self.add_ranges_to_index(__database__.get_malicious_ip_ranges().keys())
+
+    def add_ranges_to_index(self, ip_ranges):
+        """
+        Adds the given IoC IP ranges to the index used by ip_belongs_to_blacklisted_range()
+        :param ip_ranges: iterable of ranges in CIDR notation
+        """
+        for ip_range in ip_ranges:
+            try:
+                # the key of the range in the db is the value so we can get its info later
+                self.ip_ranges.insert(ip_range, ip_range)
+            except ValueError:
+                # invalid range
+                continue
+
+    def on_ioc_snapshot_open(self, ioc_snapshot):
+        """
+        adds the ranges of every IoC snapshot opened to the index and
+        gets the ips stored in the db that aren't in it
+        """
+        self.add_ranges_to_index(ioc_snapshot.keys('ip_ranges'))
+        self.runtime_ips = __database__.get_runtime_IPs_in_IoC()
 
     def __read_configuration(self):
         conf = ConfigParser()
         self.path_to_local_ti_files = conf.local_ti_data_path()
         if not os.path.exists(self.path_to_local_ti_files):
             os.mkdir(self.path_to_local_ti_files)
+        self.ioc_snapshot_reader = None
+        if conf.ioc_snapshot():
+            self.ioc_snapshot_reader = IoCSnapshotReader(
+                on_open=self.on_ioc_snapshot_open
+            )
+
+    def get_ioc_snapshot(self):
+        """
+        returns the snapshot of the IoCs written by the update manager,
+        or None if it's disabled or not written yet
+        """
+        if self.ioc_snapshot_reader is None:
+            return None
+        return self.ioc_snapshot_reader.get()
+
+    def write_ioc_snapshot(self):
+        """writes the snapshot of the IoCs again after changing the ones of the local TI files"""
+        try:
+            IoCSnapshot.write_from_db(__database__)
+        except OSError as e:
+            self.print(f'Error writing the IoC snapshot {IoCSnapshot.path}: {e}', 0, 1)
+            return
+        self.ioc_snapshot_reader.reopen()
 
     def set_evidence_malicious_asn(
             self,
@@ -772,7 +813,12 @@ class Module(Module, multiprocessing.Process, URLhaus):
 
     def search_offline_for_ip(self, ip):
         """ Searches the TI files for the given ip """
-        ip_info = __database__.search_IP_in_IoC(ip)
+        if (ioc_snapshot := self.get_ioc_snapshot()) is not None:
+            # the ips stored after writing the snapshot, by other modules
+            # or found online, aren't in it
+            ip_info = ioc_snapshot.get('ips', ip) or self.runtime_ips.get(ip)
+        else:
+            ip_info = __database__.search_IP_in_IoC(ip)
         # check if it's a blacklisted ip
         return json.loads(ip_info) if ip_info else False
 
@@ -816,40 +862,59 @@ class Module(Module, multiprocessing.Process, URLhaus):
             self, ip, uid, daddr, timestamp, profileid, twid, ip_state
     ):
         """ check if this ip belongs to any of our blacklisted ranges"""
-        ip_obj = ipaddress.ip_address(ip)
-        # Malicious IP ranges are stored in slips sorted by the first octet
-        # so get the ranges that match the fist octet of the given IP
-        if validators.ipv4(ip):
-            first_octet = ip.split('.')[0]
-            ranges_starting_with_octet = self.cached_ipv4_ranges.get(first_octet, [])
-        elif validators.ipv6(ip):
-            first_octet = ip.split(':')[0]
-            ranges_starting_with_octet = self.cached_ipv6_ranges.get(first_octet, [])
-        else:
+        match = self.ip_ranges.longest_match(ip)
+        if not match:
             return False
-        for range in ranges_starting_with_octet:
-            if ip_obj in ipaddress.ip_network(range):
-                # ip was found in one of the blacklisted ranges
-                ip_info = __database__.get_malicious_ip_ranges()[range]
-                ip_info = json.loads(ip_info)
-                self.set_evidence_malicious_ip(
-                    ip,
-                    uid,
-                    daddr,
-                    timestamp,
-                    ip_info,
-                    profileid,
-                    twid,
-                    ip_state,
-                )
-                return True
+
+        # ip was found in one of the blacklisted ranges
+        _, ip_range = match
+        ip_info = None
+        if (ioc_snapshot := self.get_ioc_snapshot()) is not None:
+            ip_info = ioc_snapshot.get('ip_ranges', ip_range)
+        if not ip_info:
+            # the ranges of the local TI files may not be in the snapshot
+            ip_info = __database__.get_malicious_ip_range(ip_range)
+        if not ip_info:
+            return False
+        ip_info = json.loads(ip_info)
+        self.set_evidence_malicious_ip(
+            ip,
+            uid,
+            daddr,
+            timestamp,
+            ip_info,
+            profileid,
+            twid,
+            ip_state,
+        )
+        return True
+
+    def search_snapshot_for_domain(self, ioc_snapshot, domain) -> tuple:
+        """
+        Searches the IoC snapshot for the given domain and its parent domains
+        returns the same as __database__.is_domain_malicious()
+        """
+        labels = domain.split('.')
+        # don't look up the TLD alone
+        for idx in range(max(len(labels) - 1, 1)):
+            parent_domain = '.'.join(labels[idx:])
+            if domain_info := ioc_snapshot.get('domains', parent_domain):
+                return domain_info, idx > 0
+        return False, False
 
     def search_offline_for_domain(self, domain):
         # Search for this domain in our database of IoC
-        (
-            domain_info,
-            is_subdomain,
-        ) = __database__.is_domain_malicious(domain)
+        if (ioc_snapshot := self.get_ioc_snapshot()) is not None:
+            # the snapshot is written again after loading the domains of the local TI files
+            (
+                domain_info,
+                is_subdomain,
+            ) = self.search_snapshot_for_domain(ioc_snapshot, domain)
+        else:
+            (
+                domain_info,
+                is_subdomain,
+            ) = __database__.is_domain_malicious(domain)
         if (
             domain_info is not False
         ):   # Dont change this condition. This is the only way it works
@@ -866,12 +931,12 @@ class Module(Module, multiprocessing.Process, URLhaus):
         ip_info = self.search_offline_for_ip(ip)
         if not ip_info:
             ip_info = self.search_online_for_ip(ip)
-        if not ip_info:
-            # not malicious
-            return False
-        __database__.add_ips_to_IoC({
-                ip: json.dumps(ip_info)
-        })
+            if not ip_info:
+                # not malicious
+                return False
+            __database__.add_runtime_ips_to_IoC({
+                    ip: json.dumps(ip_info)
+            })
         self.set_evidence_malicious_ip(
             ip,
             uid,
@@ -998,13 +1063,25 @@ class Module(Module, multiprocessing.Process, URLhaus):
         # Load the local Threat Intelligence files that are
         # stored in the local folder self.path_to_local_ti_files
         # The remote files are being loaded by the update_manager
-        self.update_local_file('own_malicious_iocs.csv')
+        if (
+            self.update_local_file('own_malicious_iocs.csv')
+            and self.ioc_snapshot_reader is not None
+        ):
+            # the old IoCs of the file were deleted from the db,
+            # don't keep finding them in the snapshot
+            self.write_ioc_snapshot()
         self.update_local_file('own_malicious_JA3.csv')
         self.update_local_file('own_malicious_JARM.csv')
         self.circllu_calls_thread.start()
         __database__.init_ti_queue()
 
     def main(self):
+        if msg := self.get_msg('new_ip_ranges'):
+            self.add_ranges_to_index(json.loads(msg['data']))
+
+        if msg := self.get_msg('new_runtime_ips'):
+            self.runtime_ips.update(json.loads(msg['data']))
+
         # The channel now can receive an IP address or a domain name
         if msg:= self.get_msg('give_threat_intelligence'):
             # Data is sent in the channel as a json dict so we need to deserialize it first
@@ -50,7 +50,7 @@ class Module(Module, multiprocessing.Process):
         try:
             # Convert the common fields to something that can be interpreted
             uid = next(iter(flow))
-            flow_dict = json.loads(flow[uid])
+            flow_dict = flow[uid]
             profile_ip = profileid.split('_')[1]
             dur = round(float(flow_dict['dur']), 3)
             stime = flow_dict['ts']
@@ -379,14 +379,13 @@ class Module(Module, multiprocessing.Process):
     def main(self):
         # Main loop function
         if msg:= self.get_msg('new_flow'):
-            mdata = msg['data']
-            # Convert from json to dict
-            mdata = json.loads(mdata)
+            mdata = __database__.decode_new_flow(msg['data'])
             profileid = mdata['profileid']
             twid = mdata['twid']
-            flow = mdata['flow']
-            timestamp = mdata['stime']
-            flow = json.loads(flow)
+            if not (flow := __database__.get_flow_from_msg(mdata)):
+                return
+            timestamp = flow['ts']
+            flow = {mdata['uid']: flow}
             self.process_flow(
                 profileid, twid, flow, timestamp
             )
@@ -2,6 +2,8 @@ from slips_files.core.database.database import __database__
 from slips_files.common.config_parser import ConfigParser
 from slips_files.common.slips_utils import utils
 from slips_files.core.whitelist import Whitelist
+from slips_files.common.oui_index import OUIIndex
+from slips_files.common.ioc_snapshot import IoCSnapshot
 import time
 import os
 import json
@@ -11,47 +13,87 @@ import traceback
 import requests
 import sys
 import asyncio
+import concurrent.futures
+import multiprocessing
 import datetime
 
 
+# the update manager of this TI worker, created by init_ti_worker()
+ti_worker_update_manager = None
+
+
+def init_ti_worker(outputqueue, redis_port, url_feeds: dict, ti_chunk_size):
+    """
+    Runs once in each TI worker when it starts. The workers are started using
+    forkserver because the update manager process runs timer threads and forking
+    a multi-threaded process isn't safe, so they inherit nothing and create
+    their own connection to the db and update manager here
+    """
+    global ti_worker_update_manager
+    # only connect, the redis server is the one of this slips run, and
+    # __database__.start() would flush its db
+    __database__.connect_to_redis(redis_port)
+    ti_worker_update_manager = UpdateFileManager.create_ti_worker(
+        outputqueue, url_feeds, ti_chunk_size
+    )
+
+
+def parse_ti_feed_in_worker(link_to_download, ti_file_path: str) -> tuple:
+    """
+    Parses the given TI feed in a TI worker
+    returns whether it was parsed and the ips found in it
+    """
+    update_manager = ti_worker_update_manager
+    update_manager.ips_ctr = {}
+    parsed = update_manager.parse_ti_feed(link_to_download, ti_file_path)
+    return parsed, list(update_manager.ips_ctr)
+
+
 class UpdateFileManager:
+    # For now, read the malicious IPs from here
+    name = 'Update File Manager'
+    # don't store iocs older than 1 week
+    interval = 7
+    # if any keyword of the following is present in a line
+    # then this line should be ignored by slips
+    # either a not supported ioc type or a header line etc.
+    # make sure the header keywords are lowercase because
+    # we convert lines to lowercase when comparing
+    header_keywords = (
+        'type',
+        'first_seen_utc',
+        'ip_v4',
+        '"domain"',
+        '#"type"',
+        '#fields',
+        'number',
+        'atom_type',
+        'attacker'
+    )
+    ignored_IoCs = ('email', 'url', 'file_hash', 'file')
+
     def __init__(self, outputqueue, redis_port):
         self.outputqueue = outputqueue
-        # For now, read the malicious IPs from here
-        self.name = 'Update File Manager'
+        self.redis_port = redis_port
         __database__.start(redis_port)
         # Get a separator from the database
         self.separator = __database__.getFieldSeparator()
+        # set when the IoCs of a feed removed from the feeds file are deleted,
+        # the snapshot of the IoCs is written again in the next update
+        self.deleted_feeds = False
         self.read_configuration()
         # this will store the number of loaded ti files
         self.loaded_ti_files = 0
-        # don't store iocs older than 1 week
-        self.interval = 7
         self.whitelist = Whitelist(outputqueue, redis_port)
         self.slips_logfile = __database__.get_stdfile("stdout")
         self.org_info_path = 'slips_files/organizations_info/'
-        # if any keyword of the following is present in a line
-        # then this line should be ignored by slips
-        # either a not supported ioc type or a header line etc.
-        # make sure the header keywords are lowercase because
-        # we convert lines to lowercase when comparing
-        self.header_keywords = (
-            'type',
-            'first_seen_utc',
-            'ip_v4',
-            '"domain"',
-            '#"type"',
-            '#fields',
-            'number',
-            'atom_type',
-            'attacker'
-        )
-        self.ignored_IoCs = ('email', 'url', 'file_hash', 'file')
         # to track how many times an ip is present in different blacklists
         self.ips_ctr = {}
         self.first_time_reading_files = False
         # store the responses of the files that should be updated when their update period passed
         self.responses = {}
+        # processes that parse the TI feeds in parallel while updating them
+        self.ti_workers_pool = None
 
     def read_configuration(self):
         def read_riskiq_creds(RiskIQ_credentials_path):
@@ -79,6 +121,9 @@ class UpdateFileManager:
             os.mkdir(self.path_to_remote_ti_files)
 
         self.ti_feeds_path = conf.ti_files()
+        self.ti_chunk_size = conf.ti_chunk_size()
+        self.ti_workers = conf.ti_workers()
+        self.use_ioc_snapshot = conf.ioc_snapshot()
         self.url_feeds = self.get_feed_details(self.ti_feeds_path)
         self.ja3_feeds_path = conf.ja3_feeds()
         self.ja3_feeds = self.get_feed_details(self.ja3_feeds_path)
@@ -131,6 +176,7 @@ class UpdateFileManager:
                     __database__.delete_feed(feed)
                     # to avoid calling delete_feed again with the same feed
                     __database__.delete_file_info(feed)
+                    self.deleted_feeds = True
                 continue
 
             # make sure the given tl is valid
@@ -578,7 +624,7 @@ class UpdateFileManager:
                 return False
 
             # is it a ti_file? load updated IPs/domains to the database
-            elif link_to_download in self.url_feeds and not self.parse_ti_feed(
+            elif link_to_download in self.url_feeds and not await self.load_ti_feed(
                 link_to_download, full_path
             ):
                 self.print(
@@ -1048,27 +1094,100 @@ class UpdateFileManager:
         :param blacklist: t make sure we don't count the ip twice in the same blacklist
         """
         blacklist =  os.path.basename(blacklist)
-        if (
-            ip in self.ips_ctr
-            and
-            blacklist not in self.ips_ctr['blacklists']
-        ):
-            self.ips_ctr[ip]['times_found'] += 1
-            self.ips_ctr[ip]['blacklists'].append(blacklist)
-        else:
+        if ip not in self.ips_ctr:
             self.ips_ctr[ip] = {
                 'times_found': 1,
                 'blacklists': [blacklist]
             }
+        elif blacklist not in self.ips_ctr[ip]['blacklists']:
+            self.ips_ctr[ip]['times_found'] += 1
+            self.ips_ctr[ip]['blacklists'].append(blacklist)
 
+    def read_ti_feed_header(self, feed, ti_file_path: str):
+        """
+        Skips the comments and headers at the beginning of the given feed and
+        finds the columns of its IoCs
+        returns (line_fields, separator, data_column, description_column) of the
+        first line of IoCs, or False if there's no column with an IP or domain
+        """
+        self.print(
+            f'Reading next lines in the file {ti_file_path} '
+            f'for IoC', 3, 0,
+        )
+
+        # Remove comments and find the description column if possible
+        description_column = None
+
+        while line := feed.readline():
+            # Try to find the line that has column names
+            for keyword in self.header_keywords:
+                if line.startswith(keyword):
+                    # looks like the column names, search where is the description column
+                    description_column = self.get_description_column(line)
+                    break
+
+            if not self.is_ignored_line(line):
+                break
+
+        # Store the current position of the TI file
+        current_file_position = feed.tell()
+        line = line.replace('\n', '').replace('"', '')
+
+        amount_of_columns, line_fields, separator = self.parse_line(line, ti_file_path)
+        if description_column is None:
+            # assume it's the last column
+            description_column = amount_of_columns - 1
+        data_column = self.get_data_column(amount_of_columns, line_fields, ti_file_path)
+        if data_column == 'Error':  # don't use 'if not' because it may be 0
+            return False
+
+        # Now that we read the first line, go back so we can process it
+        feed.seek(current_file_position)
+        return line_fields, separator, data_column, description_column
+
+    def is_ignored_ioc(self, data: str, data_type: str) -> bool:
+        """
+        we don't blacklist private, multicast or link local ips and ranges,
+        or the ranges of our home network
+        """
+        if data_type == 'domain':
+            return False
+
+        if data_type == 'ip_range':
+            # get network address from range
+            net_addr = data[: data.index('/')]
+            if net_addr in utils.home_networks:
+                return True
+            data = net_addr
+
+        ip_obj = ipaddress.ip_address(data)
+        return ip_obj.is_private or ip_obj.is_multicast or ip_obj.is_link_local
+
+    def store_ti_chunk(self, chunk: dict, link_to_download: str):
+        """
+        Stores the IoCs read from a part of a TI feed in the db
+        :param chunk: {'ip': {ip: json info}, 'domain': {...}, 'ip_range': {...}}
+        """
+        __database__.add_iocs_to_IoC(
+            chunk['ip'], chunk['domain'], chunk['ip_range']
+        )
+        # set the score and confidence of the new ips in ipsinfo
+        # and the profile of these ips to the same as the ones given in slips.conf
+        # todo for now the confidence is 1
+        __database__.update_threat_levels(
+            [f'profile_{ip}' for ip in chunk['ip']],
+            self.url_feeds[link_to_download]['threat_level'],
+            1,
+        )
 
     def parse_ti_feed(
             self, link_to_download, ti_file_path: str
     ) -> bool:
         """
-        Read all the files holding IP addresses and a description and put the
-        info in a large dict.
-        This also helps in having unique ioc across files
+        Read the file holding IP addresses, ranges or domains and a description
+        and store them in the db.
+        The file is read and stored in chunks of ti_chunk_size IoCs so the memory
+        used doesn't grow with the size of the feed
         :param link_to_download: this link that has the IOCs we're currently parsing, used for getting the threat_level
         :param ti_file_path: this is the path where the saved file from the link is downloaded
         """
@@ -1083,50 +1202,24 @@ class UpdateFileManager:
             if filesize == 0:
                 return False
 
-            malicious_ips_dict = {}
-            malicious_domains_dict = {}
-            malicious_ip_ranges = {}
             if 'json' in ti_file_path:
                 return self.parse_json_ti_feed(
                     link_to_download, ti_file_path
                 )
 
+            threat_level = self.url_feeds[link_to_download]['threat_level']
+            tags = self.url_feeds[link_to_download]['tags']
+            data_file_name = ti_file_path.split('/')[-1]
 
             with open(ti_file_path) as feed:
-                self.print(
-                    f'Reading next lines in the file {ti_file_path} '
-                    f'for IoC', 3, 0,
-                )
-
-                # Remove comments and find the description column if possible
-                description_column = None
-
-                while line := feed.readline():
-                    # Try to find the line that has column names
-                    for keyword in self.header_keywords:
-                        if line.startswith(keyword):
-                            # looks like the column names, search where is the description column
-                            description_column = self.get_description_column(line)
-                            break
-
-                    if not self.is_ignored_line(line):
-                        break
-
-                # Store the current position of the TI file
-                current_file_position = feed.tell()
-                line = line.replace('\n', '').replace('"', '')
-
-                amount_of_columns, line_fields, separator = self.parse_line(line, ti_file_path)
-                if description_column is None:
-                    # assume it's the last column
-                    description_column = amount_of_columns - 1
-                data_column = self.get_data_column(amount_of_columns, line_fields, ti_file_path)
-                if data_column == 'Error':  # don't use 'if not' because it may be 0
+                header = self.read_ti_feed_header(feed, ti_file_path)
+                if not header:
                     return False
+                line_fields, separator, data_column, description_column = header
 
-                # Now that we read the first line, go back so we can process it
-                feed.seek(current_file_position)
-
+                # the IoCs of the current chunk by type
+                chunk = {'ip': {}, 'domain': {}, 'ip_range': {}}
+                iocs_in_chunk = 0
                 for line in feed:
                     # The format of the file should be
                     # "0", "103.15.53.231","90", "Karel from our village. He is bad guy."
@@ -1160,8 +1253,6 @@ class UpdateFileManager:
                     if len(data) < 3:
                         continue
 
-                    data_file_name = ti_file_path.split('/')[-1]
-
                     data_type = utils.detect_data_type(data)
                     if data_type is None:
                         self.print(
@@ -1171,193 +1262,34 @@ class UpdateFileManager:
                         )
                         continue
 
-                    if data_type == 'domain':
-                        # if we have info about the ioc, append to it, if we don't add a new entry in the correct dict
-                        try:
-                            # we already have info about this domain?
-                            old_domain_info = json.loads(
-                                malicious_domains_dict[str(data)]
-                            )
-                            # if the domain appeared twice in the same blacklist,  skip it
-                            if data_file_name in old_domain_info['source']:
-                                continue
-                            # append the new blacklist name to the current one
-                            source = f'{old_domain_info["source"]}, {data_file_name}'
-                            # append the new tag to the current tag
-                            tags = f'{old_domain_info["tags"]}, {self.url_feeds[link_to_download]["tags"]}'
-                            # the new threat_level is the maximum threat_level
-                            threat_level = str(
-                                max(
-                                    float(old_domain_info['threat_level']),
-                                    float(
-                                        self.url_feeds[link_to_download][
-                                            'threat_level'
-                                        ]
-                                    ),
-                                )
-                            )
-                            # Store the ip in our local dict
-                            malicious_domains_dict[str(data)] = json.dumps(
-                                {
-                                    'description': old_domain_info[
-                                        'description'
-                                    ],
-                                    'source': source,
-                                    'threat_level': threat_level,
-                                    'tags': tags,
-                                }
-                            )
-                        except KeyError:
-                            # We don't have info about this domain, Store the ip in our local dict
-                            malicious_domains_dict[str(data)] = json.dumps(
-                                {
-                                    'description': description,
-                                    'source': data_file_name,
-                                    'threat_level': self.url_feeds[
-                                        link_to_download
-                                    ]['threat_level'],
-                                    'tags': self.url_feeds[link_to_download][
-                                        'tags'
-                                    ],
-                                }
-                            )
-                    elif data_type == 'ip':
-                        # make sure we're not blacklisting a private ip
-                        ip_obj = ipaddress.ip_address(data)
-                        if (
-                            ip_obj.is_private
-                            or ip_obj.is_multicast
-                            or ip_obj.is_link_local
-                        ):
-                            continue
-
-                        try:
-                            self.add_to_ip_ctr(data, ti_file_path)
-                            # we already have info about this ip?
-                            old_ip_info = json.loads(
-                                malicious_ips_dict[str(data)]
-                            )
-                            # if the IP appeared twice in the same blacklist, don't add the blacklist name twice
-                            # or calculate the max threat_level
-                            if data_file_name in old_ip_info['source']:
-                                continue
-                            # append the new blacklist name to the current one
-                            source = (
-                                f'{old_ip_info["source"]}, {data_file_name}'
-                            )
-                            # append the new tag to the old tag
-                            tags = f'{old_ip_info["tags"]}, {self.url_feeds[link_to_download]["tags"]}'
-                            # the new threat_level is the max of the 2
-                            threat_level = str(
-                                max(
-                                    int(old_ip_info['threat_level']),
-                                    int(
-                                        self.url_feeds[link_to_download][
-                                            'threat_level'
-                                        ]
-                                    ),
-                                )
-                            )
-                            malicious_ips_dict[str(data)] = json.dumps(
-                                {
-                                    'description': old_ip_info['description'],
-                                    'source': source,
-                                    'threat_level': threat_level,
-                                    'tags': tags,
-                                }
-                            )
-                            # print(f'Dulicate ip {data} found in sources: {source} old threat_level: {ip_info["threat_level"]}
-                        except KeyError:
-                            threat_level = self.url_feeds[link_to_download][
-                                'threat_level'
-                            ]
-                            # We don't have info about this IP, Store the ip in our local dict
-                            malicious_ips_dict[str(data)] = json.dumps(
-                                {
-                                    'description': description,
-                                    'source': data_file_name,
-                                    'threat_level': threat_level,
-                                    'tags': self.url_feeds[link_to_download][
-                                        'tags'
-                                    ],
-                                }
-                            )
-                            # set the score and confidence of this ip in ipsinfo
-                            # and the profile of this ip to the same as the ones given in slips.conf
-                            # todo for now the confidence is 1
-                            __database__.update_threat_level(
-                                f'profile_{data}', threat_level, 1
-                            )
-                    elif data_type == 'ip_range':
-                        # make sure we're not blacklisting a private or multicast ip range
-                        # get network address from range
-                        net_addr = data[: data.index('/')]
-                        ip_obj = ipaddress.ip_address(net_addr)
-                        if (
-                            ip_obj.is_multicast
-                            or ip_obj.is_private
-                            or ip_obj.is_link_local
-                            or net_addr in utils.home_networks
-                        ):
-                            continue
-
-                        try:
-                            # we already have info about this range?
-                            old_range_info = json.loads(
-                                malicious_ip_ranges[data]
-                            )
-                            # if the Range appeared twice in the same blacklist, don't add the blacklist name twice
-                            # or calculate the max threat_level
-                            if data_file_name in old_range_info['source']:
-                                continue
-                            # append the new blacklist name to the current one
-                            source = (
-                                f'{old_range_info["source"]}, {data_file_name}'
-                            )
-                            # append the new tag to the old tag
-                            tags = f'{old_range_info["tags"]}, {self.url_feeds[link_to_download]["tags"]}'
-                            # the new threat_level is the max of the 2
-                            threat_level = str(
-                                max(
-                                    int(old_range_info['threat_level']),
-                                    int(
-                                        self.url_feeds[link_to_download][
-                                            'threat_level'
-                                        ]
-                                    ),
-                                )
-                            )
-                            malicious_ip_ranges[str(data)] = json.dumps(
-                                {
-                                    'description': old_range_info[
-                                        'description'
-                                    ],
-                                    'source': source,
-                                    'threat_level': threat_level,
-                                    'tags': tags,
-                                }
-                            )
-                            # print(f'Duplicate up range {data} found in
-                            # sources: {source} old threat_level: {ip_info["threat_level"]}
-
-                        except KeyError:
-                            # We don't have info about this range, Store the ip in our local dict
-                            malicious_ip_ranges[data] = json.dumps(
-                                {
-                                    'description': description,
-                                    'source': data_file_name,
-                                    'threat_level': self.url_feeds[
-                                        link_to_download
-                                    ]['threat_level'],
-                                    'tags': self.url_feeds[link_to_download][
-                                        'tags'
-                                    ],
-                                }
-                            )
+                    if (
+                        data_type not in chunk
+                        or self.is_ignored_ioc(data, data_type)
+                    ):
+                        continue
 
-            __database__.add_ips_to_IoC(malicious_ips_dict)
-            __database__.add_domains_to_IoC(malicious_domains_dict)
-            __database__.add_ip_range_to_IoC(malicious_ip_ranges)
+                    if data_type == 'ip':
+                        self.add_to_ip_ctr(data, ti_file_path)
+
+                    # if the ioc appeared twice in the same chunk, keep the first one
+                    if data in chunk[data_type]:
+                        continue
+
+                    chunk[data_type][data] = json.dumps(
+                        {
+                            'description': description,
+                            'source': data_file_name,
+                            'threat_level': threat_level,
+                            'tags': tags,
+                        }
+                    )
+                    iocs_in_chunk += 1
+                    if iocs_in_chunk == self.ti_chunk_size:
+                        self.store_ti_chunk(chunk, link_to_download)
+                        chunk = {'ip': {}, 'domain': {}, 'ip_range': {}}
+                        iocs_in_chunk = 0
+
+            self.store_ti_chunk(chunk, link_to_download)
             return True
 
         except Exception:
@@ -1369,6 +1301,64 @@ class UpdateFileManager:
             self.print(traceback.format_exc(), 0, 1)
             return False
 
+    async def load_ti_feed(self, link_to_download, ti_file_path: str) -> bool:
+        """
+        Parses the given TI feed in one of the TI workers if there are any,
+        so the feeds are parsed in parallel, otherwise in this process
+        """
+        if self.ti_workers_pool is None:
+            return self.parse_ti_feed(link_to_download, ti_file_path)
+
+        loop = asyncio.get_running_loop()
+        parsed, ips = await loop.run_in_executor(
+            self.ti_workers_pool,
+            parse_ti_feed_in_worker,
+            link_to_download,
+            ti_file_path,
+        )
+        # the worker counted the ips of this feed in its own ips_ctr
+        for ip in ips:
+            self.add_to_ip_ctr(ip, ti_file_path)
+        return parsed
+
+    @classmethod
+    def create_ti_worker(cls, outputqueue, url_feeds: dict, ti_chunk_size):
+        """
+        returns an update manager that only parses TI feeds, used by the TI workers.
+        unlike __init__, it doesn't start the db or read the config,
+        it uses the feeds and chunk size of the update manager that started the worker
+        """
+        update_manager = cls.__new__(cls)
+        update_manager.outputqueue = outputqueue
+        update_manager.url_feeds = url_feeds
+        update_manager.ti_chunk_size = ti_chunk_size
+        update_manager.ips_ctr = {}
+        return update_manager
+
+    def start_ti_workers(self):
+        """
+        Starts the processes that parse the TI feeds using forkserver,
+        each of them creates its own update manager in init_ti_worker()
+        """
+        if self.ti_workers <= 1:
+            return
+        self.ti_workers_pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.ti_workers,
+            mp_context=multiprocessing.get_context('forkserver'),
+            initializer=init_ti_worker,
+            initargs=(
+                self.outputqueue,
+                self.redis_port,
+                self.url_feeds,
+                self.ti_chunk_size,
+            ),
+        )
+
+    def stop_ti_workers(self):
+        if self.ti_workers_pool is not None:
+            self.ti_workers_pool.shutdown()
+            self.ti_workers_pool = None
+
     def check_if_update_org(self, file):
         cached_hash = __database__.get_TI_file_info(file).get('hash','')
         if utils.get_hash_from_file(file) != cached_hash:
@@ -1452,12 +1442,14 @@ class UpdateFileManager:
             return False
 
         self.log('Updating the MAC database.')
-        path_to_mac_db = 'databases/macaddress-db.json'
+        path_to_mac_db = OUIIndex.mac_db_path
 
         # write to file the info as 1 json per line
         mac_info = response.text.replace(']','').replace('[','').replace(',{','\n{')
         with open(path_to_mac_db, 'w') as mac_db:
             mac_db.write(mac_info)
+        # index the vendor of each OUI so ip_info doesn't have to scan the mac db
+        OUIIndex.from_mac_db(mac_info.splitlines()).save()
 
         __database__.set_TI_file_info(
             self.mac_db_link,
@@ -1465,6 +1457,51 @@ class UpdateFileManager:
         )
         return True
 
+    def write_ioc_snapshot(self):
+        """
+        Writes all the IoCs in the cache db to the snapshot that the threat
+        intelligence module and the whitelist look them up in
+        """
+        try:
+            IoCSnapshot.write_from_db(__database__)
+        except OSError as e:
+            self.print(f'Error writing the IoC snapshot {IoCSnapshot.path}: {e}', 0, 1)
+            return
+        self.log(f'Wrote the IoC snapshot {IoCSnapshot.path}')
+
+    def load_iocs_from_snapshot(self):
+        """
+        Loads the IoCs in the snapshot and the info of their feeds, like their
+        e-tags, when the cache db is empty, e.g. after clearing it, so the feeds
+        that didn't change aren't downloaded and parsed again
+        """
+        if __database__.get_all_TI_files_info():
+            # the cache db already has the IoCs
+            return
+        ioc_snapshot = IoCSnapshot.open()
+        if ioc_snapshot is None:
+            return
+        # the ja3, jarm and ssl feeds and the mac db aren't in the snapshot,
+        # they're downloaded again
+        feeds = {
+            feed: info
+            for feed, info in ioc_snapshot.metadata.get('feeds', {}).items()
+            if feed in self.url_feeds or feed in ('riskiq_domains', 'tranco_whitelist')
+        }
+        if feeds:
+            __database__.add_iocs_to_IoC(
+                dict(ioc_snapshot.items('ips')),
+                dict(ioc_snapshot.items('domains')),
+                dict(ioc_snapshot.items('ip_ranges')),
+            )
+            __database__.store_tranco_whitelisted_domains(
+                list(ioc_snapshot.keys('tranco_whitelist'))
+            )
+            for feed, info in feeds.items():
+                __database__.set_TI_file_info(feed, info)
+            self.log(f'Loaded the IoCs of {len(feeds)} feeds from the IoC snapshot {IoCSnapshot.path}')
+        ioc_snapshot.close()
+
     def update_online_whitelist(self):
         """
         Updates online tranco whitelist defined in slips.conf online_whitelist key
@@ -1499,11 +1536,19 @@ class UpdateFileManager:
         try:
             self.log('Checking if we need to download TI files.')
 
+            if self.use_ioc_snapshot:
+                self.load_iocs_from_snapshot()
+
             if self.__check_if_update(self.mac_db_link, self.mac_db_update_period):
                 self.update_mac_db()
 
+            # the snapshot of the IoCs is written again if any of them changed
+            # or were deleted
+            iocs_updated, self.deleted_feeds = self.deleted_feeds, False
+
             if self.__check_if_update_online_whitelist():
                 self.update_online_whitelist()
+                iocs_updated = True
 
             ############### Update remote TI files ################
             # Check if the remote file is newer than our own
@@ -1513,6 +1558,8 @@ class UpdateFileManager:
             files_to_download.update(self.ja3_feeds)
             files_to_download.update(self.ssl_feeds)
 
+            self.start_ti_workers()
+            tasks = []
             for file_to_download in files_to_download:
                 if self.__check_if_update(file_to_download, self.update_period):
                     # failed to get the response, either a server problem
@@ -1521,28 +1568,35 @@ class UpdateFileManager:
 
                     # this run wasn't started with existing ti files in the db
                     self.first_time_reading_files = True
+                    iocs_updated = True
 
                     # every function call to update_TI_file is now running concurrently instead of serially
                     # so when a server's taking a while to give us the TI feed, we proceed
                     # to download the next file instead of being idle
-                    task = asyncio.create_task(
-                        self.update_TI_file(file_to_download)
+                    tasks.append(
+                        asyncio.create_task(
+                            self.update_TI_file(file_to_download)
+                        )
                     )
             #######################################################
             # in case of riskiq files, we don't have a link for them in ti_files, We update these files using their API
             # check if we have a username and api key and a week has passed since we last updated
             if self.__check_if_update('riskiq_domains', self.riskiq_update_period):
                 self.update_riskiq_feed()
+                iocs_updated = True
 
             # wait for all TI files to update
-            try:
-                await task
-            except UnboundLocalError:
-                # in case all our files are updated, we don't have task defined, skip
-                pass
+            await asyncio.gather(*tasks)
+
+            if self.use_ioc_snapshot and (
+                iocs_updated or not os.path.exists(IoCSnapshot.path)
+            ):
+                self.write_ioc_snapshot()
 
             __database__.set_loaded_ti_files(self.loaded_ti_files)
             self.print_duplicate_ip_summary()
             self.loaded_ti_files = 0
         except KeyboardInterrupt:
             return False
+        finally:
+            self.stop_ti_workers()
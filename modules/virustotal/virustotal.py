@@ -531,18 +531,12 @@ class Module(Module, multiprocessing.Process):
             return 1
 
         if msg:= self.get_msg('new_flow'):
-            data = msg['data']
-            data = json.loads(data)
+            data = __database__.decode_new_flow(msg['data'])
             # profileid = data['profileid']
             # twid = data['twid']
             # stime = data['stime']
-            flow = json.loads(
-                data['flow']
-            )   # this is a dict {'uid':json flow data}
-            # there is only one pair key-value in the dictionary
-            for key, value in flow.items():
-                flow_data = json.loads(value)
-            ip = flow_data['daddr']
+            # the daddr is in the msg, no need to read the flow
+            ip = data['daddr']
             cached_data = __database__.getIPData(ip)
             if not cached_data:
                 cached_data = {}
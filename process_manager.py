@@ -3,6 +3,7 @@ from slips_files.common.slips_utils import utils
 from slips_files.core.database.database import __database__
 from style import green
 import signal
+import queue
 import os
 import time
 import pkgutil
@@ -51,7 +52,12 @@ class ProcessManager:
         else:
             # Send manual stops to the processes using queues
             stop_msg = 'stop_process'
-            self.main.profilerProcessQueue.put(stop_msg)
+            try:
+                # the profiler queue is bounded, if the profiler is stuck and the queue
+                # is full, don't block the shutdown forever
+                self.main.profilerProcessQueue.put(stop_msg, timeout=5)
+            except queue.Full:
+                self.kill('Profiler')
             self.main.outputqueue.put(stop_msg)
 
     def get_modules(self, to_ignore):
@@ -34,7 +34,7 @@ import socket
 from multiprocessing import Queue
 from slips_files.core.inputProcess import InputProcess
 from slips_files.core.outputProcess import OutputProcess
-from slips_files.core.profilerProcess import ProfilerProcess
+from slips_files.core.profilerProcess import ProfilerProcess, ProfilerWorker
 from slips_files.core.evidenceProcess import EvidenceProcess
 
 import signal
@@ -420,6 +420,36 @@ class Main:
         ):
             return True
 
+    def start_profiler_workers(self) -> list:
+        """
+        starts the profiler workers if profiler_workers in slips.conf is more than 1
+        returns the queues the profiler should use to send flows to each worker
+        """
+        workers = self.conf.profiler_workers()
+        if workers < 2:
+            return []
+
+        workers_queues = []
+        for worker_id in range(1, workers + 1):
+            queue = Queue(maxsize=1000)
+            worker = ProfilerWorker(
+                queue,
+                self.outputqueue,
+                self.args.verbose,
+                self.args.debug,
+                self.redis_port,
+                worker_id,
+            )
+            worker.start()
+            self.print(
+                f'Started {green(worker.name)} '
+                f'[PID {green(worker.pid)}]', 1, 0
+            )
+            # the workers publish their names in finished_modules when they stop
+            __database__.store_process_PID(worker.name, int(worker.pid))
+            workers_queues.append(queue)
+        return workers_queues
+
     def start(self):
         """Main Slips Function"""
         try:
@@ -548,13 +578,18 @@ class Main:
                 int(self.pid)
             )
 
-            self.profilerProcessQueue = Queue()
+            # the queue is bounded so the input process blocks (back-pressure)
+            # instead of buffering the whole file in memory when the profiler is slower.
+            # each item is a batch of flows_batch_size flows
+            self.profilerProcessQueue = Queue(maxsize=1000)
+            workers_queues = self.start_profiler_workers()
             profiler_process = ProfilerProcess(
                 self.profilerProcessQueue,
                 self.outputqueue,
                 self.args.verbose,
                 self.args.debug,
                 self.redis_port,
+                workers_queues=workers_queues,
             )
             profiler_process.start()
             self.print(
@@ -13,6 +13,12 @@ class Module(ABC):
         self.outputqueue = outputqueue
         self.control_channel = __database__.subscribe('control_module')
         self.msg_received = True
+        # {channel_name: handler} modules that set this in their __init__ don't need main(),
+        # they block on all these channels at once and each msg is passed to
+        # the handler of its channel as soon as it arrives. see dispatch_msgs()
+        self.handlers = {}
+        # max seconds to block waiting for msgs when using handlers
+        self.blocking_timeout = 1
 
     def should_stop(self) -> bool:
         """
@@ -56,11 +62,11 @@ class Module(ABC):
         Tells slips.py that this module is
         done processing and does necessary cleanup
         """
-    @abstractmethod
     def main(self):
         """
         Main function of every module, all the logic implemented
         here will be executed in a loop
+        Not used by modules that define self.handlers
         """
 
     def pre_main(self):
@@ -78,6 +84,50 @@ class Module(ABC):
             self.msg_received = False
             return False
 
+    def dispatch_msgs(self):
+        """
+        Event-driven alternative to calling main() in a loop.
+        Blocks on all the channels in self.handlers and the control channel
+        using 1 pubsub, and calls the handler of each msg's channel.
+        When stop_process is received, the msgs already published are handled
+        before stopping the module
+        """
+        pubsub = __database__.subscribe([*self.handlers, 'control_module'])
+        stopping = False
+        while True:
+            try:
+                # once we're stopping, don't block, just handle what's left
+                timeout = 0 if stopping else self.blocking_timeout
+                message = __database__.get_message(pubsub, timeout=timeout)
+                if not message:
+                    if stopping:
+                        # no msgs left to process
+                        self.shutdown_gracefully()
+                        return True
+                    continue
+
+                channel = message['channel']
+                if channel == 'control_module':
+                    if message['data'] == 'stop_process':
+                        stopping = True
+                    continue
+
+                if utils.is_msg_intended_for(message, channel):
+                    # if a handler returns 1, it means there's an error and the module needs to stop immediately
+                    error: bool = self.handlers[channel](message)
+                    if error:
+                        self.shutdown_gracefully()
+                        return True
+
+            except KeyboardInterrupt:
+                # the module is stopped using the control channel
+                continue
+            except Exception:
+                exception_line = sys.exc_info()[2].tb_lineno
+                self.print(f'Problem in dispatch_msgs() line {exception_line}', 0, 1)
+                self.print(traceback.format_exc(), 0, 1)
+                return True
+
     def run(self):
         """ This is the loop function, it runs non-stop as long as the module is online """
         try:
@@ -94,6 +144,9 @@ class Module(ABC):
             self.print(traceback.format_exc(), 0, 1)
             return True
 
+        if self.handlers:
+            return self.dispatch_msgs()
+
         error = False
         while not error:
             try:
@@ -491,6 +491,54 @@ class ConfigParser(object):
             'flowmldetection', 'mode', 'test'
         )
 
+    def ml_batch_size(self) -> int:
+        """
+        returns the max number of flows the flowmldetection module detects at once in test mode
+        """
+        batch_size = self.read_configuration(
+            'flowmldetection', 'batch_size', 100
+        )
+        try:
+            batch_size = max(int(batch_size), 1)
+        except ValueError:
+            batch_size = 100
+        return batch_size
+
+    def ml_batch_timeout(self) -> float:
+        """
+        returns the max time in ms a flow waits to be detected in test mode
+        """
+        timeout = self.read_configuration(
+            'flowmldetection', 'batch_timeout', 100
+        )
+        try:
+            timeout = float(timeout)
+        except ValueError:
+            timeout = 100
+        return timeout
+
+    def ml_incremental_training(self) -> bool:
+        """
+        returns True if the flowmldetection module should train only with the new flows
+        """
+        incremental = self.read_configuration(
+            'flowmldetection', 'incremental_training', 'no'
+        )
+        return 'yes' in incremental.lower()
+
+    def ml_checkpoint_interval(self) -> float:
+        """
+        returns the seconds between storing the model on disk when training incrementally
+        """
+        interval = self.read_configuration(
+            'flowmldetection', 'checkpoint_interval', 300
+        )
+        try:
+            interval = float(interval)
+        except ValueError:
+            interval = 300
+        return interval
+
     def RiskIQ_credentials_path(self):
         return self.read_configuration(
             'threatintelligence', 'RiskIQ_credentials_path', ''
@@ -519,6 +567,42 @@ class ConfigParser(object):
             False
         )
 
+    def ti_chunk_size(self) -> int:
+        """
+        returns how many IoCs of a TI feed are read before storing them in the db
+        """
+        chunk_size = self.read_configuration(
+            'threatintelligence', 'ti_chunk_size', 10000
+        )
+        try:
+            chunk_size = int(chunk_size)
+        except ValueError:
+            chunk_size = 10000
+        return max(chunk_size, 1)
+
+    def ti_workers(self) -> int:
+        """
+        returns how many processes parse the TI feeds in parallel
+        """
+        workers = self.read_configuration(
+            'threatintelligence', 'ti_workers', 4
+        )
+        try:
+            workers = int(workers)
+        except ValueError:
+            workers = 4
+        return max(workers, 1)
+
+    def ioc_snapshot(self) -> bool:
+        """
+        returns True if the modules should look up the IoCs in the snapshot
+        written by the update manager instead of the cache db
+        """
+        use_snapshot = self.read_configuration(
+            'threatintelligence', 'ioc_snapshot', 'yes'
+        )
+        return 'yes' in use_snapshot.lower()
+
     def ja3_feeds(self):
         return self.read_configuration(
             'threatintelligence',
@@ -539,6 +623,12 @@ class ConfigParser(object):
             'modules', 'timeline_human_timestamp', False
         )
 
+    def preload_asn_ranges(self):
+        preload = self.read_configuration(
+            'modules', 'preload_asn_ranges', 'no'
+        )
+        return 'yes' in preload.lower()
+
     def analysis_direction(self):
         return self.read_configuration(
              'parameters', 'analysis_direction', False
@@ -616,6 +706,96 @@ class ConfigParser(object):
 
         return period *24*60*60
 
+    def flows_batch_size(self) -> int:
+        """
+        returns the number of lines the input process sends to the profiler at once
+        """
+        batch_size = self.read_configuration(
+            'parameters', 'flows_batch_size', 100
+        )
+        try:
+            batch_size = max(int(batch_size), 1)
+        except ValueError:
+            batch_size = 100
+        return batch_size
+
+    def flows_batch_timeout(self) -> float:
+        """
+        returns the max time in ms to wait before sending a partial batch to the profiler
+        """
+        timeout = self.read_configuration(
+            'parameters', 'flows_batch_timeout', 100
+        )
+        try:
+            timeout = float(timeout)
+        except ValueError:
+            timeout = 100
+        return timeout
+
+    def profiler_workers(self) -> int:
+        """
+        returns the number of profiler workers to shard the flows between
+        """
+        workers = self.read_configuration(
+            'parameters', 'profiler_workers', 1
+        )
+        try:
+            workers = int(workers)
+        except ValueError:
+            workers = 1
+        return max(workers, 1)
+
+    def flow_codec(self) -> str:
+        """
+        returns the codec used to store the flows in the db, json or msgpack
+        """
+        codec = self.read_configuration(
+            'parameters', 'flow_codec', 'json'
+        )
+        codec = codec.strip().lower()
+        if codec not in ('json', 'msgpack'):
+            codec = 'json'
+        return codec
+
+    def new_flow_notifications(self) -> str:
+        """
+        returns what the new_flow msgs carry,
+        full: the whole flow, reference: the profileid, twid, uid, type, proto and daddr of the flow
+        """
+        notifications = self.read_configuration(
+            'parameters', 'new_flow_notifications', 'full'
+        )
+        notifications = notifications.strip().lower()
+        if notifications not in ('full', 'reference'):
+            notifications = 'full'
+        return notifications
+
+    def tw_modified_interval(self) -> float:
+        """
+        returns the seconds between the tw_modified msgs of each timewindow
+        """
+        interval = self.read_configuration(
+            'parameters', 'tw_modified_interval', 1
+        )
+        try:
+            interval = float(interval)
+        except ValueError:
+            interval = 1
+        return max(interval, 0)
+
+    def ip_info_write_interval(self) -> float:
+        """
+        returns the seconds the info stored about each IP is buffered before writing it
+        """
+        interval = self.read_configuration(
+            'parameters', 'ip_info_write_interval', 0.5
+        )
+        try:
+            interval = float(interval)
+        except ValueError:
+            interval = 0.5
+        return max(interval, 0)
+
     def wait_for_modules_to_finish(self) -> int:
         """ returns period in mins"""
         wait_for_modules_to_finish = self.read_configuration(
@@ -0,0 +1,52 @@
+class DomainSuffixTrie:
+    """
+    Trie of domains stored label by label starting from the TLD.
+    Finding all the stored parents of a domain walks its labels once,
+    no matter how many domains are stored
+    """
+    # the key of each node's value, labels are never None
+    VALUE = None
+
+    def __init__(self):
+        self.root = {}
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    @staticmethod
+    def get_labels(domain: str) -> list:
+        """returns the labels of the given domain starting from the TLD"""
+        return domain.strip().strip('.').lower().split('.')[::-1]
+
+    def insert(self, domain: str, value=None):
+        """
+        adds the given domain to the trie, or replaces its value if it's already there
+        :param value: returned by matches() when a domain is the same or a
+        subdomain of this one, the domain itself is returned if no value is given
+        """
+        node = self.root
+        for label in self.get_labels(domain):
+            node = node.setdefault(label, {})
+
+        if self.VALUE not in node:
+            self.size += 1
+        node[self.VALUE] = (domain, domain if value is None else value)
+
+    def matches(self, domain: str) -> list:
+        """
+        returns a list of tuples (stored domain, value) of the stored domains
+        that are the same as the given domain or a parent of it,
+        starting from the shortest one.
+        for example, if slack.com is stored, then both slack.com and test.slack.com
+        match it, but notslack.com and slack.com.test don't
+        """
+        found = []
+        node = self.root
+        for label in self.get_labels(domain):
+            node = node.get(label)
+            if node is None:
+                break
+            if self.VALUE in node:
+                found.append(node[self.VALUE])
+        return found
@@ -0,0 +1,256 @@
+import ipaddress
+import json
+import mmap
+import os
+import struct
+import time
+
+MAGIC = b'SLIPSIOC'
+VERSION = 1
+# magic, version, length of the json header
+HEADER = struct.Struct('<8sII')
+OFFSET = struct.Struct('<Q')
+KEY_LENGTH = struct.Struct('<H')
+
+
+class IoCSnapshot:
+    """
+    Read-only snapshot of the IoCs loaded by the update manager, written to disk
+    after every update so the modules can open it instead of querying the cache db.
+    The file is mmapped, so opening it takes no time and all the processes that
+    open it share the same pages.
+
+    Each table is sorted by key and looked up with a binary search:
+        | offsets of the records, 8 bytes each, 1 more than the records |
+        | records: key length (2 bytes), key, value |
+    IPs are stored packed so the ips table is sorted by address, the keys of the
+    other tables are the IoCs as they are in the db and the values are the
+    json info of each IoC, like in the db.
+    The IPs stored in the db after writing the snapshot, by the modules or
+    by the online lookups, aren't in it, they're kept in IoC_runtime_ips until
+    the next snapshot has them.
+    The info of the feeds in the metadata is used to load the IoCs in the
+    snapshot instead of downloading the feeds again when the cache db is empty
+    """
+    # written by the update manager
+    path = 'databases/ioc-snapshot.bin'
+    tables = (
+        'ips',
+        'ip_ranges',
+        'domains',
+        'tranco_whitelist',
+    )
+
+    def __init__(self, file, snapshot: mmap.mmap):
+        self.file = file
+        self.snapshot = snapshot
+        # used to know if the snapshot was replaced after opening it
+        self.inode = os.fstat(file.fileno()).st_ino
+        magic, version, header_length = HEADER.unpack_from(snapshot, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('Not an IoC snapshot')
+        header = json.loads(snapshot[HEADER.size: HEADER.size + header_length])
+        # {table: (offset of the table, records)}
+        self.table_offsets = header['tables']
+        # info about the snapshot and the feeds in it, like their e-tags
+        self.metadata = header['metadata']
+
+    @staticmethod
+    def encode_key(table: str, key: str):
+        """returns the key stored in the snapshot, or None if it's an invalid ip"""
+        if table == 'ips':
+            try:
+                return ipaddress.ip_address(key).packed
+            except ValueError:
+                return None
+        return key.encode()
+
+    @staticmethod
+    def decode_key(table: str, key: bytes) -> str:
+        if table == 'ips':
+            return str(ipaddress.ip_address(key))
+        return key.decode()
+
+    @classmethod
+    def write(cls, tables: dict, metadata: dict, path=None):
+        """
+        writes a snapshot of the given tables so the readers never see
+        a partially written one
+        :param tables: {table: {ioc: json info}}
+        :param metadata: anything json serializable about the snapshot
+        """
+        path = path or cls.path
+        encoded_tables = {}
+        for table in cls.tables:
+            records = []
+            for key, value in tables.get(table, {}).items():
+                if (encoded_key := cls.encode_key(table, key)) is not None:
+                    records.append((encoded_key, value.encode()))
+            records.sort()
+            offsets = []
+            data = bytearray()
+            for key, value in records:
+                offsets.append(len(data))
+                data += KEY_LENGTH.pack(len(key)) + key + value
+            offsets.append(len(data))
+            encoded_tables[table] = (
+                b''.join(OFFSET.pack(offset) for offset in offsets) + data,
+                len(records),
+            )
+
+        # the offsets of the tables depend on the length of the header
+        # that has them, reserve enough room for them in the header
+        table_offsets = {table: [0, 0] for table in cls.tables}
+        header_length = len(
+            json.dumps({'tables': table_offsets, 'metadata': metadata})
+        ) + 40 * len(cls.tables)
+        offset = HEADER.size + header_length
+        for table, (data, records) in encoded_tables.items():
+            table_offsets[table] = [offset, records]
+            offset += len(data)
+        header = json.dumps(
+            {'tables': table_offsets, 'metadata': metadata}
+        ).encode().ljust(header_length)
+
+        # the update manager and the threat intelligence module may write it at the same time
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as snapshot:
+            snapshot.write(HEADER.pack(MAGIC, VERSION, header_length))
+            snapshot.write(header)
+            for data, _ in encoded_tables.values():
+                snapshot.write(data)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def write_from_db(cls, db, path=None):
+        """writes a snapshot of all the IoCs in the cache db of the given database"""
+        metadata = {
+            'time': time.time(),
+            'feeds': db.get_all_TI_files_info(),
+        }
+        iocs = db.get_all_IoCs()
+        cls.write(iocs, metadata, path)
+        # the runtime ips stored before reading the IoCs are in the snapshot now
+        db.delete_runtime_ips_from_IoC(
+            [ip for ip in db.get_runtime_IPs_in_IoC() if ip in iocs['ips']]
+        )
+
+    @classmethod
+    def open(cls, path=None):
+        """
+        returns the snapshot written by write(),
+        or None if there's no valid snapshot yet
+        """
+        try:
+            file = open(path or cls.path, 'rb')
+        except OSError:
+            return None
+        try:
+            return cls(file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+        except (OSError, ValueError, KeyError, struct.error):
+            # empty or not a snapshot
+            file.close()
+            return None
+
+    def close(self):
+        self.snapshot.close()
+        self.file.close()
+
+    def is_outdated(self, path=None) -> bool:
+        """checks if the update manager wrote a new snapshot after opening this one"""
+        try:
+            return os.stat(path or self.path).st_ino != self.inode
+        except OSError:
+            return False
+
+    def read_record(self, table_offset: int, records: int, record: int) -> tuple:
+        """returns the (key, offset of the value, offset of the next record) of a record"""
+        # the records are stored after the offsets
+        data_offset = table_offset + (records + 1) * OFFSET.size
+        offset, next_offset = struct.unpack_from(
+            '<QQ', self.snapshot, table_offset + record * OFFSET.size
+        )
+        offset += data_offset
+        (key_length,) = KEY_LENGTH.unpack_from(self.snapshot, offset)
+        key_start = offset + KEY_LENGTH.size
+        key = self.snapshot[key_start: key_start + key_length]
+        return key, key_start + key_length, data_offset + next_offset
+
+    def get(self, table: str, key: str):
+        """returns the json info of the given IoC or None if it's not in the table"""
+        table_offset, records = self.table_offsets[table]
+        key = self.encode_key(table, key)
+        if key is None:
+            return None
+
+        low, high = 0, records
+        while low < high:
+            middle = (low + high) // 2
+            record_key, value_start, value_end = self.read_record(
+                table_offset, records, middle
+            )
+            if record_key < key:
+                low = middle + 1
+            elif record_key > key:
+                high = middle
+            else:
+                return self.snapshot[value_start:value_end].decode()
+        return None
+
+    def keys(self, table: str):
+        """yields all the IoCs of the given table"""
+        for key, _ in self.items(table):
+            yield key
+
+    def items(self, table: str):
+        """yields the (IoC, json info) of all the IoCs of the given table"""
+        table_offset, records = self.table_offsets[table]
+        for record in range(records):
+            key, value_start, value_end = self.read_record(
+                table_offset, records, record
+            )
+            yield (
+                self.decode_key(table, key),
+                self.snapshot[value_start:value_end].decode(),
+            )
+
+
+class IoCSnapshotReader:
+    """
+    Keeps the latest snapshot written by the update manager open.
+    Checks for a newer one at most every check_interval seconds, so the
+    modules that run for days use the IoCs of the latest update
+    """
+
+    def __init__(self, path=None, check_interval: float = 60, on_open=None):
+        """
+        :param on_open: called with every snapshot opened
+        """
+        self.path = path or IoCSnapshot.path
+        self.check_interval = check_interval
+        self.on_open = on_open
+        self.snapshot = None
+        self.last_check = 0
+
+    def reopen(self):
+        """makes the next get() check for a newer snapshot, e.g. after writing one"""
+        self.last_check = 0
+
+    def get(self):
+        """returns the latest snapshot or None if there's none yet"""
+        now = time.time()
+        if now - self.last_check < self.check_interval:
+            return self.snapshot
+        self.last_check = now
+
+        if self.snapshot is not None and not self.snapshot.is_outdated(self.path):
+            return self.snapshot
+
+        snapshot = IoCSnapshot.open(self.path)
+        if snapshot is not None:
+            if self.snapshot is not None:
+                self.snapshot.close()
+            self.snapshot = snapshot
+            if self.on_open:
+                self.on_open(snapshot)
+        return self.snapshot
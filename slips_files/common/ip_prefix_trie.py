@@ -0,0 +1,87 @@
+import ipaddress
+
+
+class IPPrefixTrie:
+    """
+    Binary radix trie of IPv4 and IPv6 networks for longest prefix matching.
+    Each level of the trie is 1 bit of the address, so a lookup walks at most
+    32 nodes for IPv4 and 128 nodes for IPv6 no matter how many networks are stored
+    """
+    # indexes of each node's list
+    ZERO, ONE, VALUE = 0, 1, 2
+
+    def __init__(self):
+        # the root node of each ip version
+        self.roots = {4: [None, None, None], 6: [None, None, None]}
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    @staticmethod
+    def get_bits(address: int, max_prefixlen: int, prefixlen: int):
+        """yields the first prefixlen bits of the given address, most significant first"""
+        for shift in range(max_prefixlen - 1, max_prefixlen - prefixlen - 1, -1):
+            yield (address >> shift) & 1
+
+    def insert(self, network: str, value=None):
+        """
+        adds the given network to the trie, or replaces its value if it's already there
+        :param network: a range in CIDR notation like 192.168.1.0/24, or a single ip
+        :param value: returned by longest_match() when an ip matches this network,
+        the network itself is returned if no value is given
+        """
+        net = ipaddress.ip_network(network.strip(), strict=False)
+        node = self.roots[net.version]
+        for bit in self.get_bits(
+            int(net.network_address), net.max_prefixlen, net.prefixlen
+        ):
+            if node[bit] is None:
+                node[bit] = [None, None, None]
+            node = node[bit]
+
+        if node[self.VALUE] is None:
+            self.size += 1
+        node[self.VALUE] = (str(net), network if value is None else value)
+
+    def remove(self, network: str) -> bool:
+        """
+        removes the given network from the trie
+        returns False if it wasn't there
+        """
+        net = ipaddress.ip_network(network.strip(), strict=False)
+        node = self.roots[net.version]
+        for bit in self.get_bits(
+            int(net.network_address), net.max_prefixlen, net.prefixlen
+        ):
+            node = node[bit]
+            if node is None:
+                return False
+
+        if node[self.VALUE] is None:
+            return False
+        node[self.VALUE] = None
+        self.size -= 1
+        return True
+
+    def longest_match(self, ip: str):
+        """
+        returns a tuple (network, value) of the most specific network the given ip
+        belongs to, or False if it doesn't belong to any of them
+        """
+        try:
+            ip_obj = ipaddress.ip_address(ip)
+        except ValueError:
+            return False
+
+        node = self.roots[ip_obj.version]
+        match = node[self.VALUE]
+        for bit in self.get_bits(
+            int(ip_obj), ip_obj.max_prefixlen, ip_obj.max_prefixlen
+        ):
+            node = node[bit]
+            if node is None:
+                break
+            if node[self.VALUE] is not None:
+                match = node[self.VALUE]
+        return match or False
@@ -0,0 +1,89 @@
+import json
+import os
+
+
+class OUIIndex:
+    """
+    Index of the vendor of each MAC prefix in the mac db downloaded by the
+    update manager. Most prefixes are OUIs (the first 3 bytes of a MAC, like 00:00:0C),
+    some are the longer MA-M and MA-S prefixes (28 and 36 bits) that the IEEE
+    assigns inside an OUI to other vendors.
+    Looking up a MAC is a few dict lookups, longest prefix first, instead of
+    a scan of the whole mac db
+    """
+    # written by the update manager every time it updates the mac db
+    path = 'databases/macaddress-db-index.json'
+    mac_db_path = 'databases/macaddress-db.json'
+
+    def __init__(self, vendors: dict = None):
+        # {prefix as hex digits without separators: vendor}
+        self.vendors = {
+            self.normalize(prefix): vendor for prefix, vendor in (vendors or {}).items()
+        }
+        # lengths of the prefixes in hex digits, longest first
+        self.prefix_lengths = sorted(
+            {len(prefix) for prefix in self.vendors}, reverse=True
+        )
+
+    def __len__(self):
+        return len(self.vendors)
+
+    @staticmethod
+    def normalize(mac_or_prefix: str) -> str:
+        """returns the hex digits of the given MAC or prefix, like 70B3D51DF"""
+        return (
+            mac_or_prefix.upper().replace(':', '').replace('-', '').replace('.', '')
+        )
+
+    @classmethod
+    def from_mac_db(cls, lines):
+        """
+        creates the index from the lines of the mac db, 1 json per line like
+        {"macPrefix":"00:00:0C","vendorName":"Cisco Systems, Inc", ...}
+        """
+        vendors = {}
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                mac_info = json.loads(line)
+                prefix = cls.normalize(mac_info['macPrefix'])
+                vendor = mac_info['vendorName']
+            except (ValueError, KeyError, AttributeError):
+                continue
+            vendors[prefix] = vendor
+        return cls(vendors)
+
+    @classmethod
+    def load(cls, path=None):
+        """
+        reads the index written by save(),
+        or creates it from the mac db if there's no index yet
+        raises OSError if neither of them is there
+        """
+        try:
+            with open(path or cls.path, 'r') as index:
+                return cls(json.load(index))
+        except (OSError, ValueError):
+            with open(cls.mac_db_path, 'r') as mac_db:
+                return cls.from_mac_db(mac_db)
+
+    def save(self, path=None):
+        """writes the index so the readers never see a partially written one"""
+        path = path or self.path
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as index:
+            json.dump(self.vendors, index)
+        os.replace(tmp_path, path)
+
+    def get_vendor(self, mac_addr: str):
+        """
+        returns the vendor of the longest prefix of the given MAC,
+        or False if none of its prefixes is in the index
+        """
+        mac_addr = self.normalize(mac_addr)
+        for prefix_length in self.prefix_lengths:
+            if vendor := self.vendors.get(mac_addr[:prefix_length]):
+                return vendor
+        return False
@@ -82,6 +82,17 @@ class Utils(object):
     def is_valid_threat_level(self, threat_level):
         return threat_level in self.threat_levels
 
+    def get_weighted_threat_level(self, evidence: dict) -> float:
+        """
+        returns the threat level * confidence of the given evidence,
+        0 if its threat level isn't a valid one
+        """
+        try:
+            threat_level = self.threat_levels[evidence['threat_level'].lower()]
+        except (KeyError, AttributeError):
+            return 0.0
+        return threat_level * float(evidence['confidence'])
+
     def sanitize(self, string):
         """
         Sanitize strings taken from the user
@@ -0,0 +1,82 @@
+class AccumulatedThreatLevels:
+    """
+    Keeps the running sum of threat level * confidence of the evidence
+    of each profile and timewindow that weren't part of an alert yet.
+    Adding or removing an evidence updates the sum in O(1) instead of
+    reloading all the evidence of the timewindow from the db
+    """
+
+    def __init__(self):
+        # {(profileid, twid): {evidence ID: weighted threat level}}
+        # sorted by the time the evidence were added
+        self.evidence = {}
+        # {(profileid, twid): sum of the weighted threat levels}
+        self.accumulated = {}
+
+    def add(self, profileid, twid, evidence_ID, weighted_threat_level: float) -> float:
+        """
+        adds the given evidence to the accumulated threat level of its timewindow
+        returns the new accumulated threat level
+        """
+        key = (profileid, twid)
+        tw_evidence = self.evidence.setdefault(key, {})
+        if evidence_ID in tw_evidence:
+            return self.accumulated[key]
+
+        tw_evidence[evidence_ID] = weighted_threat_level
+        self.accumulated[key] = self.accumulated.get(key, 0.0) + weighted_threat_level
+        return self.accumulated[key]
+
+    def remove(self, profileid, twid, evidence_ID) -> float:
+        """
+        removes the given evidence from the accumulated threat level of its timewindow
+        returns the new accumulated threat level
+        """
+        key = (profileid, twid)
+        tw_evidence = self.evidence.get(key, {})
+        if evidence_ID not in tw_evidence:
+            return self.get(profileid, twid)
+
+        self.accumulated[key] -= tw_evidence.pop(evidence_ID)
+        if not tw_evidence:
+            self.reset(profileid, twid)
+            return 0.0
+        return self.accumulated[key]
+
+    def get(self, profileid, twid) -> float:
+        return self.accumulated.get((profileid, twid), 0.0)
+
+    def get_evidence_IDs(self, profileid, twid) -> list:
+        """returns the IDs of the evidence that are part of the accumulated threat level"""
+        return list(self.evidence.get((profileid, twid), {}))
+
+    def reset(self, profileid, twid) -> list:
+        """
+        starts accumulating the threat level of this timewindow from 0,
+        used after the evidence of the timewindow are part of an alert
+        returns the IDs of the evidence that were part of the accumulated threat level
+        """
+        key = (profileid, twid)
+        self.accumulated.pop(key, None)
+        return list(self.evidence.pop(key, {}))
+
+    @staticmethod
+    def get_tw_number(twid) -> int:
+        return int(twid.replace('timewindow', ''))
+
+    def evict_tws_before(self, profileid, twid) -> list:
+        """
+        forgets the evidence of the timewindows of this profile older than the given one.
+        used when the given timewindow is closed, the closed timewindow itself still gets
+        evidence from the modules that handle tw_closed and from the slower modules,
+        but the older ones were closed at least 1 timewindow width ago
+        returns the evicted timewindows
+        """
+        tw_number = self.get_tw_number(twid)
+        evicted = [
+            key for key in self.evidence
+            if key[0] == profileid and self.get_tw_number(key[1]) < tw_number
+        ]
+        for key in evicted:
+            self.reset(*key)
+        return [key[1] for key in evicted]
@@ -5,9 +5,28 @@ import ipaddress
 import sys
 import validators
 from slips_files.common.slips_utils import utils
+from slips_files.core.database.flow_codec import JSONFlowCodec, decode_flow
+from slips_files.core.database.tw_scheduler import TWScheduler
+from slips_files.core.database.ip_info_buffer import IPInfoBuffer
 from dataclasses import asdict
 
 class ProfilingFlowsDatabase(object):
+    # used to encode the stored and published flows, set by read_configuration()
+    flow_codec = JSONFlowCodec()
+    # when True, new_flow msgs only have the profileid, twid, uid, type, proto and daddr
+    # of the flow and the modules read it using get_flow_from_msg(). set by read_configuration()
+    reference_new_flows = False
+    # seconds between the tw_modified msgs of each tw and between the checks for tws to close.
+    # 0 publishes and checks on every modification. set by read_configuration()
+    tw_modified_interval = 0
+    # throttles the tw_modified msgs of this process, created on first use
+    tw_scheduler = None
+    # seconds the info stored by setInfoForIPs() is buffered and merged per IP before
+    # writing it. 0 writes it right away. set by read_configuration()
+    ip_info_write_interval = 0
+    # the info of the IPs buffered by this process, created on first use
+    ip_info_buffer = None
+
     def __init__(self):
         # The name is used to print in the outputprocess
         self.name = 'DB'
@@ -16,7 +35,74 @@ class ProfilingFlowsDatabase(object):
 
     def publish(self, channel, data):
         """Publish something"""
-        self.r.publish(channel, data)
+        if channel == 'finished_modules':
+            # the module is stopping, don't lose the info and the tw_modified msgs it buffered
+            self.flush_ips_info()
+            if self.tw_scheduler is not None:
+                self.tw_scheduler.flush(all_pending=True)
+        self.writer.publish(channel, data)
+
+    @property
+    def writer(self):
+        """
+        returns the pipeline of the flow being added if there's one,
+        otherwise the redis client so the command is sent right away
+        """
+        pipe = getattr(self, 'pipe', None)
+        # don't use 'pipe or self.r', an empty pipeline evaluates to False
+        return self.r if pipe is None else pipe
+
+    def start_pipeline(self):
+        """
+        Queues all the writes and publishes of the flow being added in 1 pipeline
+        instead of sending each of them to redis on its own.
+        call execute_pipeline() when done with the flow to send them in 1 round-trip
+        """
+        self.pipe = self.r.pipeline(transaction=False)
+        # tws modified by this flow, marked as modified once when executing the pipeline
+        self.modified_tws = set()
+
+    def execute_pipeline(self):
+        """
+        Sends all the commands queued since start_pipeline() to redis
+        and checks if we should close some TW
+        """
+        pipe = getattr(self, 'pipe', None)
+        if pipe is None:
+            return
+        self.pipe = None
+
+        modified_tws, self.modified_tws = self.modified_tws, set()
+        if modified_tws:
+            pipe.zadd(
+                'ModifiedTW',
+                {profileid_twid: float(time.time()) for profileid_twid in modified_tws}
+            )
+            self.tw_modified(modified_tws, pipe)
+        pipe.execute()
+
+        if modified_tws and not self.tw_modified_interval:
+            # Check if we should close some TW
+            self.check_TW_to_close()
+
+    def tw_modified(self, profileid_twids, pipe):
+        """
+        queues the tw_modified msgs of the given modified tws in the given pipeline
+        when there's a tw_modified_interval, the tws already published in the
+        last interval are published later by the tw scheduler of this process,
+        which also checks for tws to close
+        """
+        if self.tw_modified_interval:
+            if self.tw_scheduler is None:
+                self.tw_scheduler = TWScheduler(self, self.tw_modified_interval)
+            profileid_twids = self.tw_scheduler.modified(profileid_twids)
+        self.publish_tw_modified(profileid_twids, pipe)
+
+    def publish_tw_modified(self, profileid_twids, pipe):
+        """queues 1 tw_modified msg for each of the given profileid_twid in the given pipeline"""
+        for profileid_twid in profileid_twids:
+            profileid, twid = profileid_twid.rsplit(self.separator, 1)
+            pipe.publish('tw_modified', f'{profileid}:{twid}')
 
     def getIPData(self, ip: str) -> dict:
         """
@@ -29,7 +115,26 @@ class ProfilingFlowsDatabase(object):
         """
 
         data = self.rcache.hget('IPsInfo', ip)
-        return json.loads(data) if data else False
+        data = json.loads(data) if data else False
+        if self.ip_info_buffer is not None:
+            # the info this process stored that isn't written yet
+            if buffered_info := self.ip_info_buffer.get(ip):
+                data = {**(data or {}), **buffered_info}
+        return data
+
+    def getIPsData(self, ips) -> dict:
+        """
+        returns {ip: the same as getIPData(ip)} of all the given ips in 1 round-trip
+        """
+        ips = list(ips)
+        ips_data = {}
+        for ip, data in zip(ips, self.rcache.hmget('IPsInfo', ips)):
+            data = json.loads(data) if data else False
+            if self.ip_info_buffer is not None:
+                if buffered_info := self.ip_info_buffer.get(ip):
+                    data = {**(data or {}), **buffered_info}
+            ips_data[ip] = data
+        return ips_data
 
     def setNewIP(self, ip: str):
         """
@@ -125,25 +230,11 @@ class ProfilingFlowsDatabase(object):
         :param ip: the ip that we want to update the times we contacted
         """
 
-        # Get the hash of the timewindow
-        profileid_twid = f'{profileid}{self.separator}{twid}'
-
-        # Get the DstIPs data for this tw in this profile
-        # The format is {'1.1.1.1' :  3}
-        ips_contacted = self.r.hget(profileid_twid, f'{direction}IPs')
-        if not ips_contacted:
-            ips_contacted = {}
-
-        try:
-            ips_contacted = json.loads(ips_contacted)
-            # Add 1 because we found this ip again
-            ips_contacted[ip] += 1
-        except (TypeError, KeyError):
-            # There was no previous data stored in the DB
-            ips_contacted[ip] = 1
-
-        ips_contacted = json.dumps(ips_contacted)
-        self.r.hset(profileid_twid, f'{direction}IPs', str(ips_contacted))
+        # the times each ip was contacted in this tw are stored in their own hash
+        # as {'1.1.1.1': 3}, and incremented in place
+        self.writer.hincrby(
+            self.get_tw_data_key(profileid, twid, f'{direction}IPs'), ip, 1
+        )
 
     def getFinalStateFromFlags(self, state, pkts):
         """
@@ -289,6 +380,95 @@ class ProfilingFlowsDatabase(object):
             )
             self.outputqueue.put(f'01|database|[DB] Inst: {traceback.print_exc()}')
 
+    def get_writes_pipeline(self):
+        """
+        returns the pipeline of the flow being added if there's one,
+        otherwise a new pipeline to send the writes of the caller in 1 round-trip
+        """
+        return self.r.pipeline(transaction=False) if self.pipe is None else self.pipe
+
+    def execute_writes(self, pipe):
+        """
+        executes the given pipeline, unless it's the one of the flow being added,
+        that one is executed by execute_pipeline()
+        """
+        if pipe is not self.pipe:
+            pipe.execute()
+
+    def get_tw_data_key(self, profileid, twid, key_name) -> str:
+        """
+        returns the name of the redis hash that has the counters of the given
+        ports/ips key_name in this tw
+        for example profile_1.1.1.1_timewindow1_DstPortsClientTCPEstablished
+        the uids of the flows are stored in a list with the same name + _uids
+        """
+        return f'{profileid}{self.separator}{twid}{self.separator}{key_name}'
+
+    def get_ports_data(self, counters: dict, uids: list, ip_key: str) -> dict:
+        """
+        Builds the ports dict of getDataFromProfileTW() using the counters stored by add_port()
+        :param counters: {'port|totalflows': 1, 'port|ip|pkts': 2, 'port|ip|stime': ts, ..}
+        :param uids: ['port|ip|uid', ..]
+        :param ip_key: 'dstips' or 'srcips'
+        """
+        ports = {}
+        for field, value in counters.items():
+            port, *rest = field.split('|')
+            port_data = ports.setdefault(
+                port,
+                {'totalflows': 0, 'totalpkt': 0, 'totalbytes': 0, ip_key: {}}
+            )
+            if len(rest) == 1:
+                # totalflows, totalpkt or totalbytes
+                port_data[rest[0]] = int(value)
+                continue
+
+            ip, counter = rest
+            ip_data = port_data[ip_key].setdefault(
+                ip,
+                {'pkts': 0, 'spkts': 0, 'stime': '', 'uid': []}
+            )
+            ip_data[counter] = value if counter == 'stime' else int(value)
+
+        for entry in uids:
+            port, ip, uid = entry.split('|')
+            if ip_data := ports.get(port, {}).get(ip_key, {}).get(ip):
+                ip_data['uid'].append(uid)
+        return ports
+
+    def get_ips_data(self, counters: dict, uids: list) -> dict:
+        """
+        Builds the ips dict of getDataFromProfileTW() using the counters stored by add_ips()
+        :param counters: {'ip|totalflows': 1, 'ip|dstports|port': 2, 'ip|stime': ts, ..}
+        :param uids: ['ip|uid', ..]
+        """
+        ips = {}
+        for field, value in counters.items():
+            ip, *rest = field.split('|')
+            ip_data = ips.setdefault(
+                ip,
+                {
+                    'totalflows': 0,
+                    'totalpkt': 0,
+                    'totalbytes': 0,
+                    'stime': '',
+                    'uid': [],
+                    'dstports': {}
+                }
+            )
+            if rest[0] == 'dstports':
+                ip_data['dstports'][rest[1]] = int(value)
+            elif rest[0] == 'stime':
+                ip_data['stime'] = value
+            else:
+                ip_data[rest[0]] = int(value)
+
+        for entry in uids:
+            ip, uid = entry.split('|')
+            if ip in ips:
+                ips[ip]['uid'].append(uid)
+        return ips
+
     def getDataFromProfileTW(
         self,
         profileid: str,
@@ -318,18 +498,27 @@ class ProfilingFlowsDatabase(object):
         try:
             key = direction + type_data + role + protocol + state
             # self.print('Asked Key: {}'.format(key))
-            data = self.r.hget(f'{profileid}{self.separator}{twid}', key)
-            value = {}
-            if data:
-                portdata = json.loads(data)
-                value = portdata
-            else:
+            if data := self.r.hget(f'{profileid}{self.separator}{twid}', key):
+                # stored as 1 json blob by older versions of slips, e.g. when using -db
+                return json.loads(data)
+
+            data_key = self.get_tw_data_key(profileid, twid, key)
+            pipe = self.r.pipeline(transaction=False)
+            pipe.hgetall(data_key)
+            pipe.lrange(f'{data_key}{self.separator}uids', 0, -1)
+            counters, uids = pipe.execute()
+            if not counters:
                 self.print(
                     f'There is no data for Key: {key}. Profile {profileid} TW {twid}',
                     3,
                     0,
                 )
-            return value
+                return {}
+
+            if type_data == 'Ports':
+                ip_key = 'srcips' if role == 'Server' else 'dstips'
+                return self.get_ports_data(counters, uids, ip_key)
+            return self.get_ips_data(counters, uids)
         except Exception:
             exception_line = sys.exc_info()[2].tb_lineno
             self.outputqueue.put(
@@ -346,8 +535,8 @@ class ProfilingFlowsDatabase(object):
         role: 'Client' or 'Server'
         This function does two things:
             1- Add the ip to this tw in this profile, counting how many times
-            it was contacted, and storing it in the key 'DstIPs' or 'SrcIPs'
-            in the hash of the profile
+            it was contacted, and storing it in the hash 'DstIPs' or 'SrcIPs'
+            of this tw, see get_tw_data_key()
             2- Use the ip as a key to count how many times that IP was
             contacted on each port. We store it like this because its the
                pefect structure to detect vertical port scans later on
@@ -404,19 +593,11 @@ class ProfilingFlowsDatabase(object):
         # Get the state. Established, NotEstablished
         summaryState = self.getFinalStateFromFlags(flow.state, flow.pkts)
 
-        # Get the previous data about this key
-        old_profileid_twid_data = self.getDataFromProfileTW(
-            profileid,
-            twid,
-            direction,
-            summaryState,
-            flow.proto,
-            role,
-            'IPs',
+        key_name = (
+            f'{direction}IPs{role}{flow.proto.upper()}{summaryState}'
         )
-
-        profileid_twid_data = self.update_ip_info(
-            old_profileid_twid_data,
+        self.update_ip_info(
+            self.get_tw_data_key(profileid, twid, key_name),
             flow.pkts,
             flow.dport,
             flow.spkts,
@@ -425,22 +606,11 @@ class ProfilingFlowsDatabase(object):
             starttime,
             uid
         )
-
-
-        key_name = (
-            f'{direction}IPs{role}{flow.proto.upper()}{summaryState}'
-        )
-        # Store this data in the profile hash
-        self.r.hset(
-            f'{profileid}{self.separator}{twid}',
-            key_name,
-            json.dumps(profileid_twid_data)
-        )
         return True
 
     def update_ip_info(
         self,
-        old_profileid_twid_data,
+        data_key,
         pkts,
         dport,
         spkts,
@@ -454,38 +624,24 @@ class ProfilingFlowsDatabase(object):
         the total flows sent by this ip and their uids,
         the total packets sent by this ip,
         total bytes sent by this ip
+        Each counter is incremented in place, so the cost doesn't depend on
+        how many ips are already in this tw
+        :param data_key: the hash of the counters, see get_tw_data_key()
         """
         dport = str(dport)
-        spkts = int(spkts)
+        spkts = int(spkts or 0)
         pkts = int(pkts)
         totbytes = int(totbytes)
 
-        try:
-            # update info about an existing ip
-            ip_data = old_profileid_twid_data[ip]
-            ip_data['totalflows'] += 1
-            ip_data['totalpkt'] += pkts
-            ip_data['totalbytes'] += totbytes
-            ip_data['uid'].append(uid)
-            if dport in ip_data['dstports']:
-                ip_data['dstports'][dport] += spkts
-            else:
-                ip_data['dstports'][dport] = spkts
-
-        except KeyError:
-            # First time seeing this ip
-            ip_data = {
-                'totalflows': 1,
-                'totalpkt': pkts,
-                'totalbytes': totbytes,
-                'stime': starttime,
-                'uid': [uid],
-                'dstports': {dport: spkts}
-
-            }
-
-        old_profileid_twid_data[ip] = ip_data
-        return old_profileid_twid_data
+        pipe = self.get_writes_pipeline()
+        pipe.hincrby(data_key, f'{ip}|totalflows', 1)
+        pipe.hincrby(data_key, f'{ip}|totalpkt', pkts)
+        pipe.hincrby(data_key, f'{ip}|totalbytes', totbytes)
+        pipe.hincrby(data_key, f'{ip}|dstports|{dport}', spkts)
+        # only set the first time we see this ip
+        pipe.hsetnx(data_key, f'{ip}|stime', starttime)
+        pipe.rpush(f'{data_key}{self.separator}uids', f'{ip}|{uid}')
+        self.execute_writes(pipe)
 
     def print(self, text, verbose=1, debug=0):
         """
@@ -531,60 +687,32 @@ class ProfilingFlowsDatabase(object):
                 f'data {data_tuple}',
                 3, 0
             )
-            # Get all the InTuples or OutTuples for this profileid in this TW
-            profileid_twid = f'{profileid}{self.separator}{twid}'
-            tuples = self.r.hget(profileid_twid, direction)
+            # The letters of each tuple are stored in their own key, so adding a symbol
+            # doesn't need reading and rewriting all the InTuples or OutTuples of this TW
+            tuples_key = self.get_tw_data_key(profileid, twid, direction)
             # Separate the symbold to add and the previous data
             (symbol_to_add, previous_two_timestamps) = data_tuple
-            if not tuples:
-                # Must be str so we can convert later
-                tuples = '{}'
-            # Convert the json str to a dictionary
-            tuples = json.loads(tuples)
-            try:
-                tuples[tupleid]
-                # Disasemble the input
-                self.print(
-                    f'Not the first time for tuple {tupleid} as an {direction} for '
-                    f'{profileid} in TW {twid}. Add the symbol: {symbol_to_add}. '
-                    f'Store previous_times: {previous_two_timestamps}. Prev Data: {tuples}',
-                    3, 0,
-                )
-                # Get the last symbols of letters in the DB
-                prev_symbols = tuples[tupleid][0]
-                # Add it to form the string of letters
-                new_symbol = f'{prev_symbols}{symbol_to_add}'
-                # analyze behavioral model with lstm model if the length is divided by 3 -
-                # so we send when there is 3 more characters added
-                if len(new_symbol) % 3 == 0:
-                    to_send = {
-                        'new_symbol': new_symbol,
-                        'profileid': profileid,
-                        'twid': twid,
-                        'tupleid': str(tupleid),
-                        'uid': flow.uid,
-                        'flow': asdict(flow)
-                    }
-                    to_send = json.dumps(to_send)
-                    self.publish('new_letters', to_send)
-
-                tuples[tupleid] = (new_symbol, previous_two_timestamps)
-                self.print(f'\tLetters so far for tuple {tupleid}: {new_symbol}', 3, 0)
-                tuples = json.dumps(tuples)
-            except (TypeError, KeyError):
-                # TODO check that this condition is triggered correctly
-                #  only for the first case and not the rest after...
-                # There was no previous data stored in the DB
-                self.print(
-                    f'First time for tuple {tupleid} as an {direction} for {profileid} in TW {twid}',
-                    3, 0,
-                )
-                # Here get the info from the ipinfo key
-                tuples[tupleid] = (symbol_to_add, previous_two_timestamps)
-                # Convet the dictionary to json
-                tuples = json.dumps(tuples)
-            # Store the new data on the db
-            self.r.hset(profileid_twid, direction, str(tuples))
+            letters_len = self.r.append(
+                f'{tuples_key}{self.separator}{tupleid}', symbol_to_add
+            )
+            # analyze behavioral model with lstm model if the length is divided by 3 -
+            # so we send when there is 3 more characters added
+            # the letters of the first flow of the tuple are never sent
+            if letters_len > len(symbol_to_add) and letters_len % 3 == 0:
+                new_symbol = self.r.get(f'{tuples_key}{self.separator}{tupleid}')
+                to_send = {
+                    'new_symbol': new_symbol,
+                    'profileid': profileid,
+                    'twid': twid,
+                    'tupleid': str(tupleid),
+                    'uid': flow.uid,
+                    'flow': asdict(flow)
+                }
+                to_send = json.dumps(to_send)
+                self.publish('new_letters', to_send)
+
+            # the hash of the tuples of this tw has the previous_two_timestamps of each tuple
+            self.writer.hset(tuples_key, tupleid, json.dumps(previous_two_timestamps))
             # Mark the tw as modified
             self.markProfileTWAsModified(profileid, twid, flow.starttime)
 
@@ -595,6 +723,25 @@ class ProfilingFlowsDatabase(object):
             )
             self.outputqueue.put(f'01|database|[DB] {traceback.format_exc()}')
 
+    def get_tuples(self, profileid, twid, direction) -> dict:
+        """
+        returns all the tuples of this tw in the format
+        {tupleid: (letters, previous_two_timestamps)}
+        :param direction: 'InTuples' or 'OutTuples'
+        """
+        tuples_key = self.get_tw_data_key(profileid, twid, direction)
+        timestamps = self.r.hgetall(tuples_key)
+        if not timestamps:
+            return {}
+        tupleids = list(timestamps)
+        letters = self.r.mget(
+            [f'{tuples_key}{self.separator}{tupleid}' for tupleid in tupleids]
+        )
+        return {
+            tupleid: (tuple_letters, json.loads(timestamps[tupleid]))
+            for tupleid, tuple_letters in zip(tupleids, letters)
+        }
+
     def getSlipsInternalTime(self):
         return self.r.get('slips_internal_time')
 
@@ -650,6 +797,7 @@ class ProfilingFlowsDatabase(object):
             'ModifiedTW', 0, modification_time, withscores=True
         )
 
+        pipe = self.r.pipeline(transaction=False)
         for profile_tw_to_close in profiles_tws_to_close:
             profile_tw_to_close_id = profile_tw_to_close[0]
             profile_tw_to_close_time = profile_tw_to_close[1]
@@ -662,15 +810,19 @@ class ProfilingFlowsDatabase(object):
                 3,
                 0,
             )
-            self.markProfileTWAsClosed(profile_tw_to_close_id)
+            self.markProfileTWAsClosed(profile_tw_to_close_id, pipe)
+        pipe.execute()
 
-    def markProfileTWAsClosed(self, profileid_tw):
+    def markProfileTWAsClosed(self, profileid_tw, pipe=None):
         """
         Mark the TW as closed so tools can work on its data
+        :param pipe: queue the commands in this pipeline instead of sending them right away.
+        never uses the pipeline of the flow being added, this is called by the tw scheduler thread too
         """
-        self.r.sadd('ClosedTW', profileid_tw)
-        self.r.zrem('ModifiedTW', profileid_tw)
-        self.publish('tw_closed', profileid_tw)
+        client = self.r if pipe is None else pipe
+        client.sadd('ClosedTW', profileid_tw)
+        client.zrem('ModifiedTW', profileid_tw)
+        client.publish('tw_closed', profileid_tw)
 
     def markProfileTWAsModified(self, profileid, twid, timestamp):
         """
@@ -682,17 +834,21 @@ class ProfilingFlowsDatabase(object):
         3- To update the internal time of slips
         4- To check if we should 'close' some TW
         """
+        if getattr(self, 'pipe', None) is not None:
+            # the flow is being added using a pipeline, mark the tw as modified
+            # once when the pipeline is executed
+            self.modified_tws.add(f'{profileid}{self.separator}{twid}')
+            return
+
         timestamp = time.time()
-        data = {
-            f'{profileid}{self.separator}{twid}': float(timestamp)
-        }
-        self.r.zadd('ModifiedTW', data)
-        self.publish(
-            'tw_modified',
-            f'{profileid}:{twid}'
-            )
-        # Check if we should close some TW
-        self.check_TW_to_close()
+        profileid_twid = f'{profileid}{self.separator}{twid}'
+        pipe = self.r.pipeline(transaction=False)
+        pipe.zadd('ModifiedTW', {profileid_twid: float(timestamp)})
+        self.tw_modified([profileid_twid], pipe)
+        pipe.execute()
+        if not self.tw_modified_interval:
+            # Check if we should close some TW
+            self.check_TW_to_close()
 
     def add_port(
             self, profileid: str, twid: str, flow: dict, role: str, port_type: str
@@ -736,63 +892,24 @@ class ProfilingFlowsDatabase(object):
         # Choose which port to use based if we were asked Dst or Src
         port = str(sport) if port_type == 'Src' else str(dport)
 
-        # If we are the Client, we want to store the dstips only
-        # If we are the Server, we want to store the srcips only
-        ip_key = 'srcips' if role == 'Server' else 'dstips'
-
         # Get the state. Established, NotEstablished
         summaryState = self.getFinalStateFromFlags(state, pkts)
 
-        old_profileid_twid_data = self.getDataFromProfileTW(
-            profileid,
-            twid,
-            port_type,
-            summaryState,
-            proto,
-            role,
-            'Ports'
-        )
-
-        try:
-            # we already have info about this dport, update it
-            port_data = old_profileid_twid_data[port]
-            port_data['totalflows'] += 1
-            port_data['totalpkt'] += pkts
-            port_data['totalbytes'] += totbytes
-
-            # if there's a conn from this ip on this port, update the pkts of this conn
-            if ip in port_data[ip_key]:
-                port_data[ip_key][ip]['pkts'] += pkts
-                port_data[ip_key][ip]['spkts'] += spkts
-                port_data[ip_key][ip]['uid'].append(uid)
-            else:
-                port_data[ip_key][ip] = {
-                    'pkts': pkts,
-                    'spkts': spkts,
-                    'stime': starttime,
-                    'uid': [uid]
-                }
-
-        except KeyError:
-            # First time for this dport
-            port_data = {
-                'totalflows': 1,
-                'totalpkt': pkts,
-                'totalbytes': totbytes,
-                ip_key: {
-                    ip: {
-                        'pkts': pkts,
-                        'spkts': spkts,
-                        'stime': starttime,
-                        'uid': [uid]
-                    }
-                }
-            }
-        old_profileid_twid_data[port] = port_data
-        data = json.dumps(old_profileid_twid_data)
-        hash_key = f'{profileid}{self.separator}{twid}'
+        # each counter is incremented in place, so the cost doesn't depend on
+        # how many ports and ips are already in this tw
         key_name = f'{port_type}Ports{role}{proto}{summaryState}'
-        self.r.hset(hash_key, key_name, str(data))
+        data_key = self.get_tw_data_key(profileid, twid, key_name)
+        spkts = int(spkts or 0)
+        pipe = self.get_writes_pipeline()
+        pipe.hincrby(data_key, f'{port}|totalflows', 1)
+        pipe.hincrby(data_key, f'{port}|totalpkt', pkts)
+        pipe.hincrby(data_key, f'{port}|totalbytes', totbytes)
+        pipe.hincrby(data_key, f'{port}|{ip}|pkts', pkts)
+        pipe.hincrby(data_key, f'{port}|{ip}|spkts', spkts)
+        # only set the first time we see this ip on this port
+        pipe.hsetnx(data_key, f'{port}|{ip}|stime', starttime)
+        pipe.rpush(f'{data_key}{self.separator}uids', f'{port}|{ip}|{uid}')
+        self.execute_writes(pipe)
         self.markProfileTWAsModified(profileid, twid, starttime)
 
     def add_flow(
@@ -830,13 +947,11 @@ class ProfilingFlowsDatabase(object):
             'module_labels': {},
         }
 
-        # Convert to json string
-        flow_dict = json.dumps(flow_dict)
         # Store in the hash x.x.x.x_timewindowx_flows
         value = self.r.hset(
             f'{profileid}{self.separator}{twid}{self.separator}flows',
             flow.uid,
-            flow_dict,
+            self.flow_codec.encode(flow_dict),
         )
         if not value:
             # duplicate flow
@@ -845,20 +960,22 @@ class ProfilingFlowsDatabase(object):
         # The key was not there before. So this flow is not repeated
         # Store the label in our uniq set, and increment it by 1
         if label:
-            self.r.zincrby('labels', 1, label)
+            self.writer.zincrby('labels', 1, label)
 
-        flow_dict = {flow.uid: flow_dict}
-
-        # Get the dictionary and convert to json string
-        flow_dict = json.dumps(flow_dict)
-        # Prepare the data to publish.
+        # Prepare the data to publish, the flow is encoded once with the rest of the msg.
+        # the modules filter the flows by type, proto and daddr before reading the
+        # whole flow of a reference msg
         to_send = {
             'profileid': profileid,
             'twid': twid,
-            'flow': flow_dict,
-            'stime': flow.starttime,
+            'uid': flow.uid,
+            'flow_type': flow.type_,
+            'proto': flow.proto,
+            'daddr': flow.daddr,
         }
-        to_send = json.dumps(to_send)
+        if not self.reference_new_flows:
+            to_send.update({'flow': flow_dict, 'stime': flow.starttime})
+        to_send = self.flow_codec.encode_msg(to_send)
 
         # set the pcap/file stime in the analysis key
         if self.first_flow:
@@ -936,16 +1053,29 @@ class ProfilingFlowsDatabase(object):
     def get_flow(self, profileid, twid, uid):
         """
         Returns the flow in the specific time
-        The format is a dictionary
+        The format is a dictionary {uid: decoded flow dict or None if it's not there}
         """
         if not profileid:
             # profileid is None if we're dealing with a profile
             # outside of home_network when this param is given
             return {}
-        temp = self.r.hget(
+        # msgpack flows aren't utf-8, read them using the binary connection
+        flow = self.rbytes.hget(
             f'{profileid}{self.separator}{twid}{self.separator}flows', uid
         )
-        return {uid: temp}
+        return {uid: decode_flow(flow)}
+
+    def get_flow_from_msg(self, msg: dict):
+        """
+        returns the flow dict of a decoded new_flow msg
+        the flow is in the msg unless slips is using reference new_flow msgs,
+        in that case it's read from the db. use the flow_type, proto and daddr
+        of the msg to skip the flows the module ignores before calling this
+        """
+        if 'flow' in msg:
+            return msg['flow']
+        uid = msg['uid']
+        return self.get_flow(msg['profileid'], msg['twid'], uid)[uid]
 
     def add_out_ssl(
         self,
@@ -982,7 +1112,7 @@ class ProfilingFlowsDatabase(object):
         # TODO do something with is_doh
         # Convert to json string
         ssl_flow = json.dumps(ssl_flow)
-        self.r.hset(
+        self.writer.hset(
             f'{profileid}{self.separator}{twid}{self.separator}altflows',
             flow.uid,
             ssl_flow,
@@ -1039,28 +1169,60 @@ class ProfilingFlowsDatabase(object):
         going to store for this IP.
         If it was not there before we store it. If it was there before, we
         overwrite it
+        When there's an ip_info_write_interval, the info is buffered and merged with
+        the other info stored about this IP in the same interval, and written later
         """
+        if self.ip_info_write_interval:
+            if self.ip_info_buffer is None:
+                self.ip_info_buffer = IPInfoBuffer(self, self.ip_info_write_interval)
+            self.ip_info_buffer.add(ip, to_store)
+            return
+        self.store_ips_info({ip: to_store})
+
+    def flush_ips_info(self):
+        """writes the info of the IPs buffered by this process"""
+        if self.ip_info_buffer is not None:
+            self.ip_info_buffer.flush()
+
+    def store_ips_info(self, ips_info: dict):
+        """
+        merges the given {ip: info to store} with the info already stored about
+        each IP, and writes them all in 1 HSET
+        publishes new_ip for the IPs that weren't in IPsInfo and
+        1 ip_info_change for each IP we have new info about
+        """
+        ips = list(ips_info)
         # Get the previous info already stored
-        cached_ip_info = self.getIPData(ip)
-        if cached_ip_info is False:
-            # This IP is not in the dictionary, add it first:
-            self.setNewIP(ip)
-            cached_ip_info = {}
-
-        # make sure we don't already have the same info about this IP in our db
-        is_new_info = False
-        for info_type, info_val in to_store.items():
-            if (
-                    info_type not in cached_ip_info
-                    and not is_new_info
-            ):
-                is_new_info = True
-
-            cached_ip_info[info_type] = info_val
-
-        self.rcache.hset('IPsInfo', ip, json.dumps(cached_ip_info))
-        if is_new_info:
-            self.r.publish('ip_info_change', ip)
+        cached_ips_info = self.rcache.hmget('IPsInfo', ips)
+        to_write = {}
+        new_ips = []
+        changed_ips = []
+        for ip, cached_ip_info in zip(ips, cached_ips_info):
+            if cached_ip_info is None:
+                # This IP is not in the dictionary
+                new_ips.append(ip)
+                cached_ip_info = {}
+            else:
+                cached_ip_info = json.loads(cached_ip_info)
+
+            # make sure we don't already have the same info about this IP in our db
+            to_store = ips_info[ip]
+            if any(info_type not in cached_ip_info for info_type in to_store):
+                changed_ips.append(ip)
+
+            cached_ip_info.update(to_store)
+            to_write[ip] = json.dumps(cached_ip_info)
+
+        self.rcache.hset('IPsInfo', mapping=to_write)
+
+        # this may run in the thread of the buffer, use a pipeline of its own
+        pipe = self.r.pipeline(transaction=False)
+        for ip in new_ips:
+            # Publish that there is a new IP ready in the channel
+            pipe.publish('new_ip', ip)
+        for ip in changed_ips:
+            pipe.publish('ip_info_change', ip)
+        pipe.execute()
 
     def get_p2p_reports_about_ip(self, ip) -> dict:
         """
@@ -1141,7 +1303,7 @@ class ProfilingFlowsDatabase(object):
         # Convert to json string
         http_flow_dict = json.dumps(http_flow_dict)
 
-        self.r.hset(
+        self.writer.hset(
             f'{profileid}{ self.separator }{twid}{ self.separator }altflows',
             flow.uid,
             http_flow_dict,
@@ -1223,7 +1385,7 @@ class ProfilingFlowsDatabase(object):
         # Convert to json string
         ssh_flow_dict = json.dumps(ssh_flow_dict)
         # Set the dns as alternative flow
-        self.r.hset(
+        self.writer.hset(
             f'{profileid}{self.separator}{twid}{self.separator}altflows',
             flow.uid,
             ssh_flow_dict,
@@ -1275,7 +1437,7 @@ class ProfilingFlowsDatabase(object):
             'uid': flow.uid,
         }
         to_send = json.dumps(to_send)
-        self.r.hset(
+        self.writer.hset(
             f'{profileid}{self.separator}{twid}{self.separator}altflows',
             flow.uid,
             notice_flow,
@@ -1303,6 +1465,16 @@ class ProfilingFlowsDatabase(object):
             return ip_info
         return {}
 
+    def get_dns_resolutions(self, ips) -> dict:
+        """
+        returns {ip: the same as get_dns_resolution(ip)} of all the given ips in 1 round-trip
+        """
+        ips = list(ips)
+        return {
+            ip: json.loads(ip_info) if ip_info else {}
+            for ip, ip_info in zip(ips, self.r.hmget('DNSresolution', ips))
+        }
+
     def is_ip_resolved(self, ip, hrs):
         """
         :param hrs: float, how many hours to look back for resolutions
@@ -1579,7 +1751,7 @@ class ProfilingFlowsDatabase(object):
         # Convert to json string
         dns_flow = json.dumps(dns_flow)
         # Set the dns as alternative flow
-        self.r.hset(
+        self.writer.hset(
             f'{profileid}{self.separator}{twid}{self.separator}altflows',
             flow.uid,
             dns_flow,
@@ -1,6 +1,7 @@
 from slips_files.common.slips_utils import utils
 from slips_files.common.config_parser import ConfigParser
 from slips_files.core.database._profile_flow import ProfilingFlowsDatabase
+from slips_files.core.database.flow_codec import get_flow_codec, decode_flow, decode_msg
 import os
 import signal
 import redis
@@ -61,7 +62,9 @@ class Database(ProfilingFlowsDatabase, object):
         'new_tunnel',
         'check_jarm_hash',
         'control_module',
-        'new_module_flow'
+        'new_module_flow',
+        'new_ip_ranges',
+        'new_runtime_ips',
     }
 
     """ Database object management """
@@ -88,6 +91,12 @@ class Database(ProfilingFlowsDatabase, object):
         self.first_flow = True
         # to make sure we only detect and store the user's localnet once
         self.is_localnet_set = False
+        # pipeline used to send all the writes of 1 flow in 1 round-trip
+        self.pipe = None
+        self.modified_tws = set()
+        # {profileid: (number of the first tw, start of the first tw, number of the last tw)}
+        # of the profiles seen by get_timewindow() in this process
+        self.tw_index = {}
 
 
     def set_redis_options(self):
@@ -134,43 +143,62 @@ class Database(ProfilingFlowsDatabase, object):
                 return pid
         return False
 
+    def connect_to_redis(self, port: str):
+        """
+        Sets r, rbytes and rcache without starting or closing any redis server,
+        used by processes that connect to the db of an already running slips
+        """
+        # db 0 changes everytime we run slips
+        # set health_check_interval to avoid redis ConnectionReset errors:
+        # if the connection is idle for more than 30 seconds,
+        # a round trip PING/PONG will be attempted before next redis cmd.
+        # If the PING/PONG fails, the connection will reestablished
+
+        # retry_on_timeout=True after the command times out, it will be retried once,
+        # if the retry is successful, it will return normally; if it fails, an exception will be thrown
+        self.r = redis.StrictRedis(
+            host='localhost',
+            port=port,
+            db=0,
+            charset='utf-8',
+            socket_keepalive=True,
+            decode_responses=True,
+            retry_on_timeout=True,
+            health_check_interval=20,
+        )  # password='password')
+        # same db without decoding the responses, used to read the flows
+        # because msgpack encoded flows aren't utf-8
+        self.rbytes = redis.StrictRedis(
+            host='localhost',
+            port=port,
+            db=0,
+            socket_keepalive=True,
+            decode_responses=False,
+            retry_on_timeout=True,
+            health_check_interval=20,
+        )
+        # port 6379 db 0 is cache, delete it using -cc flag
+        self.rcache = redis.StrictRedis(
+            host='localhost',
+            port=6379,
+            db=1,
+            charset='utf-8',
+            socket_keepalive=True,
+            retry_on_timeout=True,
+            decode_responses=True,
+            health_check_interval=30,
+        )  # password='password')
+        # the tws of the profiles in this db aren't known yet
+        self.tw_index = {}
+
     def connect_to_redis_server(self, port: str):
-        """Connects to the given port and Sets r and rcache"""
+        """Starts the redis server on the given port, connects to it and Sets r and rcache"""
         try:
             # start the redis server
             os.system(
                 f'redis-server redis.conf --port {port}  > /dev/null 2>&1'
             )
-
-            # db 0 changes everytime we run slips
-            # set health_check_interval to avoid redis ConnectionReset errors:
-            # if the connection is idle for more than 30 seconds,
-            # a round trip PING/PONG will be attempted before next redis cmd.
-            # If the PING/PONG fails, the connection will reestablished
-
-            # retry_on_timeout=True after the command times out, it will be retried once,
-            # if the retry is successful, it will return normally; if it fails, an exception will be thrown
-            self.r = redis.StrictRedis(
-                host='localhost',
-                port=port,
-                db=0,
-                charset='utf-8',
-                socket_keepalive=True,
-                decode_responses=True,
-                retry_on_timeout=True,
-                health_check_interval=20,
-            )  # password='password')
-            # port 6379 db 0 is cache, delete it using -cc flag
-            self.rcache = redis.StrictRedis(
-                host='localhost',
-                port=6379,
-                db=1,
-                charset='utf-8',
-                socket_keepalive=True,
-                retry_on_timeout=True,
-                decode_responses=True,
-                health_check_interval=30,
-            )  # password='password')
+            self.connect_to_redis(port)
             # the connection to redis is only established
             # when you try to execute a command on the server.
             # so make sure it's established first
@@ -225,6 +253,10 @@ class Database(ProfilingFlowsDatabase, object):
         self.disabled_detections = conf.disabled_detections()
         self.home_network = conf.get_home_network()
         self.width = conf.get_tw_width_as_float()
+        self.flow_codec = get_flow_codec(conf.flow_codec())
+        self.reference_new_flows = conf.new_flow_notifications() == 'reference'
+        self.tw_modified_interval = conf.tw_modified_interval()
+        self.ip_info_write_interval = conf.ip_info_write_interval()
 
 
     def change_redis_limits(self, redis_client):
@@ -754,33 +786,41 @@ class Database(ProfilingFlowsDatabase, object):
         """
         return len(self.getTWsfromProfile(profileid)) if profileid else False
 
+    def get_ips_contacted(self, profileid, twid, direction) -> dict:
+        """
+        returns the times each ip was contacted in the given tw as {'1.1.1.1': 3}
+        :param direction: 'Src' or 'Dst'
+        """
+        if data := self.r.hget(profileid + self.separator + twid, f'{direction}IPs'):
+            # stored as 1 json blob by older versions of slips, e.g. when using -db
+            return json.loads(data)
+        ips_contacted = self.r.hgetall(
+            self.get_tw_data_key(profileid, twid, f'{direction}IPs')
+        )
+        return {ip: int(times) for ip, times in ips_contacted.items()}
+
     def getSrcIPsfromProfileTW(self, profileid, twid):
         """
-        Get the src ip for a specific TW for a specific profileid
+        Get the src ips for a specific TW for a specific profileid
         """
-        return self.r.hget(profileid + self.separator + twid, 'SrcIPs')
+        return self.get_ips_contacted(profileid, twid, 'Src')
 
     def getDstIPsfromProfileTW(self, profileid, twid):
         """
-        Get the dst ip for a specific TW for a specific profileid
+        Get the dst ips for a specific TW for a specific profileid
         """
-        return self.r.hget(profileid + self.separator + twid, 'DstIPs')
+        return self.get_ips_contacted(profileid, twid, 'Dst')
 
     def getT2ForProfileTW(self, profileid, twid, tupleid, tuple_key: str):
         """
         Get T1 and the previous_time for this previous_time, twid and tupleid
         """
         try:
-            hash_id = profileid + self.separator + twid
-            data = self.r.hget(hash_id, tuple_key)
-            if not data:
-                return False, False
-            data = json.loads(data)
-            try:
-                (_, previous_two_timestamps) = data[tupleid]
-                return previous_two_timestamps
-            except KeyError:
+            tuples_key = self.get_tw_data_key(profileid, twid, tuple_key)
+            previous_two_timestamps = self.r.hget(tuples_key, tupleid)
+            if not previous_two_timestamps:
                 return False, False
+            return json.loads(previous_two_timestamps)
         except Exception as e:
             exception_line = sys.exc_info()[2].tb_lineno
             self.outputqueue.put(
@@ -870,6 +910,8 @@ class Database(ProfilingFlowsDatabase, object):
             # Add the new TW to the index of TW
             data = {str(twid): float(startoftw)}
             self.r.zadd(f'tws{profileid}', data)
+            # get_timewindow() reloads the tws of this profile from the db
+            self.tw_index.pop(profileid, None)
             self.outputqueue.put(
                 f'04|database|[DB]: Created and added to DB the new older TW with id {twid}. Time: {startoftw} '
             )
@@ -907,6 +949,8 @@ class Database(ProfilingFlowsDatabase, object):
             # Add the new TW to the index of TW
             data = {twid: float(startoftw)}
             self.r.zadd(f'tws{profileid}', data)
+            # get_timewindow() reloads the tws of this profile from the db
+            self.tw_index.pop(profileid, None)
             self.outputqueue.put(
                 f'04|database|[DB]: Created and added to DB for profile {profileid} on TW with id {twid}. Time: {startoftw} '
             )
@@ -987,12 +1031,14 @@ class Database(ProfilingFlowsDatabase, object):
             self.outputqueue.put(f'01|database|[DB] {traceback.print_exc()}')
 
     def getOutTuplesfromProfileTW(self, profileid, twid):
-        """Get the out tuples"""
-        return self.r.hget(profileid + self.separator + twid, 'OutTuples')
+        """Get the out tuples as a json str"""
+        if tuples := self.get_tuples(profileid, twid, 'OutTuples'):
+            return json.dumps(tuples)
 
     def getInTuplesfromProfileTW(self, profileid, twid):
-        """Get the in tuples"""
-        return self.r.hget(profileid + self.separator + twid, 'InTuples')
+        """Get the in tuples as a json str"""
+        if tuples := self.get_tuples(profileid, twid, 'InTuples'):
+            return json.dumps(tuples)
 
     def getFieldSeparator(self):
         """Return the field separator"""
@@ -1025,52 +1071,75 @@ class Database(ProfilingFlowsDatabase, object):
         Update the threat level of a certain profile
         :param threat_level: available options are 'low', 'medium' 'critical' etc
         """
+        self.update_threat_levels([profileid], threat_level, confidence)
+
+    def update_threat_levels(self, profileids: list, threat_level: str, confidence):
+        """
+        Update the threat level of the given profiles to the same threat level,
+        reading and writing all of them in 3 round-trips
+        :param threat_level: available options are 'low', 'medium' 'critical' etc
+        """
+        if not profileids:
+            return
 
-        self.r.hset(profileid, 'threat_level', threat_level)
         now = time.time()
         now = utils.convert_format(now, utils.alerts_format)
         # keep track of old threat levels
         confidence = f'confidence: {confidence}'
-        past_threat_levels = self.r.hget(profileid, 'past_threat_levels')
         # this is what we'll be storing in the db, tl, ts, and confidence
         threat_level_data = (threat_level, now, confidence)
-        if past_threat_levels:
-            # get the lists of ts and past threat levels
-            past_threat_levels = json.loads(past_threat_levels)
-            latest_threat_level, latest_ts, latest_confidence = past_threat_levels[-1]
-            if (
-                    latest_threat_level == threat_level
-                    and latest_confidence == confidence
-            ):
-                # if the past threat level and confidence are the same as the ones we wanna store,
-                # replace the timestamp only
-                past_threat_levels[-1] = threat_level_data
-            else:
-                # add this threat level to the list of past threat levels
-                past_threat_levels.append(threat_level_data)
-        else:
-            # first time setting a threat level for this profile
-            past_threat_levels = [threat_level_data]
-            # threat_levels_update_time = [now]
 
-        past_threat_levels = json.dumps(past_threat_levels)
-        self.r.hset(profileid, 'past_threat_levels', past_threat_levels)
+        pipe = self.r.pipeline(transaction=False)
+        for profileid in profileids:
+            pipe.hget(profileid, 'past_threat_levels')
+        all_past_threat_levels = pipe.execute()
 
-        # set the score and confidence of the given ip in the db when it causes an evidence
+        for profileid, past_threat_levels in zip(profileids, all_past_threat_levels):
+            if past_threat_levels:
+                # get the lists of ts and past threat levels
+                past_threat_levels = json.loads(past_threat_levels)
+                latest_threat_level, latest_ts, latest_confidence = past_threat_levels[-1]
+                if (
+                        latest_threat_level == threat_level
+                        and latest_confidence == confidence
+                ):
+                    # if the past threat level and confidence are the same as the ones we wanna store,
+                    # replace the timestamp only
+                    past_threat_levels[-1] = threat_level_data
+                else:
+                    # add this threat level to the list of past threat levels
+                    past_threat_levels.append(threat_level_data)
+            else:
+                # first time setting a threat level for this profile
+                past_threat_levels = [threat_level_data]
+
+            pipe.hset(
+                profileid,
+                mapping={
+                    'threat_level': threat_level,
+                    'past_threat_levels': json.dumps(past_threat_levels),
+                },
+            )
+        pipe.execute()
+
+        # set the score and confidence of the given ips in the db when they cause an evidence
         # these 2 values will be needed when sharing with peers
-        ip = profileid.split('_')[-1]
+        ips = [profileid.split('_')[-1] for profileid in profileids]
         # get the numerical value of this threat level
         score = utils.threat_levels[threat_level.lower()]
         score_confidence = {
             'score': score,
             'confidence': confidence
         }
-        if cached_ip_data := self.getIPData(ip):
+        ips_data = {}
+        for ip, cached_ip_data in zip(ips, self.rcache.hmget('IPsInfo', ips)):
+            cached_ip_data = json.loads(cached_ip_data) if cached_ip_data else {}
+            if self.ip_info_buffer is not None:
+                cached_ip_data.update(self.ip_info_buffer.get(ip))
             # append the score and conf. to the already existing data
             cached_ip_data.update(score_confidence)
-            self.rcache.hset('IPsInfo', ip, json.dumps(cached_ip_data))
-        else:
-            self.rcache.hset('IPsInfo', ip, json.dumps(score_confidence))
+            ips_data[ip] = json.dumps(cached_ip_data)
+        self.rcache.hset('IPsInfo', mapping=ips_data)
 
     def set_evidence_causing_alert(self, profileid, twid, alert_ID, evidence_IDs: list):
         """
@@ -1140,107 +1209,78 @@ class Database(ProfilingFlowsDatabase, object):
         self.r.hset('alerts', profileid, profile_alerts)
 
 
+    def get_tw_index(self, profileid):
+        """
+        returns a tuple (number of the first tw, start of the first tw, number of the last tw)
+        of the given profile, or None if it has no tws yet.
+        the tws are read from the db only the first time this process sees the profile
+        """
+        if index := self.tw_index.get(profileid):
+            return index
+
+        first_tw = self.getFirstTWforProfile(profileid)
+        if not first_tw:
+            return None
+        [(firsttwid, firsttw_start_time)] = first_tw
+        [(lasttwid, _)] = self.getLastTWforProfile(profileid)
+        index = (
+            int(firsttwid.split('timewindow')[1]),
+            float(firsttw_start_time),
+            int(lasttwid.split('timewindow')[1]),
+        )
+        self.tw_index[profileid] = index
+        return index
+
+    def add_tws(self, profileid, first_number: int, first_start: float, numbers: range):
+        """
+        Creates the tws with the given numbers of this profile in 1 round-trip
+        The tws of a profile are consecutive, each one starts where the previous one ends,
+        so the start of each tw is calculated from the start of the first one
+        :param first_number: number of the current first tw of the profile,
+        or of the first tw to create if the profile has no tws
+        :param first_start: start of the tw with the number first_number
+        """
+        tws = {
+            f'timewindow{number}': first_start + (number - first_number) * self.width
+            for number in numbers
+        }
+        self.r.zadd(f'tws{profileid}', tws)
+        self.outputqueue.put(
+            f'04|database|[DB]: Created and added to DB for profile {profileid} '
+            f'{len(tws)} TWs: from timewindow{numbers[0]} to timewindow{numbers[-1]}'
+        )
+
+        index = self.tw_index.get(profileid, (first_number, first_start, first_number))
+        first_number, first_start, last_number = index
+        if numbers[0] < first_number:
+            # older tws, the first tw changed
+            first_start -= (first_number - numbers[0]) * self.width
+            first_number = numbers[0]
+        else:
+            # When a new TW is created for this profile,
+            # change the threat level of the profile to 0(info) and confidence to 0.05
+            self.update_threat_level(profileid, 'info', 0.5)
+        last_number = max(last_number, numbers[-1])
+        self.tw_index[profileid] = (first_number, first_start, last_number)
+
     def get_timewindow(self, flowtime, profileid):
         """
         This function should get the id of the TW in the database where the flow belong.
         If the TW is not there, we create as many tw as necessary in the future or past until we get the correct TW for this flow.
-        - We use this function to avoid retrieving all the data from the DB for the complete profile. We use a separate table for the TW per profile.
+        - The tws of each profile are consecutive and have the same width, so the TW of the flow is
+        calculated from the first TW of the profile instead of asking the db for the last TW on every flow.
+        The first and last TW of each profile are kept in self.tw_index
+        - The empty TWs in the middle are created in 1 round-trip
         -- Returns the time window id
-        THIS IS NOT WORKING:
-        - The empty profiles in the middle are not being created!!!
-        - The Dtp ips are stored in the first time win
         """
         try:
-            # First check if we are not in the last TW. Since this will be the majority of cases
-            try:
-                if not profileid:
-                    # profileid is None if we're dealing with a profile
-                    # outside of home_network when this param is given
-                    return False
-                [(lasttwid, lasttw_start_time)] = self.getLastTWforProfile(profileid)
-                lasttw_start_time = float(lasttw_start_time)
-                lasttw_end_time = lasttw_start_time + self.width
-                flowtime = float(flowtime)
-                self.print(
-                    f'The last TW id for profile {profileid} was {lasttwid}. Start:{lasttw_start_time}. End: {lasttw_end_time}',
-                    3,
-                    0,
-                )
-                # There was a last TW, so check if the current flow belongs here.
-                if (
-                    lasttw_end_time > flowtime
-                    and lasttw_start_time <= flowtime
-                ):
-                    self.print(
-                        f'The flow ({flowtime}) is on the last time window ({lasttw_end_time})',
-                        3,
-                        0,
-                    )
-                    twid = lasttwid
-                elif lasttw_end_time <= flowtime:
-                    # The flow was not in the last TW, its NEWER than it
-                    self.print(
-                        f'The flow ({flowtime}) is NOT on the last time window ({lasttw_end_time}). Its newer',
-                        3,
-                        0,
-                    )
-                    amount_of_new_tw = int(
-                        (flowtime - lasttw_end_time) / self.width
-                    )
-                    self.print(
-                        f'We have to create {amount_of_new_tw} empty TWs in the midle.',
-                        3,
-                        0,
-                    )
-                    temp_end = lasttw_end_time
-                    for _ in range(amount_of_new_tw + 1):
-                        new_start = temp_end
-                        twid = self.addNewTW(profileid, new_start)
-                        self.print(f'Creating the TW id {twid}. Start: {new_start}.', 3, 0)
-                        temp_end = new_start + self.width
-                        # Now get the id of the last TW so we can return it
-                else:
-                    # The flow was not in the last TW, its OLDER that it
-                    self.print(
-                        f'The flow ({flowtime}) is NOT on the last time window ({lasttw_end_time}). Its older',
-                        3,
-                        0,
-                    )
-                    if data := __database__.getTWofTime(profileid, flowtime):
-                        # We found a TW where this flow belongs to
-                        (twid, tw_start_time) = data
-                        return twid
-                    else:
-                        # There was no TW that included the time of this flow, so create them in the past
-                        # How many new TW we need in the past?
-                        # amount_of_new_tw is the total amount of tw we should have under the new situation
-                        amount_of_new_tw = int(
-                            (lasttw_end_time - flowtime) / self.width
-                        )
-                        # amount_of_current_tw is the real amount of tw we have now
-                        amount_of_current_tw = (
-                            __database__.getamountTWsfromProfile(profileid)
-                        )
-                        # diff is the new ones we should add in the past. (Yes, we could have computed this differently)
-                        diff = amount_of_new_tw - amount_of_current_tw
-                        self.print(f'We need to create {diff + 1} TW before the first', 3, 0)
-                        # Get the first TW
-                        [
-                            (firsttwid, firsttw_start_time)
-                        ] = __database__.getFirstTWforProfile(profileid)
-                        firsttw_start_time = float(firsttw_start_time)
-                        # The start of the new older TW should be the first - the width
-                        temp_start = firsttw_start_time - self.width
-                        for _ in range(diff + 1):
-                            new_start = temp_start
-                            # The method to add an older TW is the same as
-                            # to add a new one, just the starttime changes
-                            twid = __database__.addNewOlderTW(
-                                profileid, new_start
-                            )
-                            self.print(f'Creating the new older TW id {twid}. Start: {new_start}.', 3, 0)
-                            temp_start = new_start - self.width
-            except ValueError:
+            if not profileid:
+                # profileid is None if we're dealing with a profile
+                # outside of home_network when this param is given
+                return False
+            flowtime = float(flowtime)
+            index = self.get_tw_index(profileid)
+            if index is None:
                 # There is no last tw. So create the first TW
                 # If the option for only-one-tw was selected, we should create the TW at least 100 years before the flowtime, to cover for
                 # 'flows in the past'. Which means we should cover for any flow that is coming later with time before the first flow
@@ -1249,11 +1289,35 @@ class Database(ProfilingFlowsDatabase, object):
                     startoftw = float(flowtime - (31536000 * 100))
                 else:
                     startoftw = flowtime
-
                 # Add this TW, of this profile, to the DB
-                twid = self.addNewTW(profileid, startoftw)
-                # self.print("First TW ({}) created for profile {}.".format(twid, profileid), 0, 1)
-            return twid
+                self.add_tws(profileid, 1, startoftw, range(1, 2))
+                return 'timewindow1'
+
+            first_number, first_start, last_number = index
+            number = first_number + int((flowtime - first_start) // self.width)
+            if number > last_number:
+                # The flow is NEWER than the last TW, create it and the empty TWs in the middle
+                self.print(
+                    f'The flow ({flowtime}) is NOT on the last time window. Its newer. '
+                    f'Creating timewindow{last_number + 1} to timewindow{number}',
+                    3,
+                    0,
+                )
+                self.add_tws(
+                    profileid, first_number, first_start, range(last_number + 1, number + 1)
+                )
+            elif number < first_number:
+                # The flow is OLDER than the first TW, create the TWs in the past
+                self.print(
+                    f'The flow ({flowtime}) is before the first time window. '
+                    f'Creating timewindow{number} to timewindow{first_number - 1}',
+                    3,
+                    0,
+                )
+                self.add_tws(
+                    profileid, first_number, first_start, range(number, first_number)
+                )
+            return f'timewindow{number}'
         except Exception as e:
             self.print('Error in get_timewindow().', 0, 1)
             self.print(f'{e}', 0, 1)
@@ -1281,18 +1345,10 @@ class Database(ProfilingFlowsDatabase, object):
         return False
 
     def get_evidence_by_ID(self, profileid, twid, ID):
-
-        evidence = self.getEvidenceForTW(profileid, twid)
-        if not evidence:
-            return False
-
-        evidence: dict = json.loads(evidence)
-        # loop through each evidence in this tw
-        for evidence_details in evidence.values():
-            evidence_details = json.loads(evidence_details)
-            if evidence_details.get('ID') == ID:
-                # found an evidence that has a matching ID
-                return evidence_details
+        evidence_key = self.get_tw_data_key(profileid, twid, 'evidence')
+        if evidence_details := self.r.hget(evidence_key, ID):
+            return json.loads(evidence_details)
+        return False
 
     def is_detection_disabled(self, evidence_type: str):
         """
@@ -1415,29 +1471,18 @@ class Database(ProfilingFlowsDatabase, object):
 
         evidence_to_send = json.dumps(evidence_to_send)
 
-
-        # Check if we have and get the current evidence stored in the DB for
-        # this profileid in this twid
-        current_evidence = self.getEvidenceForTW(profileid, twid)
-        current_evidence = json.loads(current_evidence) if current_evidence else {}
-        should_publish = evidence_ID not in current_evidence.keys()
-        # update our current evidence for this profileid and twid.
-        # now the evidence_ID is used as the key
-        current_evidence.update({evidence_ID: evidence_to_send})
-
-        # Set evidence in the database.
-        current_evidence = json.dumps(current_evidence)
-        self.r.hset(
-            profileid + self.separator + twid, 'Evidence', current_evidence
+        # each evidence of this profileid and twid is stored in its own field,
+        # so adding one doesn't read or rewrite the rest of them.
+        # the evidence number keeps them sorted by the time they were added
+        evidence_number = self.r.incr('number_of_evidence', 1)
+        self.store_tw_evidence(
+            profileid,
+            twid,
+            {evidence_ID: (evidence_to_send, evidence_number)}
         )
 
-        self.r.hset(f'evidence{profileid}', twid, current_evidence)
-
-        # This is done to ignore repetition of the same evidence sent.
-        # note that publishing HAS TO be done after updating the 'Evidence' keys
-        if should_publish:
-            self.r.incr('number_of_evidence', 1)
-            self.publish('evidence_added', evidence_to_send)
+        # note that publishing HAS TO be done after storing the evidence
+        self.publish('evidence_added', evidence_to_send)
 
         # an evidence is generated for this profile
         # update the threat level of this profile
@@ -1450,6 +1495,43 @@ class Database(ProfilingFlowsDatabase, object):
         return True
 
 
+    def store_tw_evidence(self, profileid, twid, evidence: dict):
+        """
+        Stores the given evidence in the evidence hash of this tw in 1 round-trip
+        :param evidence: dict of {evidence ID: (serialized evidence, evidence number)}
+        """
+        evidence_key = self.get_tw_data_key(profileid, twid, 'evidence')
+        pipe = self.r.pipeline(transaction=False)
+        for evidence_ID, (evidence_details, evidence_number) in evidence.items():
+            pipe.hset(evidence_key, evidence_ID, evidence_details)
+            pipe.zadd(
+                f'{evidence_key}{self.separator}order', {evidence_ID: evidence_number}
+            )
+        pipe.execute()
+
+    def migrate_tw_evidence(self, profileid, twid) -> bool:
+        """
+        Converts the evidence of this tw stored by older versions of slips
+        as 1 json dict in the 'Evidence' field of the profileid_twid hash
+        to 1 field per evidence
+        returns False if there's nothing to migrate
+        """
+        profile_tw = f'{profileid}{self.separator}{twid}'
+        legacy_evidence = self.r.hget(profile_tw, 'Evidence')
+        if not legacy_evidence:
+            return False
+
+        evidence = {}
+        # the old evidence were added before any new ones, keep them first
+        for evidence_number, (evidence_ID, evidence_details) in enumerate(
+                json.loads(legacy_evidence).items()
+        ):
+            evidence[evidence_ID] = (evidence_details, evidence_number)
+        self.store_tw_evidence(profileid, twid, evidence)
+        self.r.hdel(profile_tw, 'Evidence')
+        self.r.hdel(f'evidence{profileid}', twid)
+        return True
+
     def init_evidence_number(self):
         """used when the db starts to initialize number of evidence generated by slips """
         self.r.set('number_of_evidence', 0)
@@ -1474,6 +1556,13 @@ class Database(ProfilingFlowsDatabase, object):
         # instead of the main db is, we don't want them cleared on every new instance of slips
         self.rcache.sadd('tranco_whitelisted_domains', domain)
 
+    def store_tranco_whitelisted_domains(self, domains):
+        """
+        store a group of whitelisted domains from tranco whitelist in the db
+        """
+        if domains:
+            self.rcache.sadd('tranco_whitelisted_domains', *domains)
+
     def is_whitelisted_tranco_domain(self, domain):
         return self.rcache.sismember('tranco_whitelisted_domains', domain)
 
@@ -1491,18 +1580,12 @@ class Database(ProfilingFlowsDatabase, object):
         """
         Delete evidence from the database
         """
-        # 1. delete evidence from 'evidence' key
-        current_evidence = self.getEvidenceForTW(profileid, twid)
-        current_evidence = json.loads(current_evidence) if current_evidence else {}
-        # Delete the key regardless of whether it is in the dictionary
-        current_evidence.pop(evidence_ID, None)
-        current_evidence_json = json.dumps(current_evidence)
-        self.r.hset(
-            profileid + self.separator + twid,
-            'Evidence',
-            current_evidence_json,
-        )
-        self.r.hset(f'evidence{profileid}', twid, current_evidence_json)
+        # 1. delete evidence from the evidence hash of this tw
+        evidence_key = self.get_tw_data_key(profileid, twid, 'evidence')
+        pipe = self.r.pipeline(transaction=False)
+        pipe.hdel(evidence_key, evidence_ID)
+        pipe.zrem(f'{evidence_key}{self.separator}order', evidence_ID)
+        pipe.execute()
         # 2. delete evidence from 'alerts' key
         profile_alerts = self.r.hget('alerts', profileid)
         if not profile_alerts:
@@ -1555,26 +1638,29 @@ class Database(ProfilingFlowsDatabase, object):
         """
         return self.r.sismember('whitelisted_evidence', evidence_ID)
 
-    def remove_whitelisted_evidence(self, all_evidence:str) -> str:
+    def getEvidenceForTW(self, profileid, twid) -> dict:
         """
-        param all_evidence serialized json dict
-        returns a serialized json dict
+        Get the evidence for this TW for this Profile, without the whitelisted ones
+        returns a dict of {evidence ID: serialized evidence} sorted by the time they were added
         """
-        # remove whitelisted evidence from the given evidence
-        all_evidence = json.loads(all_evidence)
-        tw_evidence = {}
-        for ID,evidence in all_evidence.items():
-            if self.is_whitelisted_evidence(ID):
-                continue
-            tw_evidence[ID] = evidence
-        return json.dumps(tw_evidence)
+        evidence_key = self.get_tw_data_key(profileid, twid, 'evidence')
+        IDs = self.r.zrange(f'{evidence_key}{self.separator}order', 0, -1)
+        if not IDs:
+            if not self.migrate_tw_evidence(profileid, twid):
+                return {}
+            IDs = self.r.zrange(f'{evidence_key}{self.separator}order', 0, -1)
+
+        pipe = self.r.pipeline(transaction=False)
+        pipe.hmget(evidence_key, IDs)
+        for ID in IDs:
+            pipe.sismember('whitelisted_evidence', ID)
+        all_evidence, *whitelisted = pipe.execute()
 
-    def getEvidenceForTW(self, profileid, twid):
-        """Get the evidence for this TW for this Profile"""
-        evidence = self.r.hget(profileid + self.separator + twid, 'Evidence')
-        if evidence:
-            evidence = self.remove_whitelisted_evidence(evidence)
-        return evidence
+        return {
+            ID: evidence_details
+            for ID, evidence_details, is_whitelisted in zip(IDs, all_evidence, whitelisted)
+            if evidence_details and not is_whitelisted
+        }
 
     def checkBlockedProfTW(self, profileid, twid):
         """
@@ -1589,10 +1675,11 @@ class Database(ProfilingFlowsDatabase, object):
         """
         Add a final label to the flow
         """
-        if flow := self.get_flow(profileid, twid, uid):
-            data = json.loads(flow[uid])
+        flow = self.get_flow(profileid, twid, uid)
+        if flow and flow[uid]:
+            data = flow[uid]
             data['1_ensembling_label'] = ensembling_label
-            data = json.dumps(data)
+            data = self.flow_codec.encode(data)
             self.r.hset(
                 profileid + self.separator + twid + self.separator + 'flows',
                 uid,
@@ -1617,10 +1704,10 @@ class Database(ProfilingFlowsDatabase, object):
         """
         flow = self.get_flow(profileid, twid, uid)
         if flow and flow[uid]:
-            data = json.loads(flow[uid])
+            data = flow[uid]
             # here we dont care if add new module lablel or changing existing one
             data['module_labels'][module_name] = module_label
-            data = json.dumps(data)
+            data = self.flow_codec.encode(data)
             self.r.hset(
                 profileid + self.separator + twid + self.separator + 'flows',
                 uid,
@@ -1635,8 +1722,7 @@ class Database(ProfilingFlowsDatabase, object):
         """
         flow = self.get_flow(profileid, twid, uid)
         if flow and flow.get(uid, False):
-            flow = json.loads(flow[uid])
-            return flow.get('module_labels', '')
+            return flow[uid].get('module_labels', '')
         else:
             return {}
 
@@ -1773,18 +1859,35 @@ class Database(ProfilingFlowsDatabase, object):
             urldata = json.dumps(urldata)
             self.rcache.hset('URLsInfo', url, urldata)
 
-    def subscribe(self, channel: str, ignore_subscribe_messages=True):
-        """Subscribe to channel"""
-        # For when a TW is modified
-        if channel not in self.supported_channels:
+    def subscribe(self, channels, ignore_subscribe_messages=True):
+        """
+        Subscribe to 1 channel, or to a list of channels using 1 pubsub
+        the channel of each msg received is in msg['channel']
+        :param channels: channel name or list of channel names
+        """
+        if isinstance(channels, str):
+            channels = [channels]
+        channels = [
+            channel for channel in channels if channel in self.supported_channels
+        ]
+        if not channels:
             return False
 
-        self.pubsub = self.r.pubsub()
-        self.pubsub.subscribe(
-            channel, ignore_subscribe_messages=ignore_subscribe_messages
+        self.pubsub = self.r.pubsub(
+            ignore_subscribe_messages=ignore_subscribe_messages
         )
+        self.pubsub.subscribe(*channels)
         return self.pubsub
 
+    def decode_new_flow(self, data: str) -> dict:
+        """
+        decodes a msg received in the new_flow channel using any of the flow codecs
+        returns {'profileid', 'twid', 'uid', 'flow_type', 'proto', 'daddr', 'flow': flow dict, 'stime'}
+        'flow' and 'stime' aren't there when using reference new_flow msgs,
+        use get_flow_from_msg() to get the flow of any msg
+        """
+        return decode_msg(data)
+
     def publish_stop(self):
         """
         Publish stop command to terminate slips
@@ -1796,12 +1899,13 @@ class Database(ProfilingFlowsDatabase, object):
 
     def get_all_flows_in_profileid_twid(self, profileid, twid):
         """
-        Return a list of all the flows in this profileid and twid
+        Return a dict of all the decoded flows in this profileid and twid
+        {uid: flow dict}
         """
-        if data := self.r.hgetall(
+        if data := self.rbytes.hgetall(
             profileid + self.separator + twid + self.separator + 'flows'
         ):
-            return data
+            return {uid.decode(): decode_flow(flow) for uid, flow in data.items()}
 
     def get_all_flows_in_profileid(self, profileid):
         """
@@ -1817,7 +1921,7 @@ class Database(ProfilingFlowsDatabase, object):
         for twid, time in self.getTWsfromProfile(profileid):
             if flows := self.get_all_flows_in_profileid_twid(profileid, twid):
                 for uid, flow in list(flows.items()):
-                    profileid_flows.append({uid: json.loads(flow)})
+                    profileid_flows.append({uid: flow})
         return profileid_flows
 
     def get_all_flows(self) -> list:
@@ -1831,9 +1935,7 @@ class Database(ProfilingFlowsDatabase, object):
                 if flows_dict := self.get_all_flows_in_profileid_twid(
                     profileid, twid
                 ):
-                    for flow in flows_dict.values():
-                        dict_flow = json.loads(flow)
-                        flows.append(dict_flow)
+                    flows.extend(flows_dict.values())
         return flows
 
     def get_all_contacted_ips_in_profileid_twid(self, profileid, twid) -> dict:
@@ -1850,7 +1952,6 @@ class Database(ProfilingFlowsDatabase, object):
         contacted_ips = {}
         for uid, flow in all_flows.items():
             # get the daddr of this flow
-            flow = json.loads(flow)
             daddr = flow['daddr']
             contacted_ips[daddr] = uid
         return contacted_ips
@@ -2026,6 +2127,26 @@ class Database(ProfilingFlowsDatabase, object):
         """
         self.rcache.hdel('IoC_domains', *domains)
 
+    def add_iocs_to_IoC(
+            self, ips: dict, domains: dict, ip_ranges: dict
+    ) -> None:
+        """
+        Store the IPs, domains and IP ranges read from an IoC source in 1 round-trip
+        the params are like the ones of add_ips_to_IoC(), add_domains_to_IoC()
+        and add_ip_range_to_IoC()
+        """
+        pipe = self.rcache.pipeline(transaction=False)
+        if ips:
+            pipe.hset('IoC_ips', mapping=ips)
+        if domains:
+            pipe.hset('IoC_domains', mapping=domains)
+        if ip_ranges:
+            pipe.hset('IoC_ip_ranges', mapping=ip_ranges)
+        pipe.execute()
+        if ip_ranges:
+            # the threat intelligence module adds them to its index of ranges
+            self.publish('new_ip_ranges', json.dumps(list(ip_ranges)))
+
     def add_ips_to_IoC(self, ips_and_description: dict) -> None:
         """
         Store a group of IPs in the db as they were obtained from an IoC source
@@ -2038,6 +2159,35 @@ class Database(ProfilingFlowsDatabase, object):
         if ips_and_description:
             self.rcache.hmset('IoC_ips', ips_and_description)
 
+    def add_runtime_ips_to_IoC(self, ips_and_description: dict) -> None:
+        """
+        Store the IPs found while slips is running, by the modules or the online lookups.
+        They're also kept in IoC_runtime_ips until the IoC snapshot has them,
+        because the modules that use the snapshot don't look up its misses in IoC_ips
+        :param ips_and_description: same as add_ips_to_IoC()
+        """
+        if not ips_and_description:
+            return
+        pipe = self.rcache.pipeline(transaction=False)
+        pipe.hset('IoC_ips', mapping=ips_and_description)
+        pipe.hset('IoC_runtime_ips', mapping=ips_and_description)
+        pipe.execute()
+        # the threat intelligence module adds them to the ones it looks up
+        self.publish('new_runtime_ips', json.dumps(ips_and_description))
+
+    def get_runtime_IPs_in_IoC(self) -> dict:
+        """
+        Get the IPs stored by add_runtime_ips_to_IoC() that aren't in the IoC snapshot yet
+        """
+        return self.rcache.hgetall('IoC_runtime_ips')
+
+    def delete_runtime_ips_from_IoC(self, ips):
+        """
+        Delete the runtime IPs that were written to the IoC snapshot
+        """
+        if ips:
+            self.rcache.hdel('IoC_runtime_ips', *ips)
+
     def add_domains_to_IoC(self, domains_and_description: dict) -> None:
         """
         Store a group of domains in the db as they were obtained from
@@ -2056,6 +2206,8 @@ class Database(ProfilingFlowsDatabase, object):
         """
         if malicious_ip_ranges:
             self.rcache.hmset('IoC_ip_ranges', malicious_ip_ranges)
+            # the threat intelligence module adds them to its index of ranges
+            self.publish('new_ip_ranges', json.dumps(list(malicious_ip_ranges)))
 
     def add_asn_to_IoC(self, blacklisted_ASNs: dict):
         """
@@ -2104,6 +2256,13 @@ class Database(ProfilingFlowsDatabase, object):
         """
         return self.rcache.hgetall('IoC_ip_ranges')
 
+    def get_malicious_ip_range(self, ip_range) -> str:
+        """
+        Returns the info of the given malicious ip range
+        return format is json.dumps{'source':..,'tags':..,'threat_level':... ,'description'}
+        """
+        return self.rcache.hget('IoC_ip_ranges', ip_range)
+
     def set_malicious_ip(self, ip, profileid, twid):
         """
         Save in DB malicious IP found in the traffic
@@ -2265,17 +2424,16 @@ class Database(ProfilingFlowsDatabase, object):
         description: description of the subdomain if found
         bool: True if we found a match for exactly the given domain False if we matched a subdomain
         """
-        domain_description = self.rcache.hget('IoC_domains', domain)
-        if domain_description is None:
-            # try to match subdomain
-            ioc_domains = self.rcache.hgetall('IoC_domains')
-            for malicious_domain, description in ioc_domains.items():
-                #  if the we contacted images.google.com and we have google.com in our blacklists, we find a match
-                if malicious_domain in domain:
-                    return description, True
-            return False, False
-        else:
-            return domain_description, False
+        # if we contacted images.google.com and we have google.com in our blacklists, we find a match.
+        # only whole labels match, badgoogle.com doesn't match google.com
+        labels = domain.split('.')
+        # don't look up the TLD alone
+        parent_domains = ['.'.join(labels[idx:]) for idx in range(max(len(labels) - 1, 1))]
+        descriptions = self.rcache.hmget('IoC_domains', parent_domains)
+        for idx, description in enumerate(descriptions):
+            if description is not None:
+                return description, idx > 0
+        return False, False
 
 
     def get_host_ip(self):
@@ -2329,57 +2487,96 @@ class Database(ProfilingFlowsDatabase, object):
     def delete_file_info(self, file):
         self.rcache.hdel('TI_files_info', file)
 
-    def set_asn_cache(self, org: str, asn_range: str, asn_number: str) -> None:
+    def get_all_TI_files_info(self) -> dict:
+        """returns {file: info} of all the TI files, like their e-tags and update time"""
+        return {
+            file: json.loads(info)
+            for file, info in self.rcache.hgetall('TI_files_info').items()
+        }
+
+    def get_all_IoCs(self) -> dict:
         """
-        Stores the range of asn in cached_asn hash
+        returns all the IoCs in the cache db in 1 round-trip,
+        {'ips': {ip: json info}, 'domains': {...}, ...}
+        tranco_whitelist has the whitelisted domains and empty values
         """
+        tables = ('ips', 'ip_ranges', 'domains')
+        pipe = self.rcache.pipeline(transaction=False)
+        for key in ('IoC_ips', 'IoC_ip_ranges', 'IoC_domains'):
+            pipe.hgetall(key)
+        pipe.smembers('tranco_whitelisted_domains')
+        *iocs, tranco_whitelist = pipe.execute()
+        iocs = dict(zip(tables, iocs))
+        iocs['tranco_whitelist'] = dict.fromkeys(tranco_whitelist, '')
+        return iocs
 
-        range_info = {
-            asn_range: {
-                'org': org
-            }
-        }
+    def set_asn_cache(self, org: str, asn_range: str, asn_number: str) -> None:
+        """
+        Stores the range of asn in cached_asn_ranges hash
+        """
+        range_info = {'org': org}
         if asn_number:
-            range_info[asn_range].update(
-                {'number': f'AS{asn_number}'}
-            )
-
-        first_octet = utils.get_first_octet(asn_range)
-        if not first_octet:
-            return
+            range_info['number'] = f'AS{asn_number}'
 
-        # this is how we store ASNs; sorted by first octet
+        # this is how we store ASNs; one field per range
         """
         {
-            '192' : {
-                '192.168.1.0/x': {'number': 'AS123', 'org':'Test'},
-                '192.168.1.0/x': {'number': 'AS123', 'org':'Test'},
-            },
-            '10': {
-                '10.0.0.0/x': {'number': 'AS123', 'org':'Test'},
-            }
-            
+            '192.168.1.0/x': '{"number": "AS123", "org": "Test"}',
+            '10.0.0.0/x': '{"number": "AS123", "org": "Test"}',
         }
         """
-        if cached_asn := self.get_asn_cache(first_octet=first_octet):
-            # we already have a cached asn of a range that starts with the same first octet
-            cached_asn: dict = json.loads(cached_asn)
-            cached_asn.update(range_info)
-            self.rcache.hset('cached_asn', first_octet, json.dumps(cached_asn))
-        else:
-            # first time storing a range starting with the same first octet
-            self.rcache.hset('cached_asn', first_octet, json.dumps(range_info))
+        self.rcache.hset('cached_asn_ranges', asn_range, json.dumps(range_info))
 
-    def get_asn_cache(self, first_octet=False):
+    def set_asn_cache_ranges(self, ranges: dict, chunk_size=10000) -> None:
         """
-         cached ASNs are sorted by first octet
-        Returns cached asn of ip if present, or False.
+        Stores many ranges in cached_asn_ranges hash at once
+        :param ranges: dict of {range: {'org': .., 'number': ..}}
         """
-        if first_octet:
-            return self.rcache.hget('cached_asn', first_octet)
+        pipe = self.rcache.pipeline()
+        chunk = {}
+        for asn_range, range_info in ranges.items():
+            chunk[asn_range] = json.dumps(range_info)
+            if len(chunk) == chunk_size:
+                pipe.hmset('cached_asn_ranges', chunk)
+                chunk = {}
+        if chunk:
+            pipe.hmset('cached_asn_ranges', chunk)
+        pipe.execute()
+
+    def get_asn_cache(self, asn_range=False):
+        """
+        Returns the cached asn info of the given range, or all the cached ranges
+        as a dict of {range: serialized info} if no range is given
+        """
+        if asn_range:
+            return self.rcache.hget('cached_asn_ranges', asn_range)
         else:
-            return self.rcache.hgetall('cached_asn')
+            return self.rcache.hgetall('cached_asn_ranges')
 
+    def migrate_asn_cache(self):
+        """
+        Converts the ranges cached by older versions of slips in the cached_asn hash,
+        sorted by first octet, to the per-range cached_asn_ranges hash
+        """
+        legacy_cache: dict = self.rcache.hgetall('cached_asn')
+        if not legacy_cache:
+            return
+
+        ranges = {}
+        for ranges_info in legacy_cache.values():
+            ranges.update(json.loads(ranges_info))
+        self.set_asn_cache_ranges(ranges)
+        self.rcache.delete('cached_asn')
+
+    def get_asn_preload_epoch(self):
+        """
+        Returns the build epoch of the GeoLite ASN db that was
+        last preloaded into cached_asn_ranges, or None
+        """
+        return self.rcache.get('asn_preload_epoch')
+
+    def set_asn_preload_epoch(self, build_epoch):
+        self.rcache.set('asn_preload_epoch', build_epoch)
 
     def store_process_PID(self, process, pid):
         """
@@ -2432,6 +2629,12 @@ class Database(ProfilingFlowsDatabase, object):
         :param whitelist_dict: the dict of IPs, domains or orgs to store
         """
         self.r.hset('whitelist', type, json.dumps(whitelist_dict))
+        # tells the processes that keep a copy of the whitelist to read it again
+        self.r.incr('whitelist_version')
+
+    def get_whitelist_version(self) -> int:
+        """returns a number that changes every time the whitelist is stored"""
+        return int(self.r.get('whitelist_version') or 0)
 
     def get_all_whitelist(self):
         """Return dict of 3 keys: IPs, domains, organizations or mac"""
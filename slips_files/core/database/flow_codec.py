@@ -0,0 +1,87 @@
+"""
+Codecs used to store the flows in the profileid_twid_flows hashes
+and to send them in the new_flow channel.
+
+Decoding doesn't depend on the configured codec, the format of each
+stored flow or msg is detected from its first byte, so dbs and msgs
+written with any of the codecs can always be read.
+"""
+import base64
+import json
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class JSONFlowCodec:
+    """stores flows as json strings, the default"""
+    name = 'json'
+
+    def encode(self, flow: dict) -> str:
+        """encodes a flow to be stored in the flows hash"""
+        return json.dumps(flow)
+
+    def encode_msg(self, msg: dict) -> str:
+        """encodes a msg to be published"""
+        return json.dumps(msg)
+
+
+class MsgpackFlowCodec:
+    """
+    stores flows as msgpack, smaller in redis and faster to decode than json.
+    pubsub connections decode the msgs they receive as utf-8,
+    so published msgs are base64 encoded msgpack
+    """
+    name = 'msgpack'
+
+    def encode(self, flow: dict) -> bytes:
+        """encodes a flow to be stored in the flows hash"""
+        return msgpack.packb(flow, use_bin_type=True)
+
+    def encode_msg(self, msg: dict) -> str:
+        """encodes a msg to be published"""
+        return base64.b64encode(self.encode(msg)).decode()
+
+
+FLOW_CODECS = {
+    JSONFlowCodec.name: JSONFlowCodec,
+    MsgpackFlowCodec.name: MsgpackFlowCodec,
+}
+
+
+def get_flow_codec(name: str):
+    """
+    returns an instance of the codec with the given name,
+    or of the json codec if the name is unknown or msgpack isn't installed
+    """
+    if name == MsgpackFlowCodec.name and msgpack is None:
+        return JSONFlowCodec()
+    return FLOW_CODECS.get(name, JSONFlowCodec)()
+
+
+def decode_flow(data):
+    """
+    decodes a flow read from the flows hash
+    :param data: bytes or str, json flows start with '{',
+    msgpack flows start with a map header
+    returns the flow dict, or None if no data is given
+    """
+    if data is None:
+        return None
+    if isinstance(data, str):
+        return json.loads(data)
+    if data[:1] == b'{':
+        return json.loads(data)
+    return msgpack.unpackb(data, raw=False)
+
+
+def decode_msg(data: str) -> dict:
+    """
+    decodes a msg published using any of the codecs,
+    base64 never contains '{' so json msgs are the ones starting with it
+    """
+    if data[:1] == '{':
+        return json.loads(data)
+    return msgpack.unpackb(base64.b64decode(data), raw=False)
@@ -0,0 +1,59 @@
+import threading
+import time
+
+
+class IPInfoBuffer:
+    """
+    Buffers the info stored about IPs by setInfoForIPs() in 1 process.
+    The info of the same IP stored by the different enrichment steps is merged,
+    and a timer thread writes all the buffered IPs every interval,
+    1 write and at most 1 ip_info_change msg per IP
+    """
+
+    def __init__(self, db, interval: float):
+        self.db = db
+        self.interval = interval
+        self.lock = threading.Lock()
+        # {ip: info to store about it}
+        self.updates = {}
+        self.timer = None
+
+    def __len__(self):
+        return len(self.updates)
+
+    def start(self):
+        """starts the timer thread in the current process if it's not running"""
+        if self.timer is None or not self.timer.is_alive():
+            self.timer = threading.Thread(
+                target=self.run, daemon=True, name='ip_info_buffer'
+            )
+            self.timer.start()
+
+    def add(self, ip: str, to_store: dict):
+        """merges the given info with the info already buffered about this ip"""
+        with self.lock:
+            self.updates.setdefault(ip, {}).update(to_store)
+        self.start()
+
+    def get(self, ip: str) -> dict:
+        """returns the info buffered about this ip that isn't in the db yet"""
+        with self.lock:
+            return dict(self.updates.get(ip, {}))
+
+    def pop_all(self) -> dict:
+        with self.lock:
+            updates, self.updates = self.updates, {}
+        return updates
+
+    def flush(self):
+        """writes all the buffered info to the db"""
+        if updates := self.pop_all():
+            self.db.store_ips_info(updates)
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as e:
+                self.db.print(f'Error writing the info of the IPs: {e}', 0, 1)
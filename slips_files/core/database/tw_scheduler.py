@@ -0,0 +1,121 @@
+import os
+import threading
+import time
+
+
+class TWScheduler:
+    """
+    Throttles the tw_modified msgs and the checks for tws to close of 1 process.
+    - tw_modified is published at most once per profile and tw every interval,
+    a tw modified again before that is published by the timer thread once the interval passes
+    - instead of checking for tws to close after every modification, the timer thread
+    checks every interval, only when the slips internal time advanced since the last check.
+    A tw is closed after not being modified for a whole tw width,
+    so closing it up to 1 interval later doesn't change which tws are closed or when they're reported
+    - when there are many profiler workers, only the one holding the tw_closer key
+    checks for tws to close, so the same tw isn't closed twice
+    The timer thread uses its own redis commands and never the pipeline of the flow
+    being added by the main thread
+    """
+
+    def __init__(self, db, interval: float):
+        self.db = db
+        self.interval = interval
+        self.lock = threading.Lock()
+        # profileid_twid modified since their last tw_modified msg
+        self.pending = set()
+        # {profileid_twid: time of its last tw_modified msg}
+        self.last_published = {}
+        # the slips internal time of the last check for tws to close
+        self.last_checked_time = None
+        # flush() is called by the timer thread and by publish() when stopping
+        self.flush_lock = threading.Lock()
+        self.timer = None
+
+    def start(self):
+        """starts the timer thread in the current process if it's not running"""
+        if self.timer is None or not self.timer.is_alive():
+            self.timer = threading.Thread(
+                target=self.run, daemon=True, name='tw_scheduler'
+            )
+            self.timer.start()
+
+    def modified(self, profileid_twids) -> list:
+        """
+        marks the given tws as modified
+        returns the ones that should be published right away,
+        the rest are published by the timer thread
+        """
+        now = time.time()
+        to_publish = []
+        with self.lock:
+            for profileid_twid in profileid_twids:
+                if now - self.last_published.get(profileid_twid, 0) >= self.interval:
+                    self.last_published[profileid_twid] = now
+                    self.pending.discard(profileid_twid)
+                    to_publish.append(profileid_twid)
+                else:
+                    self.pending.add(profileid_twid)
+        self.start()
+        return to_publish
+
+    def get_due(self, all_pending=False) -> list:
+        """
+        returns the pending tws that weren't published in the last interval,
+        and forgets the tws that weren't modified in the last interval
+        :param all_pending: return all the pending tws no matter when they were published
+        """
+        now = time.time()
+        due = []
+        with self.lock:
+            for profileid_twid, last_published in list(self.last_published.items()):
+                if not all_pending and now - last_published < self.interval:
+                    continue
+                if profileid_twid in self.pending:
+                    self.pending.discard(profileid_twid)
+                    self.last_published[profileid_twid] = now
+                    due.append(profileid_twid)
+                else:
+                    del self.last_published[profileid_twid]
+        return due
+
+    def is_closer(self) -> bool:
+        """
+        checks if this process is the one that checks for tws to close.
+        the first process to set the tw_closer key holds it as long as it renews it,
+        if it stops, another process takes over once the key expires
+        """
+        pid = str(os.getpid())
+        ttl = max(int(self.interval * 3), 1)
+        if self.db.r.set('tw_closer', pid, nx=True, ex=ttl):
+            return True
+        if self.db.r.get('tw_closer') == pid:
+            self.db.r.expire('tw_closer', ttl)
+            return True
+        return False
+
+    def flush(self, all_pending=False):
+        """
+        publishes the due tw_modified msgs and closes the tws that should be closed
+        :param all_pending: publish all the pending msgs, used when the process is stopping
+        """
+        with self.flush_lock:
+            if due := self.get_due(all_pending=all_pending):
+                pipe = self.db.r.pipeline(transaction=False)
+                self.db.publish_tw_modified(due, pipe)
+                pipe.execute()
+
+            if not self.is_closer():
+                return
+            slips_internal_time = self.db.getSlipsInternalTime()
+            if slips_internal_time != self.last_checked_time:
+                self.last_checked_time = slips_internal_time
+                self.db.check_TW_to_close()
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as e:
+                self.db.print(f'Error in the tw scheduler: {e}', 0, 1)
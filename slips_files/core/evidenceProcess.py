@@ -28,6 +28,7 @@ from colorama import Fore, Style
 import sys
 import os
 from .whitelist import Whitelist
+from .accumulated_threat_levels import AccumulatedThreatLevels
 import time
 import platform
 import traceback
@@ -59,6 +60,8 @@ class EvidenceProcess(Module, multiprocessing.Process):
         self.separator = __database__.separator
         self.read_configuration()
         self.detection_threshold_in_this_width = self.detection_threshold * self.width / 60
+        # the threat level of the evidence of each tw that weren't alerted yet
+        self.accumulated_threat_levels = AccumulatedThreatLevels()
         # to keep track of the number of generated evidence
         __database__.init_evidence_number()
         if self.popup_alerts:
@@ -71,9 +74,11 @@ class EvidenceProcess(Module, multiprocessing.Process):
 
         self.c1 = __database__.subscribe('evidence_added')
         self.c2 = __database__.subscribe('new_blame')
+        self.c3 = __database__.subscribe('tw_closed')
         self.channels = {
             'evidence_added': self.c1,
             'new_blame': self.c2,
+            'tw_closed': self.c3,
         }
 
         # clear output/alerts.log
@@ -430,113 +435,22 @@ class EvidenceProcess(Module, multiprocessing.Process):
         self.jsonfile.close()
         __database__.publish('finished_modules', 'Evidence')
 
-    def delete_alerted_evidence(self, profileid, twid, tw_evidence:dict):
+    def is_evidence_done_by_profile(self, evidence: dict) -> bool:
         """
-        if there was an alert in this tw before, remove the evidence that were part of the past alert
-        from the current evidence
+        we should only consider evidence that makes this given profile malicious,
+        aka evidence of this profile attacking others.
         """
-        # format of tw_evidence is {<ev_id>: {evidence_details}}
-        past_alerts = __database__.get_profileid_twid_alerts(profileid, twid)
-        if not past_alerts:
-            return tw_evidence
-
-        for alert_id, evidence_IDs in past_alerts.items():
-            evidence_IDs = json.loads(evidence_IDs)
-            for ID in evidence_IDs:
-                tw_evidence.pop(ID, None)
-        return tw_evidence
-
-    def delete_whitelisted_evidence(self, evidence):
-        """
-        delete the hash of all whitelisted evidence from the given dict of evidence ids
-        """
-        res = {}
-        for evidence_ID, evidence_info in evidence.items():
-            # sometimes the db has evidence that didnt come yet to evidenceprocess
-            # and they are alerted without checking the whitelist!
-            # to fix this, we have processed evidence which are
-            # evidence that came to new_evidence channel and were processed by it
-            # so they are ready to be a part of an alerted
-            if (
-                    not __database__.is_whitelisted_evidence(evidence_ID)
-                    and __database__.is_evidence_processed(evidence_ID)
-            ):
-                res[evidence_ID] = evidence_info
-        return res
+        # the following type detections are the ones
+        # expected to be seen when we are attacking others
+        # marking this profileid (srcip) as malicious
+        return evidence.get('attacker_direction', '') in ('srcip', 'sport', 'srcport')
 
-    def delete_evidence_done_by_others(self, tw_evidence):
+    def get_evidence_causing_alert(self, profileid, twid, IDs: list) -> dict:
         """
-        given all the tw evidence, we should only consider evidence that makes this given
-        profile malicious, aka evidence of this profile attacking others.
+        returns a dict of {evidence ID: serialized evidence} of the given IDs
         """
-        res = {}
-        for evidence_ID, evidence_info in tw_evidence.items():
-            evidence_info = json.loads(evidence_info)
-            attacker_direction = evidence_info.get('attacker_direction', '')
-            # the following type detections are the ones
-            # expected to be seen when we are attacking others
-            # marking this profileid (srcip) as malicious
-            if attacker_direction in ('srcip', 'sport', 'srcport'):
-                res[evidence_ID] = json.dumps(evidence_info)
-
-        return res
-
-
-    def get_evidence_for_tw(self, profileid, twid):
-        # Get all the evidence for this profile in this TW
-        tw_evidence = __database__.getEvidenceForTW(
-            profileid, twid
-        )
-        if not tw_evidence:
-            return False
-
-        tw_evidence: dict = json.loads(tw_evidence)
-        tw_evidence = self.delete_alerted_evidence(profileid, twid, tw_evidence)
-        tw_evidence = self.delete_evidence_done_by_others(tw_evidence)
-        tw_evidence = self.delete_whitelisted_evidence(tw_evidence)
-        return tw_evidence
-
-
-    def get_accumulated_threat_level(self, tw_evidence):
-        accumulated_threat_level = 0.0
-        # to store all the ids causing this alerts in the database
-        self.IDs_causing_an_alert = []
-        for evidence in tw_evidence.values():
-            evidence = json.loads(evidence)
-            # attacker_direction = evidence.get('attacker_direction')
-            # attacker = evidence.get('attacker')
-            evidence_type = evidence.get('evidence_type')
-            confidence = float(evidence.get('confidence'))
-            threat_level = evidence.get('threat_level')
-            description = evidence.get('description')
-            ID = evidence.get('ID')
-            self.IDs_causing_an_alert.append(ID)
-            # each threat level is a string, get the numerical value of it
-            try:
-                threat_level = utils.threat_levels[
-                    threat_level.lower()
-                ]
-            except KeyError:
-                self.print(
-                    f'Error: Evidence of type {evidence_type} has '
-                    f'an invalid threat level {threat_level}', 0, 1
-                )
-                self.print(f'Description: {description}', 0, 1)
-                threat_level = 0
-
-            # Compute the moving average of evidence
-            new_threat_level = threat_level * confidence
-            self.print(
-                f'\t\tWeighted Threat Level: {new_threat_level}', 3, 0
-            )
-            accumulated_threat_level += new_threat_level
-            self.print(
-                f'\t\tAccumulated Threat Level: {accumulated_threat_level}', 3, 0,
-            )
-        return accumulated_threat_level
-
-    def get_last_evidence_ID(self, tw_evidence):
-        return list(tw_evidence.keys())[-1]
+        tw_evidence: dict = __database__.getEvidenceForTW(profileid, twid)
+        return {ID: tw_evidence[ID] for ID in IDs if ID in tw_evidence}
 
     def send_to_exporting_module(self, tw_evidence):
         for evidence in tw_evidence.values():
@@ -619,6 +533,7 @@ class EvidenceProcess(Module, multiprocessing.Process):
                 __database__.deleteEvidence(
                     profileid, twid, evidence_ID
                 )
+                self.accumulated_threat_levels.remove(profileid, twid, evidence_ID)
                 return
 
             # Format the time to a common style given multiple type of time variables
@@ -656,16 +571,33 @@ class EvidenceProcess(Module, multiprocessing.Process):
             __database__.set_evidence_for_profileid(IDEA_dict)
             __database__.publish('report_to_peers', json.dumps(data))
 
-            if tw_evidence := self.get_evidence_for_tw(profileid, twid):
-                # self.print(f'Evidence: {tw_evidence}. Profileid {profileid}, twid {twid}')
+            # The accumulated threat level is for all the types of evidence for this profile
+            # that weren't part of an alert yet
+            if self.is_evidence_done_by_profile(data):
+                if not utils.is_valid_threat_level(str(threat_level).lower()):
+                    self.print(
+                        f'Error: Evidence of type {evidence_type} has '
+                        f'an invalid threat level {threat_level}', 0, 1
+                    )
+                    self.print(f'Description: {description}', 0, 1)
+                weighted_threat_level = utils.get_weighted_threat_level(data)
+                self.print(
+                    f'\t\tWeighted Threat Level: {weighted_threat_level}', 3, 0
+                )
+                self.accumulated_threat_levels.add(
+                    profileid, twid, evidence_ID, weighted_threat_level
+                )
+
+            if IDs := self.accumulated_threat_levels.get_evidence_IDs(profileid, twid):
                 # Important! It may happen that the evidence is not related to a profileid and twid.
                 # For example when the evidence is on some src IP attacking our home net, and we are not creating
                 # profiles for attackers
+                accumulated_threat_level = self.accumulated_threat_levels.get(profileid, twid)
+                self.print(
+                    f'\t\tAccumulated Threat Level: {accumulated_threat_level}', 3, 0,
+                )
 
-                # The accumulated threat level is for all the types of evidence for this profile
-                accumulated_threat_level = self.get_accumulated_threat_level(tw_evidence)
-
-                ID = self.get_last_evidence_ID(tw_evidence)
+                ID = IDs[-1]
 
                 # if the profile was already blocked in this twid, we shouldn't alert
                 profile_already_blocked = __database__.checkBlockedProfTW(profileid, twid)
@@ -678,6 +610,9 @@ class EvidenceProcess(Module, multiprocessing.Process):
                     accumulated_threat_level >= self.detection_threshold_in_this_width
                     and not profile_already_blocked
                 ):
+                    # the evidence of this alert shouldn't be part of the next alerts
+                    self.accumulated_threat_levels.reset(profileid, twid)
+                    tw_evidence = self.get_evidence_causing_alert(profileid, twid, IDs)
                     # store the alert in our database
                     # the alert ID is profileid_twid + the ID of the last evidence causing this alert
                     alert_ID = f'{profileid}_{twid}_{ID}'
@@ -685,7 +620,7 @@ class EvidenceProcess(Module, multiprocessing.Process):
                         profileid,
                         twid,
                         alert_ID,
-                        self.IDs_causing_an_alert
+                        IDs
                     )
                     to_send = {
                         'alert_ID': alert_ID,
@@ -733,6 +668,13 @@ class EvidenceProcess(Module, multiprocessing.Process):
                         blocked=blocked
                     )
 
+        if msg := self.get_msg('tw_closed'):
+            # the closed tw may still get evidence, but the older tws of this profile
+            # were closed at least 1 tw width ago, stop keeping the threat level
+            # of their evidence that weren't alerted
+            profileid, twid = msg['data'].rsplit(self.separator, 1)
+            self.accumulated_threat_levels.evict_tws_before(profileid, twid)
+
         if msg := self.get_msg('new_blame'):
             self.msg_received = True
             data = msg['data']
@@ -32,6 +32,7 @@ import json
 import traceback
 import threading
 import subprocess
+import heapq
 
 # Input Process
 class InputProcess(multiprocessing.Process):
@@ -93,12 +94,17 @@ class InputProcess(multiprocessing.Process):
         self.open_file_handlers = {}
         self.c1 = __database__.subscribe('remove_old_files')
         self.timeout = None
+        # how often to get the new list of zeek files from the db, in seconds
+        self.zeek_files_refresh_period = 1
         # zeek rotated files to be deleted after a period of time
         self.to_be_deleted = []
         self.zeek_thread = threading.Thread(
             target=self.run_zeek,
             daemon=True
         )
+        # lines that are waiting to be sent to the profiler in 1 batch
+        self.batch = []
+        self.last_flush_time = time.time()
 
     def read_configuration(self):
         conf = ConfigParser()
@@ -109,6 +115,8 @@ class InputProcess(multiprocessing.Process):
         self.enable_rotation = conf.rotation()
         self.rotation_period = conf.rotation_period()
         self.keep_rotated_files_for = conf.keep_rotated_files_for()
+        self.flows_batch_size = conf.flows_batch_size()
+        self.flows_batch_timeout = conf.flows_batch_timeout()
 
     def print(self, text, verbose=1, debug=0):
         """
@@ -130,8 +138,46 @@ class InputProcess(multiprocessing.Process):
         levels = f'{verbose}{debug}'
         self.outputqueue.put(f'{levels}|{self.name}|{text}')
 
+    def is_batch_timed_out(self) -> bool:
+        """
+        Checks if flows_batch_timeout ms passed since the last batch was sent to the profiler
+        """
+        elapsed_ms = (time.time() - self.last_flush_time) * 1000
+        return elapsed_ms >= self.flows_batch_timeout
+
+    def flush_batch(self):
+        """
+        Sends all the lines waiting in the batch to the profiler as 1 list.
+        The profiler queue is bounded, so put() blocks when the profiler can't keep up
+        and this slows down reading the input
+        """
+        self.last_flush_time = time.time()
+        if not self.batch:
+            return
+        self.profilerqueue.put(self.batch)
+        self.batch = []
+
+    def send_line(self, line: dict):
+        """
+        Sends the given line to the profiler in batches of flows_batch_size lines,
+        or the lines read in the last flows_batch_timeout ms, whichever comes first
+        """
+        if self.flows_batch_size == 1:
+            # batching is disabled
+            self.profilerqueue.put(line)
+            return
+
+        self.batch.append(line)
+        if (
+            len(self.batch) >= self.flows_batch_size
+            or self.is_batch_timed_out()
+        ):
+            self.flush_batch()
+
     def stop_queues(self):
         """Stops the profiler and output queues"""
+        # send the lines that are still waiting in the batch before stopping
+        self.flush_batch()
         self.profilerqueue.put('stop')
         now = utils.convert_format(datetime.now(), utils.alerts_format)
         self.outputqueue.put(
@@ -167,8 +213,9 @@ class InputProcess(multiprocessing.Process):
                         'type': 'nfdump',
                         'data': nfdump_line
                     }
-                    self.profilerqueue.put(line)
+                    self.send_line(line)
                     if self.testing: break
+                self.flush_batch()
 
             return total_flows
         except KeyboardInterrupt:
@@ -257,6 +304,43 @@ class InputProcess(multiprocessing.Process):
 
         return timestamp, nline
 
+    def get_file_priority(self, filename: str) -> int:
+        """
+        Flows that have the same ts are sent in the following order
+        dns.log  (make it a priority to avoid FP connection without dns resolution alerts)
+        conn.log
+        any other flow
+        :param filename: full path to a zeek log file
+        """
+        filename = os.path.basename(filename)
+        if filename.startswith('dns'):
+            return 0
+        if filename.startswith('conn'):
+            return 1
+        return 2
+
+    def cache_line(self, filename: str, timestamp: float, nline):
+        """
+        Stores the given line in the cache and pushes it to the heap of
+        earliest lines so it's sent to the profiler in order
+        """
+        self.cache_lines[filename] = {
+            'type': filename,
+            'data': nline
+        }
+        # the counter keeps lines with the same ts and
+        # priority in the order they were read
+        self.lines_cached += 1
+        heapq.heappush(
+            self.earliest_lines,
+            (
+                timestamp,
+                self.get_file_priority(filename),
+                self.lines_cached,
+                filename
+            )
+        )
+
     def cache_nxt_line_in_file(self, filename):
         file_handler = self.get_file_handler(filename)
         if not file_handler:
@@ -269,31 +353,33 @@ class InputProcess(multiprocessing.Process):
             return False
 
         # We don't have any waiting line for this file, so proceed
-        try:
-            zeek_line = file_handler.readline()
-        except ValueError:
-            # remover thread just finished closing all old handles.
-            # comes here if I/O operation failed due to a closed file.
-            # to get the new dict of open handles.
-            return False
+        # keep reading until we find a valid line, files with no cached lines
+        # aren't read again until the next refresh
+        while True:
+            try:
+                zeek_line = file_handler.readline()
+            except ValueError:
+                # remover thread just finished closing all old handles.
+                # comes here if I/O operation failed due to a closed file.
+                # to get the new dict of open handles.
+                return False
 
-        # Did the file end?
-        if not zeek_line or zeek_line.startswith('#'):
-            # We reached the end of one of the files that we were reading.
-            # Wait for more data to come from another file
-            return False
+            # Did the file end?
+            if not zeek_line:
+                # We reached the end of one of the files that we were reading.
+                # Wait for more data to come from another file
+                return False
 
-        timestamp, nline = self.get_ts_from_line(zeek_line)
-        if not timestamp:
-            return False
+            if zeek_line.startswith('#'):
+                # skip the comments of zeek tab files
+                continue
 
+            timestamp, nline = self.get_ts_from_line(zeek_line)
+            if timestamp:
+                break
 
-        self.file_time[filename] = timestamp
         # Store the line in the cache
-        self.cache_lines[filename] = {
-            'type': filename,
-            'data': nline
-        }
+        self.cache_line(filename, timestamp, nline)
         return True
 
     def should_stop_zeek(self):
@@ -315,84 +401,110 @@ class InputProcess(multiprocessing.Process):
         for file, handle in self.open_file_handlers.items():
             self.print(f'Closing file {file}', 2, 0)
             handle.close()
+
+    def refresh_zeek_files(self):
+        """
+        Gets the new list of zeek files from the db, since new files may have
+        been created by Zeek while we were processing them.
+        All the files that don't have a cached line are read again,
+        including the ones we reached the end of
+        """
+        self.zeek_files = set()
+        for filename in __database__.get_all_zeek_file():
+            # filename is the log file name with .log extension in case of interface or pcap
+            # and without the ext in case of zeek files
+            if not filename.endswith('.log'):
+                filename += '.log'
+
+            if self.is_ignored_file(filename):
+                continue
+            self.zeek_files.add(filename)
+
+        self.retry_exhausted_files()
+        self.last_zeek_files_refresh = time.time()
+
+    def retry_exhausted_files(self):
+        """
+        Marks all the files that don't have a cached line to be read from again
+        """
+        self.files_to_read.update(
+            filename
+            for filename in self.zeek_files
+            if filename not in self.cache_lines
+        )
+
     def get_earliest_line(self):
         """
-        loops through all the caches lines and returns the line with the earliest ts
+        returns the cached line with the earliest ts without removing it from the cache
         """
-        # Now read lines in order. The line with the earliest timestamp first
-        files_sorted_by_ts = sorted(self.file_time, key=self.file_time.get)
         try:
-            # get the file that has the earliest flow
-            file_with_earliest_flow = files_sorted_by_ts[0]
+            # the root of the heap is always the earliest line
+            file_with_earliest_flow = self.earliest_lines[0][-1]
         except IndexError:
-            # No more sorted keys. Just loop waiting for more lines
+            # No more cached lines. Just loop waiting for more lines
             # It may happen that we check all the files in the folder,
             # and there is still no files for us.
-            # To cover this case, just refresh the list of files
-            self.zeek_files = __database__.get_all_zeek_file()
-            # time.sleep(1)
             return False, False
 
-        # to fix the problem of evidence being generated BEFORE their corresponding flows are added to our db
-        # make sure we read flows in the following order:
-        # dns.log  (make it a priority to avoid FP connection without dns resolution alerts)
-        # conn.log
-        # any other flow
-        # for key in cache_lines:
-        #     if 'dns' in key:
-        #         file_with_earliest_flow = key
-        #         break
-        # comes here if we're done with all conn.log flows and it's time to process other files
         earliest_line = self.cache_lines[file_with_earliest_flow]
         return earliest_line, file_with_earliest_flow
 
     def read_zeek_files(self) -> int:
         try:
-            # Get the zeek files in the folder now
-            self.zeek_files = __database__.get_all_zeek_file()
             self.open_file_handlers = {}
-            self.file_time = {}
             self.cache_lines = {}
+            # min heap of (ts, file priority, counter, filename),
+            # 1 entry for each line in self.cache_lines
+            self.earliest_lines = []
+            self.lines_cached = 0
+            # files that don't have a cached line and should be read from in the next iteration
+            self.files_to_read = set()
+            # Get the zeek files in the folder now
+            self.refresh_zeek_files()
             # Try to keep track of when was the last update so we stop this reading
             self.last_updated_file_time = datetime.now()
 
             lines = 0
             while True:
                 self.check_if_time_to_del_rotated_files()
-                # Go to all the files generated by Zeek and read 1
-                # line from each of them
-                for filename in self.zeek_files:
-                    # filename is the log file name with .log extension in case of interface or pcap
-                    # and without the ext in case of zeek files
-                    if not filename.endswith('.log'):
-                        filename += '.log'
-
-                    if self.is_ignored_file(filename):
-                        continue
 
-                    # reads 1 line from the given file and cache it
-                    # from in self.cache_lines
+                now = time.time()
+                if now - self.last_zeek_files_refresh >= self.zeek_files_refresh_period:
+                    self.refresh_zeek_files()
+                elif not self.earliest_lines:
+                    # nothing to send, try reading again
+                    # from the files we reached the end of
+                    self.retry_exhausted_files()
+
+                # reads 1 line from each file that doesn't have a cached line
+                # and cache it in self.cache_lines
+                for filename in self.files_to_read:
                     self.cache_nxt_line_in_file(filename)
+                # the files we couldn't read from will be retried in the next refresh
+                self.files_to_read = set()
 
                 if self.should_stop_zeek():
                     break
 
                 earliest_line, file_with_earliest_flow = self.get_earliest_line()
                 if not file_with_earliest_flow:
+                    # we're waiting for new lines, don't keep
+                    # the lines we already have waiting in the batch
+                    if self.is_batch_timed_out():
+                        self.flush_batch()
                     continue
 
                 self.print('	> Sent Line: {}'.format(earliest_line), 0, 3)
-                self.profilerqueue.put(earliest_line)
+                self.send_line(earliest_line)
                 lines += 1
                 # when testing, no need to read the whole file!
                 if lines == 10 and self.testing:
                     break
-                # Delete this line from the cache and the time list
+                # Delete this line from the cache and the heap
+                heapq.heappop(self.earliest_lines)
                 del self.cache_lines[file_with_earliest_flow]
-                del self.file_time[file_with_earliest_flow]
-                # Get the new list of files. Since new files may have been created by
-                # Zeek while we were processing them.
-                self.zeek_files = __database__.get_all_zeek_file()
+                # read the next line of the file we just sent a line from
+                self.files_to_read.add(file_with_earliest_flow)
 
             self.close_all_handles()
 
@@ -505,6 +617,8 @@ class InputProcess(multiprocessing.Process):
                 'data' : line
             }
             self.print(f'	> Sent Line: {line_info}', 0, 3)
+            # stdin lines aren't batched, reading blocks until the next line
+            # arrives so a partial batch may never be sent
             self.profilerqueue.put(line_info)
             self.lines += 1
             self.print('Done reading 1 flow.\n ', 0, 3)
@@ -527,7 +641,7 @@ class InputProcess(multiprocessing.Process):
                     'type': type_,
                     'data': t_line
                 }
-                self.profilerqueue.put(line)
+                self.send_line(line)
                 self.lines += 1
 
                 # go through the rest of the file
@@ -538,7 +652,7 @@ class InputProcess(multiprocessing.Process):
                     }
                     # argus files are either tab separated orr comma separated
                     if len(t_line.strip()) != 0:
-                        self.profilerqueue.put(line)
+                        self.send_line(line)
                     self.lines += 1
                     if self.testing: break
             self.stop_queues()
@@ -559,7 +673,7 @@ class InputProcess(multiprocessing.Process):
                     }
                     self.print(f'	> Sent Line: {line}', 0, 3)
                     if len(t_line.strip()) != 0:
-                        self.profilerqueue.put(line)
+                        self.send_line(line)
                     self.lines += 1
                     if self.testing:
                         break
@@ -876,6 +990,7 @@ class InputProcess(multiprocessing.Process):
                     'data': flow
                 }
                 self.print(f'	> Sent Line: {line_info}', 0, 3)
+                # CYST flows are few and far between, don't batch them
                 self.profilerqueue.put(line_info)
                 self.lines += 1
                 self.print('Done reading 1 CYST flow.\n ', 0, 3)
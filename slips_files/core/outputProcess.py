@@ -303,10 +303,11 @@ class OutputProcess(multiprocessing.Process):
             file=sys.stdout
         )
 
-    def update_progress_bar(self):
+    def update_progress_bar(self, line: str):
         """
         wrapper for tqdm.update()
-        adds 1 to the number of flows processed
+        adds the number of flows processed given in the line to the progress bar
+        :param line: 'update progress bar <number of flows>'
         """
         if not hasattr(self, 'progress_bar'):
             # this module wont have the progress_bar set if it's running on pcap or interface
@@ -316,8 +317,10 @@ class OutputProcess(multiprocessing.Process):
         if self.slips_mode == 'daemonized':
             return
 
-        self.progress_bar.update(1)
-        if self.progress_bar.n == self.total_flows:
+        flows = line.split()[-1]
+        flows = int(flows) if flows.isdigit() else 1
+        self.progress_bar.update(flows)
+        if self.progress_bar.n >= self.total_flows:
             self.remove_stats_from_progress_bar()
             print(f"Done reading all flows. Slips is now processing them.")
             # remove it from the bar because we'll be prining it in a new line
@@ -382,7 +385,7 @@ class OutputProcess(multiprocessing.Process):
                 elif 'initialize progress bar' in line:
                     self.init_progress_bar()
                 elif 'update progress bar' in line:
-                    self.update_progress_bar()
+                    self.update_progress_bar(line)
 
                 elif 'stop_process' in line or line == 'stop':
                     self.shutdown_gracefully()
@@ -37,6 +37,7 @@ import ipaddress
 import traceback
 import os
 import binascii
+import zlib
 import base64
 from re import split
 
@@ -45,7 +46,7 @@ class ProfilerProcess(Module, multiprocessing.Process):
     """A class to create the profiles for IPs and the rest of data"""
 
     def __init__(
-        self, inputqueue, outputqueue, verbose, debug, redis_port
+        self, inputqueue, outputqueue, verbose, debug, redis_port, workers_queues=None
     ):
         self.name = 'Profiler'
         multiprocessing.Process.__init__(self)
@@ -56,6 +57,13 @@ class ProfilerProcess(Module, multiprocessing.Process):
         self.input_type = False
         self.whitelisted_flows_ctr = 0
         self.rec_lines = 0
+        # flows processed since the last progress bar update
+        self.processed_flows = 0
+        # when sharding is enabled, the profiler only parses the flows and
+        # sends them to the workers using these queues
+        self.workers_queues = workers_queues or []
+        # flows waiting to be sent to each worker
+        self.workers_batches = [[] for _ in self.workers_queues]
         self.whitelist = Whitelist(outputqueue, redis_port)
         # Read the configuration
         self.read_configuration()
@@ -1228,6 +1236,8 @@ class ProfilerProcess(Module, multiprocessing.Process):
             self.convert_starttime_to_epoch()
             # For this 'forward' profile, find the id in the database of the tw where the flow belongs.
             self.twid = __database__.get_timewindow(self.flow.starttime, self.profileid)
+            # send all the writes of this flow to redis in 1 round-trip
+            __database__.start_pipeline()
 
             if self.home_net:
                 # Home network is defined in slips.conf. Create profiles for home IPs only
@@ -1260,6 +1270,8 @@ class ProfilerProcess(Module, multiprocessing.Process):
             ,0,1)
             self.print(traceback.print_exc(),0,1)
             return False
+        finally:
+            __database__.execute_pipeline()
 
     def handle_conn(self):
         role = 'Client'
@@ -1752,27 +1764,62 @@ class ProfilerProcess(Module, multiprocessing.Process):
 
     def shutdown_gracefully(self):
         self.print(f"Stopping profiler process. Number of whitelisted conn flows: {self.whitelisted_flows_ctr}", 2, 0)
+        # tell the workers to stop after they're done with the flows in their queues
+        self.send_flows_to_workers()
+        for queue in self.workers_queues:
+            queue.put('stop')
         # can't use self.name because multiprocessing library adds the child number to the name so it's not const
         __database__.publish('finished_modules', 'Profiler')
 
     def pre_main(self):
         utils.drop_root_privs()
 
-    def main(self):
-        line = self.inputqueue.get()
-        if 'stop' in line:
-            self.print(f"Stopping profiler process. Number of whitelisted conn flows: "
-                       f"{self.whitelisted_flows_ctr}", 2, 0)
+    def update_progress_bar(self):
+        """
+        Tells the output process how many flows were processed since the last update,
+        1 msg per batch of lines instead of 1 msg per line
+        """
+        if not self.processed_flows:
+            return
+        self.outputqueue.put(f'update progress bar {self.processed_flows}')
+        self.processed_flows = 0
 
-            self.shutdown_gracefully()
-            self.print(
-                f'Stopping Profiler Process. Received {self.rec_lines} lines '
-                f'({utils.convert_format(datetime.now(), utils.alerts_format)})',
-                2,
-                0,
-            )
-            return 1
+    def get_worker(self) -> int:
+        """
+        returns the index of the worker that should handle the current flow.
+        the flows of the same profile always go to the same worker so the
+        timewindows and tuples of a profile are handled by 1 process only
+        """
+        ip = self.flow.daddr if self.analysis_direction == 'all' else self.flow.saddr
+        # crc32 instead of hash() because hash() of str is salted per process
+        return zlib.crc32(str(ip).encode()) % len(self.workers_queues)
+
+    def handle_flow(self):
+        """
+        adds the parsed flow to the profile, or sends it to its worker if sharding is enabled
+        """
+        if not self.workers_queues:
+            self.add_flow_to_profile()
+            return
+
+        if not hasattr(self, 'flow'):
+            return
+        self.workers_batches[self.get_worker()].append(self.flow)
+
+    def send_flows_to_workers(self):
+        """
+        sends the flows parsed from the last batch of lines to their workers
+        """
+        for queue, batch in zip(self.workers_queues, self.workers_batches):
+            if batch:
+                queue.put(batch.copy())
+                batch.clear()
 
+    def process_line(self, line: dict):
+        """
+        Processes 1 line received from the input process
+        and adds it to the profile
+        """
         # Received new input data
         # Extract the columns smartly
         self.print(f'< Received Line: {line}', 2, 0)
@@ -1793,9 +1840,9 @@ class ProfilerProcess(Module, multiprocessing.Process):
             # self.print('Zeek line')
             if self.process_zeek_input(line):
                 # Add the flow to the profile
-                self.add_flow_to_profile()
+                self.handle_flow()
 
-            self.outputqueue.put("update progress bar")
+            self.processed_flows += 1
 
         elif self.input_type in ['argus', 'argus-tabs']:
             # self.print('Argus line')
@@ -1815,32 +1862,53 @@ class ProfilerProcess(Module, multiprocessing.Process):
                 _ = self.column_idx['starttime']
                 if self.process_argus_input(line):
                     # Add the flow to the profile
-                    self.add_flow_to_profile()
-                self.outputqueue.put("update progress bar")
+                    self.handle_flow()
+                self.processed_flows += 1
             except (AttributeError, KeyError):
                 # Define columns. Do not add this line to profile, its only headers
                 self.define_columns(line)
         elif self.input_type == 'suricata':
             if self.process_suricata_input(line):
                 # Add the flow to the profile
-                self.add_flow_to_profile()
+                self.handle_flow()
             # update progress bar anyway because 1 flow was processed even
             # if slips didn't use it
-            self.outputqueue.put("update progress bar")
+            self.processed_flows += 1
         elif self.input_type == 'zeek-tabs':
             # self.print('Zeek-tabs line')
             if self.process_zeek_tabs_input(line):
                 # Add the flow to the profile
-                self.add_flow_to_profile()
-            self.outputqueue.put("update progress bar")
+                self.handle_flow()
+            self.processed_flows += 1
         elif self.input_type == 'nfdump':
             if self.process_nfdump_input(line):
-                self.add_flow_to_profile()
-            self.outputqueue.put("update progress bar")
+                self.handle_flow()
+            self.processed_flows += 1
         else:
             self.print("Can't recognize input file type.")
             return False
 
+    def main(self):
+        msg = self.inputqueue.get()
+        if isinstance(msg, str) and 'stop' in msg:
+            self.print(f"Stopping profiler process. Number of whitelisted conn flows: "
+                       f"{self.whitelisted_flows_ctr}", 2, 0)
+
+            self.shutdown_gracefully()
+            self.print(
+                f'Stopping Profiler Process. Received {self.rec_lines} lines '
+                f'({utils.convert_format(datetime.now(), utils.alerts_format)})',
+                2,
+                0,
+            )
+            return 1
+
+        # the input process sends either 1 line, or a batch of lines as a list
+        lines = msg if isinstance(msg, list) else [msg]
+        for line in lines:
+            self.process_line(line)
+        self.send_flows_to_workers()
+        self.update_progress_bar()
 
         # listen on this channel in case whitelist.conf is changed, we need to process the new changes
         if msg := self.get_msg('reload_whitelist'):
@@ -1848,3 +1916,34 @@ class ProfilerProcess(Module, multiprocessing.Process):
             # a msg will be sent to this channel on every keypress, because pycharm saves file automatically
             # otherwise this channel will get a msg only when whitelist.conf is modified and saved to disk
             self.whitelist.read_whitelist()
+
+
+class ProfilerWorker(ProfilerProcess):
+    """
+    Stores the flows parsed by the ProfilerProcess in the db.
+    Used when profiler_workers in slips.conf is more than 1, each worker
+    receives the flows of the profiles that hash to it
+    """
+
+    def __init__(
+        self, inputqueue, outputqueue, verbose, debug, redis_port, worker_id
+    ):
+        super().__init__(inputqueue, outputqueue, verbose, debug, redis_port)
+        self.name = f'Profiler Worker {worker_id}'
+
+    def shutdown_gracefully(self):
+        self.print(f"Stopping profiler worker. Number of whitelisted conn flows: {self.whitelisted_flows_ctr}", 2, 0)
+        __database__.publish('finished_modules', self.name)
+
+    def main(self):
+        msg = self.inputqueue.get()
+        if isinstance(msg, str) and 'stop' in msg:
+            self.shutdown_gracefully()
+            return 1
+
+        for flow in msg:
+            self.flow = flow
+            self.add_flow_to_profile()
+
+        if msg := self.get_msg('reload_whitelist'):
+            self.whitelist.read_whitelist()
@@ -4,17 +4,172 @@ from slips_files.common.config_parser import ConfigParser
 import ipaddress
 import validators
 from slips_files.common.slips_utils import utils
+from slips_files.common.ip_prefix_trie import IPPrefixTrie
+from slips_files.common.domain_suffix_trie import DomainSuffixTrie
+from slips_files.common.ioc_snapshot import IoCSnapshotReader
 import tld
 import os
+import time
+
+
+class CompiledWhitelist:
+    """
+    In-memory copy of the whitelist and the info of the whitelisted and the
+    supported orgs, indexed so that checking a flow or an alert doesn't query
+    the db for any of them.
+    Whitelist.read_whitelist() discards it, so it's rebuilt with the new
+    content of whitelist.conf after every reload_whitelist msg. The processes
+    that don't read whitelist.conf rebuild it when the version of the
+    whitelist in the db changes
+    """
+
+    def __init__(self):
+        # version of the whitelist in the db when this was loaded
+        self.version = 0
+        # {ip: {'from': .., 'what_to_ignore': ..}}
+        self.ips = {}
+        # {mac: {'from': .., 'what_to_ignore': ..}}
+        self.macs = {}
+        # values are {'from': .., 'what_to_ignore': ..}
+        self.domains = DomainSuffixTrie()
+        # {org: {'from': .., 'what_to_ignore': ..}}
+        self.orgs = {}
+        # {org: IPPrefixTrie of the org's subnets}
+        self.org_subnets = {}
+        # {org: [(org domain, TLD of the org domain)]}
+        self.org_domains = {}
+        # {org: set of the org's asns}
+        self.org_asns = {}
+
+    def load(self):
+        """Reads the whitelist and the info of the whitelisted and supported orgs from the db"""
+        # read before the whitelist so a change while loading it is noticed later
+        self.version = __database__.get_whitelist_version()
+        self.ips = __database__.get_whitelist('IPs')
+        self.macs = __database__.get_whitelist('mac')
+        for domain, info in __database__.get_whitelist('domains').items():
+            self.domains.insert(domain, info)
+
+        self.orgs = __database__.get_whitelist('organizations')
+        # flowalerts checks the supported orgs even if they're not whitelisted
+        for org in {*self.orgs, *utils.supported_orgs}:
+            subnets = IPPrefixTrie()
+            # org subnets are sorted by first octet in the db
+            for ranges in __database__.get_org_IPs(org).values():
+                for range in ranges:
+                    try:
+                        subnets.insert(range)
+                    except ValueError:
+                        continue
+            self.org_subnets[org] = subnets
+
+            try:
+                org_domains = json.loads(__database__.get_org_info(org, 'domains'))
+            except (TypeError, json.decoder.JSONDecodeError):
+                org_domains = []
+            self.org_domains[org] = [
+                (org_domain, self.get_tld(org_domain)) for org_domain in org_domains
+            ]
+
+            try:
+                org_asns = json.loads(__database__.get_org_info(org, 'asn'))
+            except (TypeError, json.decoder.JSONDecodeError):
+                org_asns = []
+            self.org_asns[org] = set(org_asns)
+
+    @staticmethod
+    def get_tld(domain: str) -> str:
+        try:
+            return tld.get_tld(domain)
+        except (tld.exceptions.TldBadUrl, tld.exceptions.TldDomainNotFound):
+            return domain.split('.')[-1]
+
+    def is_whitelisted_domain(
+            self, domain_to_check, ignore_type, src_domains_of_flow=(), dst_domains_of_flow=()
+    ) -> bool:
+        """
+        Checks if the given domain, or the domains of the IPs of its flow
+        are the same or subdomains of a whitelisted domain
+        :param ignore_type: alerts or flows or both
+        :param src_domains_of_flow: domains of the src IP of the flow
+        :param dst_domains_of_flow: domains of the dst IP of the flow
+        """
+        if not self.domains:
+            return False
+
+        for _, info in self.domains.matches(domain_to_check):
+            if (
+                ignore_type in info['what_to_ignore']
+                or 'both' in info['what_to_ignore']
+            ):
+                return True
+
+        for direction, domains_of_flow in (
+                ('src', src_domains_of_flow),
+                ('dst', dst_domains_of_flow),
+        ):
+            for domain in domains_of_flow:
+                for _, info in self.domains.matches(domain):
+                    if (
+                        (direction in info['from'] or 'both' in info['from'])
+                        and (
+                            ignore_type in info['what_to_ignore']
+                            or 'both' in info['what_to_ignore']
+                        )
+                    ):
+                        return True
+        return False
+
+    def is_ip_in_org(self, ip: str, org) -> bool:
+        """Check if the given ip belongs to one of the subnets of the given org"""
+        if subnets := self.org_subnets.get(org):
+            return bool(subnets.longest_match(ip))
+        return False
+
+    def is_asn_in_org(self, asn: dict, org) -> bool:
+        """
+        Checks if the given asn info of an IP belongs to the given org
+        :param asn: the 'asn' key of the IP's info in IPsInfo, {'org':.., 'number':..}
+        """
+        asn_org = asn.get('org', '')
+        if asn_org and asn_org != 'Unknown' and org.lower() in asn_org.lower():
+            return True
+        return asn.get('number', '').upper() in self.org_asns.get(org, ())
+
+    def is_domain_in_org(self, domain, org) -> bool:
+        """Checks if the given domain belongs to the given org"""
+        if org in domain:
+            return True
+
+        org_domains = self.org_domains.get(org)
+        if not org_domains:
+            return False
+
+        flow_TLD = self.get_tld(domain)
+        for org_domain, org_domain_TLD in org_domains:
+            # make sure the 2 domains have the same same top level domain
+            if flow_TLD != org_domain_TLD:
+                continue
+            # match subdomains of the org domain and the other way around
+            if org_domain in domain or domain in org_domain:
+                return True
+        return False
 
 
 class Whitelist:
+    # seconds between the checks for a new version of the whitelist
+    # in the processes that don't receive reload_whitelist msgs
+    version_check_interval = 5
+
     def __init__(self, outputqueue, redis_port):
         self.name = 'whitelist'
         self.outputqueue = outputqueue
         self.read_configuration()
         self.org_info_path = 'slips_files/organizations_info/'
         self.ignored_flow_types = ('arp')
+        # built on the first flow we check and discarded when the whitelist is re-read
+        self.compiled_whitelist = None
+        self.last_version_check = 0
         __database__.start(redis_port)
 
 
@@ -41,24 +196,14 @@ class Whitelist:
     def read_configuration(self):
         conf = ConfigParser()
         self.whitelist_path = conf.whitelist_path()
+        # the tranco whitelist is looked up in the snapshot of the IoCs if enabled
+        self.ioc_snapshot_reader = IoCSnapshotReader() if conf.ioc_snapshot() else None
 
-    def is_whitelisted_asn(self, ip, org):
-        ip_data = __database__.getIPData(ip)
-        try:
-            ip_asn = ip_data['asn']['asnorg']
-            org_asn = json.loads(__database__.get_org_info(org, 'asn'))
-            if (
-                ip_asn
-                and ip_asn != 'Unknown'
-                and (org.lower() in ip_asn.lower() or ip_asn in org_asn)
-            ):
-                # this ip belongs to a whitelisted org, ignore flow
-                # self.print(f"The ASN {ip_asn} of IP {ip} "
-                #            f"is in the values of org {org}. Whitelisted.")
-                return True
-        except (KeyError, TypeError):
-            # No asn data for src ip
-            pass
+    def is_whitelisted_tranco_domain(self, domain) -> bool:
+        if self.ioc_snapshot_reader is not None:
+            if (ioc_snapshot := self.ioc_snapshot_reader.get()) is not None:
+                return ioc_snapshot.get('tranco_whitelist', domain) is not None
+        return __database__.is_whitelisted_tranco_domain(domain)
 
     def is_ignored_flow_type(self, flow_type) -> bool:
         """
@@ -68,39 +213,6 @@ class Whitelist:
             return True
 
 
-    def is_whitelisted_domain_in_flow(self, whitelisted_domain, direction, domains_of_flow, ignore_type):
-        """
-        Given the domain of a flow, and a whitelisted domain,
-        this function checks any of the flow domains
-        is a subdomain or the same domain as the whitelisted domain
-
-        :param whitelisted_domain: the domain we want to check if it exists in the domains_of_flow
-        :param ignore_type: alerts or flows or both
-        :param direction: src or dst or both
-        :param domains_of_flow: src domains of the src IP of the flow,
-                                or dst domains of the dst IP of the flow
-        """
-        whitelisted_domains = __database__.get_whitelist('domains')
-        if not whitelisted_domains:
-            return False
-
-        # do we wanna whitelist flows coming from or going to this domain or both?
-        from_ = whitelisted_domains[whitelisted_domain]['from']
-        # Now check the domains of the src IP
-        if direction in from_ or 'both' in from_:
-            what_to_ignore = whitelisted_domains[whitelisted_domain]['what_to_ignore']
-
-            for domain_to_check in domains_of_flow:
-                main_domain = domain_to_check[-len(whitelisted_domain) :]
-                if whitelisted_domain in main_domain:
-                    # We can ignore flows or alerts, what is it?
-                    if (
-                        ignore_type in what_to_ignore
-                        or 'both' in what_to_ignore
-                    ):
-                        return True
-        return False
-
     def is_whitelisted_domain(self, domain_to_check, saddr, daddr, ignore_type):
         """
         :param domain_to_check: the domain we want to know if whitelisted or not
@@ -108,9 +220,8 @@ class Whitelist:
         :param daddr: daddr of the flow we're checking
         :param ignore_type: alerts or flows or both
         """
-
-        whitelisted_domains = __database__.get_whitelist('domains')
-        if not whitelisted_domains:
+        whitelist = self.get_compiled_whitelist()
+        if not whitelist.domains:
             return False
 
         # get the domains of this flow
@@ -118,50 +229,65 @@ class Whitelist:
             dst_domains_of_flow,
             src_domains_of_flow,
         ) = self.get_domains_of_flow(saddr, daddr)
+        # If slack.com was whitelisted, then test.slack.com
+        # should be ignored too. But not 'slack.com.test' or 'notslack.com'
+        return whitelist.is_whitelisted_domain(
+            domain_to_check, ignore_type, src_domains_of_flow, dst_domains_of_flow
+        )
 
-#         # self.print(f'Domains to check from flow: {domains_to_check}, {domains_to_check_dst} {domains_to_check_src}')
-        # Go through each whitelisted domain and check if what arrived is there
-        for whitelisted_domain in list(whitelisted_domains.keys()):
-            what_to_ignore = whitelisted_domains[whitelisted_domain]['what_to_ignore']
-            # Here we iterate over all the domains to check if we can find
-            # subdomains. If slack.com was whitelisted, then test.slack.com
-            # should be ignored too. But not 'slack.com.test'
-            main_domain = domain_to_check[-len(whitelisted_domain) :]
-            if whitelisted_domain in main_domain:
-                # We can ignore flows or alerts, what is it?
-                if (
-                    ignore_type in what_to_ignore
-                    or 'both' in what_to_ignore
-                ):
-                    # self.print(f'Whitelisting the domain {domain_to_check} due to whitelist of {domain_to_check}')
-                    return True
-
+    def get_compiled_whitelist(self) -> CompiledWhitelist:
+        now = time.time()
+        if (
+            self.compiled_whitelist is not None
+            and now - self.last_version_check >= self.version_check_interval
+        ):
+            # the whitelist may have been re-read by another process
+            self.last_version_check = now
+            if __database__.get_whitelist_version() != self.compiled_whitelist.version:
+                self.compiled_whitelist = None
 
-            if self.is_whitelisted_domain_in_flow(whitelisted_domain, 'src', src_domains_of_flow, ignore_type):
-                # self.print(f"Whitelisting the domain {domain_to_check} because is related"
-                #            f" to domain {domain_to_check} of dst IP {daddr}")
-                return True
+        if self.compiled_whitelist is None:
+            self.compiled_whitelist = CompiledWhitelist()
+            self.compiled_whitelist.load()
+        return self.compiled_whitelist
 
-            if self.is_whitelisted_domain_in_flow(whitelisted_domain, 'dst', dst_domains_of_flow, ignore_type):
-                # self.print(f"Whitelisting the domain {domain_to_check} because is"
-                #            f"related to domain {domain_to_check} of src IP {saddr}")
-                return True
-        return False
+    def get_ips_info(self, *ips) -> tuple:
+        """
+        returns the info of the given ips stored in IPsInfo and their dns resolutions,
+        ({ip: info}, {ip: dns resolution}), in 2 round-trips for all of them
+        """
+        return __database__.getIPsData(ips), __database__.get_dns_resolutions(ips)
 
+    def get_asn_of_ip(self, ip_data) -> dict:
+        """returns the asn info in the given info of an ip stored in IPsInfo, or {}"""
+        try:
+            return ip_data['asn'] or {}
+        except (KeyError, TypeError):
+            return {}
 
     def is_whitelisted_flow(self, flow) -> bool:
         """
         Checks if the src IP or dst IP or domain or organization of this flow is whitelisted.
+        The whitelist is in memory, the only db reads are the info and the dns
+        resolutions of the IPs of the flow, 2 round-trips when there's a whitelisted
+        domain or org. They're not cached because they change while the flows of
+        the IPs arrive, the first flows of an IP are usually seen before its
+        dns resolution or its asn, a cached empty result would miss the next flows
         """
+        whitelist = self.get_compiled_whitelist()
         saddr = flow.saddr
         daddr = flow.daddr
         flow_type = flow.type_
-        # get the domains of the IPs this flow
-        (
-            domains_to_check_dst,
-            domains_to_check_src,
-        ) = self.get_domains_of_flow(saddr, daddr)
-        # check if we have whitelisted domains
+        # get the domains of the IPs this flow, only if there's
+        # a whitelisted domain or org to compare them to
+        if whitelist.domains or whitelist.orgs:
+            ips_info = self.get_ips_info(saddr, daddr)
+            (
+                domains_to_check_dst,
+                domains_to_check_src,
+            ) = self.get_domains_of_flow(saddr, daddr, ips_info)
+        else:
+            domains_to_check_dst, domains_to_check_src = [], []
 
         # first get the domains of the flows we ewnt to check if whitelisted
         # Domain names are stored in different zeek files using different names.
@@ -177,36 +303,32 @@ class Whitelist:
             ))
 
         for domain in domains_to_check:
-            if self.is_whitelisted_domain(domain, saddr, daddr, 'flows'):
+            if whitelist.is_whitelisted_domain(
+                domain, 'flows', domains_to_check_src, domains_to_check_dst
+            ):
                 return True
 
-
-        if whitelisted_IPs := __database__.get_whitelist('IPs'):
-            # self.print('Check the IPs')
+        if whitelist.ips:
             # Check if the IPs are whitelisted
-            ips_to_whitelist = list(whitelisted_IPs.keys())
-
-            if saddr in ips_to_whitelist:
+            if saddr in whitelist.ips:
                 # The flow has the src IP to whitelist
-                from_ = whitelisted_IPs[saddr]['from']
-                what_to_ignore = whitelisted_IPs[saddr]['what_to_ignore']
+                from_ = whitelist.ips[saddr]['from']
+                what_to_ignore = whitelist.ips[saddr]['what_to_ignore']
                 if ('src' in from_ or 'both' in from_) and (
                         self.should_ignore_flows(what_to_ignore)
                 ):
-                    # self.print(f"Whitelisting the src IP {column_values['saddr']}")
                     return True
 
-            if daddr in ips_to_whitelist:   # should be if and not elif
+            if daddr in whitelist.ips:   # should be if and not elif
                 # The flow has the dst IP to whitelist
-                from_ = whitelisted_IPs[daddr]['from']
-                what_to_ignore = whitelisted_IPs[daddr]['what_to_ignore']
+                from_ = whitelist.ips[daddr]['from']
+                what_to_ignore = whitelist.ips[daddr]['what_to_ignore']
                 if ('dst' in from_ or 'both' in from_) and (
                     self.should_ignore_flows(what_to_ignore)
                 ):
-                    # self.print(f"Whitelisting the dst IP {column_values['daddr']}")
                     return True
 
-        if whitelisted_macs := __database__.get_whitelist('mac'):
+        if whitelist.macs:
             # try to get the mac address of the current flow
             src_mac = flow.smac if hasattr(flow, 'smac') else False
 
@@ -216,47 +338,42 @@ class Whitelist:
                 ):
                     src_mac = src_mac[0]
 
-            if src_mac and src_mac in list(whitelisted_macs.keys()):
+            if src_mac and src_mac in whitelist.macs:
                 # the src mac of this flow is whitelisted, but which direction?
-                from_ = whitelisted_macs[src_mac]['from']
-                what_to_ignore = whitelisted_macs[src_mac]['what_to_ignore']
+                from_ = whitelist.macs[src_mac]['from']
+                what_to_ignore = whitelist.macs[src_mac]['what_to_ignore']
 
                 if (
                     ('src' in from_ or 'both' in from_)
                     and
                     self.should_ignore_flows(what_to_ignore)
                 ):
-                    # self.print(f"The source MAC of this flow {src_mac} is whitelisted")
                     return True
 
             dst_mac = flow.dmac if hasattr(flow, 'smac') else False
-            if dst_mac and dst_mac in list(whitelisted_macs.keys()):
+            if dst_mac and dst_mac in whitelist.macs:
                 # the dst mac of this flow is whitelisted, but which direction?
-                from_ = whitelisted_macs[dst_mac]['from']
-                what_to_ignore = whitelisted_macs[dst_mac]['what_to_ignore']
+                from_ = whitelist.macs[dst_mac]['from']
+                what_to_ignore = whitelist.macs[dst_mac]['what_to_ignore']
 
                 if (
                     ('dst' in from_ or 'both' in from_)
                     and
                     self.should_ignore_flows(what_to_ignore)
                 ):
-                    # self.print(f"The dst MAC of this flow {dst_mac} is whitelisted")
                     return True
 
         if self.is_ignored_flow_type(flow_type):
             return False
 
-        if whitelisted_orgs := __database__.get_whitelist('organizations'):
-            # self.print('Check if the organization is whitelisted')
+        if whitelist.orgs:
             # Check if IP belongs to a whitelisted organization range
             # Check if the ASN of this IP is any of these organizations
-
-            for org in whitelisted_orgs:
-                from_ = whitelisted_orgs[org]['from']  # src or dst or both
-                what_to_ignore = whitelisted_orgs[org][
-                    'what_to_ignore'
-                ]  # flows, alerts or both
-                # self.print(f'Checking {org}, from:{from_} type {what_to_ignore}')
+            # the asn of each ip is only read once for all the orgs
+            asns = {}
+            for org, org_info in whitelist.orgs.items():
+                from_ = org_info['from']  # src or dst or both
+                what_to_ignore = org_info['what_to_ignore']  # flows, alerts or both
 
                 if self.should_ignore_flows(what_to_ignore):
                     # We want to block flows from this org. get the domains of this flow based on the direction.
@@ -269,35 +386,17 @@ class Whitelist:
                     elif 'dst' in from_:
                         domains_to_check = domains_to_check_dst
 
-                    if 'src' in from_ or 'both' in from_:
-                        # Method 1 Check if src IP belongs to a whitelisted organization range
-                        try:
-                            if self.is_ip_in_org(saddr, org):
-                                # self.print(f"The src IP {saddr} is in the ranges of org {org}. Whitelisted.")
-                                return True
-                        except ValueError:
-                            # Some flows don't have IPs, but mac address or just - in some cases
-                            return False
-
-                        # Method 2 Check if the ASN of this src IP is any of these organizations
-                        if self.is_whitelisted_asn(saddr, org):
-                            # this ip belongs to a whitelisted org, ignore flow
-                            # self.print(f"The src IP {saddr} belong to {org}. Whitelisted because of ASN.")
+                    for direction, ip in (('src', saddr), ('dst', daddr)):
+                        if direction not in from_ and 'both' not in from_:
+                            continue
+                        # Method 1 Check if the IP belongs to a whitelisted organization range
+                        if whitelist.is_ip_in_org(ip, org):
                             return True
 
-                    if 'dst' in from_ or 'both' in from_:
-                        # Method 1 Check if dst IP belongs to a whitelisted organization range
-                        try:
-                            if self.is_ip_in_org(flow.daddr, org):
-                                # self.print(f"The dst IP {column_values['daddr']} "
-                                #            f"is in the network range of org {org}. Whitelisted.")
-                                return True
-                        except ValueError:
-                            # Some flows don't have IPs, but mac address or just - in some cases
-                            return False
-
-                        # Method 2 Check if the ASN of this dst IP is any of these organizations
-                        if self.is_whitelisted_asn(daddr, org):
+                        # Method 2 Check if the ASN of this IP is any of these organizations
+                        if ip not in asns:
+                            asns[ip] = self.get_asn_of_ip(ips_info[0].get(ip))
+                        if asns[ip] and whitelist.is_asn_in_org(asns[ip], org):
                             # this ip belongs to a whitelisted org, ignore flow
                             return True
 
@@ -305,7 +404,7 @@ class Whitelist:
                     # Method 3 Check if the domains of this flow belong to this org
                     # domains to check are usually 1 or 2 domains
                     for flow_domain in domains_to_check:
-                        if self.is_domain_in_org(flow_domain, org):
+                        if whitelist.is_domain_in_org(flow_domain, org):
                             return True
 
         return False
@@ -314,49 +413,14 @@ class Whitelist:
         """
         Checks if the given domains belongs to the given org
         """
-        try:
-            org_domains = json.loads(
-                __database__.get_org_info(org, 'domains')
-            )
-            if org in domain:
-                # self.print(f"The domain of this flow ({domain}) belongs to the domains of {org}")
-                return True
-
-            try:
-                flow_TLD = tld.get_tld(domain, as_object=True)
-            except tld.exceptions.TldBadUrl:
-                flow_TLD = domain.split('.')[-1]
-
-            for org_domain in org_domains:
-                try:
-                    org_domain_TLD = tld.get_tld(org_domain, as_object=True)
-                except tld.exceptions.TldBadUrl:
-                    org_domain_TLD = org_domain.split('.')[-1]
-
-                # make sure the 2 domains have the same same top level domain
-                if flow_TLD != org_domain_TLD:
-                    continue
-
-                # match subdomains too
-                # if org has org.com, and the flow_domain is xyz.org.com whitelist it
-                if org_domain in domain:
-                    # self.print(f"The src domain of this flow ({domain}) is "
-                    #            f"a subdomain of {org} domain: {org_domain}")
-                    return True
-                # if org has xyz.org.com, and the flow_domain is org.com whitelist it
-                if domain in org_domain:
-                    # self.print(f"The domain of {org} ({org_domain}) is a subdomain of "
-                    #            f"this flow domain ({domain})")
-                    return True
-        except (KeyError, TypeError):
-            # comes here if the whitelisted org doesn't have domains in slips/organizations_info (not a famous org)
-            # and ip doesn't have asn info.
-            # so we don't know how to link this ip to the whitelisted org!
-            pass
+        return self.get_compiled_whitelist().is_domain_in_org(domain, org)
 
     def read_whitelist(self):
         """Reads the content of whitelist.conf and stores information about each ip/org/domain in the database"""
 
+        # the compiled whitelist is rebuilt from the new content on the next flow
+        self.compiled_whitelist = None
+
         # since this function can be run when the user modifies whitelist.conf
         # we need to check if the dicts are already there
         whitelisted_IPs = __database__.get_whitelist('IPs')
@@ -497,64 +561,32 @@ class Whitelist:
 
         return line_number
 
-    def get_domains_of_flow(self, saddr, daddr):
-        """Returns the domains of each ip (src and dst) that appeard in this flow"""
+    def get_domains_of_flow(self, saddr, daddr, ips_info=None):
+        """
+        Returns the domains of each ip (src and dst) that appeard in this flow
+        :param ips_info: the info of the ips returned by get_ips_info(), read if not given
+        """
+        ips_data, dns_resolutions = ips_info or self.get_ips_info(saddr, daddr)
         # These separate lists, hold the domains that we should only check if they are SRC or DST. Not both
-        domains_to_check_src = []
-        domains_to_check_dst = []
-        try:
-            if ip_data := __database__.getIPData(saddr):
-                if sni_info := ip_data.get('SNI', [{}])[0]:
-                    domains_to_check_src.append(sni_info.get('server_name', ''))
-        except (KeyError, TypeError):
-            pass
-        try:
-            # self.print(f"DNS of src IP {column_values['saddr']}: {__database__.get_dns_resolution(column_values['saddr'])}")
-            src_dns_domains = __database__.get_dns_resolution(saddr)
-            src_dns_domains = src_dns_domains.get('domains', [])
-            domains_to_check_src.extend(iter(src_dns_domains))
-        except (KeyError, TypeError):
-            pass
-        try:
-            if ip_data := __database__.getIPData(daddr):
-                if sni_info := ip_data.get('SNI', [{}])[0]:
-                    domains_to_check_dst.append(sni_info.get('server_name'))
-        except (KeyError, TypeError):
-            pass
-
-        try:
-            # self.print(f"DNS of dst IP {column_values['daddr']}: {__database__.get_dns_resolution(column_values['daddr'])}")
-            dst_dns_domains = __database__.get_dns_resolution(daddr)
-            dst_dns_domains = dst_dns_domains.get('domains', [])
-            domains_to_check_dst.extend(iter(dst_dns_domains))
-        except (KeyError, TypeError):
-            pass
+        domains_to_check = {saddr: [], daddr: []} if saddr != daddr else {saddr: []}
+        for ip, domains in domains_to_check.items():
+            try:
+                if ip_data := ips_data.get(ip):
+                    if sni_info := ip_data.get('SNI', [{}])[0]:
+                        domains.append(sni_info.get('server_name', ''))
+            except (KeyError, TypeError, IndexError):
+                pass
+            domains.extend(dns_resolutions.get(ip, {}).get('domains', []))
 
-        return domains_to_check_dst, domains_to_check_src
+        return domains_to_check[daddr], domains_to_check[saddr]
 
 
     def is_ip_in_org(self, ip:str, org):
         """
         Check if the given ip belongs to the given org
         """
-        try:
-            org_subnets: dict = __database__.get_org_IPs(org)
-
-            first_octet:str = utils.get_first_octet(ip)
-            if not first_octet:
-                return
-            ip_obj = ipaddress.ip_address(ip)
-            # organization IPs are sorted by first octet for faster search
-            for range in org_subnets.get(first_octet, []):
-                if ip_obj in ipaddress.ip_network(range):
-                    return True
-        except (KeyError, TypeError):
-            # comes here if the whitelisted org doesn't have
-            # info in slips/organizations_info (not a famous org)
-            # and ip doesn't have asn info.
-            pass
-        return False
-    
+        return self.get_compiled_whitelist().is_ip_in_org(ip, org)
+
     def profile_has_whitelisted_mac(
             self, profile_ip, whitelisted_macs, is_srcip, is_dstip
     ) -> bool:
@@ -593,25 +625,10 @@ class Whitelist:
         returns true if the ASN of the given IP is listed in the ASNs of the given org ASNs
         """
         # Check if the IP in the content of the alert has ASN info in the db
-        ip_data = __database__.getIPData(ip)
-        if not ip_data:
-            return
-        try:
-            ip_asn = ip_data['asn']['number']
-        except KeyError:
-            return
-
-        org_asn: list = json.loads(__database__.get_org_info(org, 'asn'))
-
-        # make sure the asn field contains a value
-        if (
-            org.lower() in ip_asn.lower()
-            or ip_asn in org_asn
-        ):
+        if asn := self.get_asn_of_ip(__database__.getIPData(ip)):
             # this ip belongs to a whitelisted org, ignore alert
-            # self.print(f'Whitelisting evidence sent by {srcip} about {ip} due to ASN of {ip}
-            # related to {org}. {data} in {description}')
-            return True
+            return self.get_compiled_whitelist().is_asn_in_org(asn, org)
+        return False
 
     def is_srcip(self, attacker_direction):
         return attacker_direction in ('sip', 'srcip', 'sport', 'inTuple')
@@ -747,7 +764,7 @@ class Whitelist:
                         #            f'related to {data} in {description}')
                         return True
 
-            if __database__.is_whitelisted_tranco_domain(domain):
+            if self.is_whitelisted_tranco_domain(domain):
                 # tranco list contains the top 10k known benign domains
                 # https://tranco-list.eu/list/X5QNN/1000000
                 return True
@@ -855,14 +872,16 @@ class Whitelist:
             # see if the org has asn cached in our db
             asn_cache: dict = __database__.get_asn_cache()
             org_asn = []
-            # asn_cache is a dict sorted by first octet
-            for octet, range_info in asn_cache.items:
-                # range_info is a serialized dict of ranges
-                range_info = json.loads(range_info)
-                for range, asn_info in range_info.items():
-                    # we have the asn of this given org cached
-                    if org in asn_info['org'].lower():
-                        org_asn.append(org)
+            # asn_cache is a dict of {range: serialized asn info}
+            for range, asn_info in asn_cache.items():
+                asn_info = json.loads(asn_info)
+                # we have the asn of this given org cached
+                if (
+                    org in asn_info['org'].lower()
+                    and 'number' in asn_info
+                    and asn_info['number'] not in org_asn
+                ):
+                    org_asn.append(asn_info['number'])
 
         __database__.set_org_info(org, json.dumps(org_asn), 'asn')
         return org_asn
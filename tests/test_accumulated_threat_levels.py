@@ -0,0 +1,61 @@
+from ..slips_files.core.accumulated_threat_levels import AccumulatedThreatLevels
+import pytest
+
+profileid = 'profile_192.168.1.1'
+twid = 'timewindow1'
+
+
+def create_accumulated_threat_levels_instance():
+    accumulated_threat_levels = AccumulatedThreatLevels()
+    accumulated_threat_levels.add(profileid, twid, 'ID1', 0.8)
+    accumulated_threat_levels.add(profileid, twid, 'ID2', 0.5)
+    accumulated_threat_levels.add(profileid, 'timewindow2', 'ID3', 1)
+    return accumulated_threat_levels
+
+
+def test_add():
+    accumulated_threat_levels = create_accumulated_threat_levels_instance()
+    assert accumulated_threat_levels.get(profileid, twid) == pytest.approx(1.3)
+    # adding the same evidence twice doesn't count it twice
+    assert accumulated_threat_levels.add(profileid, twid, 'ID2', 0.5) == pytest.approx(1.3)
+    assert accumulated_threat_levels.get_evidence_IDs(profileid, twid) == ['ID1', 'ID2']
+    assert accumulated_threat_levels.get(profileid, 'timewindow3') == 0
+
+
+def test_remove():
+    accumulated_threat_levels = create_accumulated_threat_levels_instance()
+    assert accumulated_threat_levels.remove(profileid, twid, 'ID1') == pytest.approx(0.5)
+    assert accumulated_threat_levels.remove(profileid, twid, 'not added') == pytest.approx(0.5)
+    assert accumulated_threat_levels.remove(profileid, twid, 'ID2') == 0
+    assert accumulated_threat_levels.get_evidence_IDs(profileid, twid) == []
+
+
+def test_reset():
+    accumulated_threat_levels = create_accumulated_threat_levels_instance()
+    assert accumulated_threat_levels.reset(profileid, twid) == ['ID1', 'ID2']
+    assert accumulated_threat_levels.get(profileid, twid) == 0
+    # other timewindows aren't affected
+    assert accumulated_threat_levels.get(profileid, 'timewindow2') == 1
+
+
+def test_evidence_after_tw_closed():
+    accumulated_threat_levels = AccumulatedThreatLevels()
+    threshold = 1
+    accumulated_threat_levels.add(profileid, twid, 'ID1', 0.8)
+    # timewindow1 is closed, flowalerts and the slower modules still add evidence to it
+    assert accumulated_threat_levels.evict_tws_before(profileid, twid) == []
+    accumulated_threat_levels.add(profileid, twid, 'ID2', 0.5)
+    # the same decision as summing all the evidence of the tw
+    assert accumulated_threat_levels.get(profileid, twid) >= threshold
+    assert accumulated_threat_levels.get_evidence_IDs(profileid, twid) == ['ID1', 'ID2']
+
+
+def test_evict_tws_before():
+    accumulated_threat_levels = create_accumulated_threat_levels_instance()
+    accumulated_threat_levels.add('profile_192.168.1.2', twid, 'ID4', 1)
+    # timewindow1 can't get more evidence once timewindow2 is closed
+    assert accumulated_threat_levels.evict_tws_before(profileid, 'timewindow2') == [twid]
+    assert accumulated_threat_levels.get(profileid, twid) == 0
+    assert accumulated_threat_levels.get(profileid, 'timewindow2') == 1
+    # other profiles aren't affected
+    assert accumulated_threat_levels.get('profile_192.168.1.2', twid) == 1
@@ -95,6 +95,23 @@ def test_timewindows(outputQueue):
     assert database.getLastTWforProfile(profileid) == [('timewindow2', 5.0)]
 
 
+def test_get_timewindow(outputQueue):
+    database = create_db_instace(outputQueue)
+    profileid = 'profile_192.168.1.2'
+    database.addProfile(profileid, '00:00', '1')
+    # the width is 3600
+    assert database.get_timewindow(7200.0, profileid) == 'timewindow1'
+    assert database.get_timewindow(7300.0, profileid) == 'timewindow1'
+    # the empty tws in the middle are created too
+    assert database.get_timewindow(7200.0 + 3600 * 3, profileid) == 'timewindow4'
+    assert database.getLastTWforProfile(profileid) == [('timewindow4', 18000.0)]
+    assert database.getamountTWsfromProfile(profileid) == 4
+    # older flows
+    assert database.get_timewindow(100.0, profileid) == 'timewindow-1'
+    assert database.getFirstTWforProfile(profileid) == [('timewindow-1', 0.0)]
+    assert database.get_timewindow(11000.0, profileid) == 'timewindow2'
+
+
 def getSlipsInternalTime():
     """return a random time for testing"""
     return 50.0
@@ -125,9 +142,16 @@ def test_add_ips(outputQueue):
     assert (
         database.add_ips(profileid, twid, flow, 'Server') is True
     )
-    hash_id = f'{profileid}_{twid}'
-    stored_dstips = database.r.hget(hash_id, 'SrcIPs')
-    assert stored_dstips == '{"192.168.1.1": 1}'
+    assert database.getSrcIPsfromProfileTW(profileid, twid) == {test_ip: 1}
+    # contacting the same ip again increments its counter
+    database.add_ips(profileid, twid, flow, 'Server')
+    assert database.getSrcIPsfromProfileTW(profileid, twid) == {test_ip: 2}
+    state = database.getFinalStateFromFlags(flow.state, flow.pkts)
+    stored_ips = database.getDataFromProfileTW(
+        profileid, twid, 'Src', state, 'TCP', 'Server', 'IPs'
+    )
+    assert stored_ips[test_ip]['totalflows'] == 1
+    assert stored_ips[test_ip]['dstports'] == {str(flow.dport): flow.spkts}
 
 
 def test_add_port(outputQueue):
@@ -135,11 +159,44 @@ def test_add_port(outputQueue):
     new_flow = flow
     new_flow.state = 'Not Established'
     database.add_port(profileid, twid, flow, 'Server', 'Dst')
+    database.add_port(profileid, twid, flow, 'Server', 'Dst')
+    added_ports = database.getDataFromProfileTW(
+        profileid, twid, 'Dst', 'Not Established', 'TCP', 'Server', 'Ports'
+    )
+    port_data = added_ports[str(flow.dport)]
+    assert port_data['totalflows'] == 2
+    assert port_data['totalpkt'] == 2 * flow.pkts
+    assert port_data['srcips'][flow.daddr]['uid'] == [flow.uid, flow.uid]
+
+
+
+
+def test_add_tuple(outputQueue):
+    database = create_db_instace(outputQueue)
+    tupleid = '8.8.8.8-80-tcp'
+    database.add_tuple(profileid, twid, tupleid, ('1', (False, 5.0)), 'Client', flow)
+    database.add_tuple(profileid, twid, tupleid, ('a,', (5.0, 10.0)), 'Client', flow)
+    assert database.get_tuples(profileid, twid, 'OutTuples') == {
+        tupleid: ('1a,', [5.0, 10.0])
+    }
+    assert database.getT2ForProfileTW(profileid, twid, tupleid, 'OutTuples') == [5.0, 10.0]
+
+def test_pipeline(outputQueue):
+    database = create_db_instace(outputQueue)
+    database.start_pipeline()
+    database.add_port(profileid, twid, flow, 'Client', 'Dst')
     hash_key = f'{profileid}_{twid}'
-    added_ports = database.r.hgetall(hash_key)
-    assert 'DstPortsServerTCPNot Established' in added_ports.keys()
-    assert flow.daddr in added_ports['DstPortsServerTCPNot Established']
+    # nothing is written until the pipeline is executed
+    assert not database.r.exists(f'{hash_key}_DstPortsClientTCPNot Established')
+    assert not database.r.zscore('ModifiedTW', hash_key)
 
+    database.execute_pipeline()
+    assert database.getDataFromProfileTW(
+        profileid, twid, 'Dst', 'Not Established', 'TCP', 'Client', 'Ports'
+    )
+    assert database.r.zscore('ModifiedTW', hash_key)
+    # commands after the pipeline is executed are sent right away
+    assert database.writer is database.r
 
 def test_setEvidence(outputQueue):
     database = create_db_instace(outputQueue)
@@ -155,11 +212,7 @@ def test_setEvidence(outputQueue):
     database.setEvidence(evidence_type, attacker_direction, attacker, threat_level, confidence, description,
                          timestamp, category, profileid=profileid, twid=twid, uid=uid)
 
-    added_evidence = database.r.hget(f'evidence{profileid}', twid)
-    added_evidence2 = database.r.hget(f'{profileid}_{twid}', 'Evidence')
-    assert added_evidence2 == added_evidence
-
-    added_evidence = json.loads(added_evidence)
+    added_evidence = database.getEvidenceForTW(profileid, twid)
     description = 'SSH Successful to IP :8.8.8.8. From IP 192.168.1.1'
     #  note that added_evidence may have evidence from other unit tests
     evidence_uid =  next(iter(added_evidence))
@@ -170,14 +223,25 @@ def test_setEvidence(outputQueue):
 
 def test_deleteEvidence(outputQueue):
     database = create_db_instace(outputQueue)
-    description = 'SSH Successful to IP :8.8.8.8. From IP 192.168.1.1'
-    database.deleteEvidence(profileid, twid, description)
-    added_evidence = json.loads(database.r.hget(f'evidence{profileid}', twid))
-    added_evidence2 = json.loads(
-        database.r.hget(f'{profileid}_{twid}', 'Evidence')
-    )
-    assert 'SSHSuccessful-by-192.168.1.1' not in added_evidence
-    assert 'SSHSuccessful-by-192.168.1.1' not in added_evidence2
+    evidence_ID = next(iter(database.getEvidenceForTW(profileid, twid)))
+    database.deleteEvidence(profileid, twid, evidence_ID)
+    assert evidence_ID not in database.getEvidenceForTW(profileid, twid)
+    assert not database.get_evidence_by_ID(profileid, twid, evidence_ID)
+
+
+def test_migrate_tw_evidence(outputQueue):
+    database = create_db_instace(outputQueue)
+    twid = 'timewindow4'
+    evidence = {
+        'ID1': json.dumps({'ID': 'ID1', 'attacker_direction': 'srcip', 'threat_level': 'high', 'confidence': 1}),
+        'ID2': json.dumps({'ID': 'ID2', 'attacker_direction': 'dstip', 'threat_level': 'high', 'confidence': 1}),
+    }
+    # the way older versions of slips stored evidence
+    database.r.hset(f'{profileid}_{twid}', 'Evidence', json.dumps(evidence))
+    database.r.hset(f'evidence{profileid}', twid, json.dumps(evidence))
+
+    assert database.getEvidenceForTW(profileid, twid) == evidence
+    assert not database.r.hget(f'{profileid}_{twid}', 'Evidence')
 
 
 def test_module_labels(outputQueue):
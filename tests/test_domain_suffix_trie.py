@@ -0,0 +1,37 @@
+from ..slips_files.common.domain_suffix_trie import DomainSuffixTrie
+import pytest
+
+
+def create_trie_instance():
+    trie = DomainSuffixTrie()
+    trie.insert('slack.com', 'parent')
+    trie.insert('files.slack.com', 'child')
+    trie.insert('apple.com')
+    return trie
+
+
+@pytest.mark.parametrize(
+    'domain,expected_matches',
+    [
+        ('slack.com', [('slack.com', 'parent')]),
+        ('test.slack.com', [('slack.com', 'parent')]),
+        (
+            'a.files.slack.com',
+            [('slack.com', 'parent'), ('files.slack.com', 'child')],
+        ),
+        ('WWW.Apple.com', [('apple.com', 'apple.com')]),
+        ('notslack.com', []),
+        ('slack.com.test', []),
+    ],
+)
+def test_matches(domain, expected_matches):
+    trie = create_trie_instance()
+    assert trie.matches(domain) == expected_matches
+
+
+def test_len():
+    trie = create_trie_instance()
+    assert len(trie) == 3
+    # replacing the value of a domain doesn't add a new one
+    trie.insert('slack.com', 'new value')
+    assert len(trie) == 3
@@ -0,0 +1,50 @@
+from ..slips_files.core.database.flow_codec import (
+    JSONFlowCodec,
+    MsgpackFlowCodec,
+    decode_flow,
+    decode_msg,
+    get_flow_codec,
+    msgpack,
+)
+import pytest
+
+flow = {
+    'ts': 1594417039.029793,
+    'dur': '1.9424750804901123',
+    'saddr': '10.7.10.101',
+    'sport': '49733',
+    'daddr': '40.70.224.145',
+    'dport': '443',
+    'proto': 'tcp',
+    'allbytes': 42764,
+    'module_labels': {},
+}
+msg = {
+    'profileid': 'profile_10.7.10.101',
+    'twid': 'timewindow1',
+    'uid': 'CAeDWs37BipkfP21u8',
+    'flow': flow,
+    'stime': flow['ts'],
+}
+
+
+def test_json_codec():
+    codec = JSONFlowCodec()
+    assert decode_flow(codec.encode(flow)) == flow
+    # flows read using the binary connection
+    assert decode_flow(codec.encode(flow).encode()) == flow
+    assert decode_msg(codec.encode_msg(msg)) == msg
+    assert decode_flow(None) is None
+
+
+@pytest.mark.skipif(msgpack is None, reason='msgpack is not installed')
+def test_msgpack_codec():
+    codec = get_flow_codec('msgpack')
+    assert isinstance(codec, MsgpackFlowCodec)
+    assert decode_flow(codec.encode(flow)) == flow
+    assert decode_msg(codec.encode_msg(msg)) == msg
+
+
+def test_get_flow_codec():
+    assert isinstance(get_flow_codec('json'), JSONFlowCodec)
+    assert isinstance(get_flow_codec('unknown'), JSONFlowCodec)
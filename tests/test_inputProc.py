@@ -146,3 +146,20 @@ def test_handle_suricata(
         outputQueue, profilerQueue, input_information, input_type
     )
     assert inputProcess.handle_suricata() is True
+
+
+def test_get_earliest_line(outputQueue, profilerQueue):
+    inputProcess = create_inputProcess_instance(
+        outputQueue, profilerQueue, 'dataset/test9-mixed-zeek-dir/', 'zeek_folder'
+    )
+    inputProcess.cache_lines = {}
+    inputProcess.earliest_lines = []
+    inputProcess.lines_cached = 0
+    inputProcess.cache_line('zeek_files/http.log', 3.0, {'ts': 3.0})
+    inputProcess.cache_line('zeek_files/conn.log', 2.0, {'ts': 2.0})
+    # dns flows are sent before conn flows with the same ts
+    inputProcess.cache_line('zeek_files/dns.log', 2.0, {'ts': 2.0})
+
+    _, filename = inputProcess.get_earliest_line()
+    assert filename == 'zeek_files/dns.log'
+    assert inputProcess.get_file_priority('zeek_files/conn.log') == 1
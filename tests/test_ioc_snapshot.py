@@ -0,0 +1,95 @@
+from ..slips_files.common.ioc_snapshot import IoCSnapshot, IoCSnapshotReader
+import json
+
+ip_info = json.dumps({'source': 'feed.csv', 'threat_level': 'medium'})
+tables = {
+    'ips': {'8.8.8.8': ip_info, '2001:db8::1': ip_info, 'not an ip': ip_info},
+    'domains': {'example.com': ip_info},
+    'ip_ranges': {'91.240.0.0/16': ip_info},
+    'tranco_whitelist': {'google.com': ''},
+}
+
+
+def test_get(tmp_path):
+    path = str(tmp_path / 'ioc-snapshot.bin')
+    IoCSnapshot.write(tables, {'feeds': {'feed.csv': {'e-tag': '1234'}}}, path)
+    ioc_snapshot = IoCSnapshot.open(path)
+    assert ioc_snapshot.get('ips', '8.8.8.8') == ip_info
+    assert ioc_snapshot.get('ips', '2001:db8::1') == ip_info
+    assert ioc_snapshot.get('ips', '1.1.1.1') is None
+    assert ioc_snapshot.get('domains', 'example.com') == ip_info
+    assert ioc_snapshot.get('domains', 'www.example.com') is None
+    assert ioc_snapshot.get('tranco_whitelist', 'google.com') == ''
+    # invalid ips aren't stored
+    assert list(ioc_snapshot.keys('ips')) == ['8.8.8.8', '2001:db8::1']
+    assert list(ioc_snapshot.keys('ip_ranges')) == ['91.240.0.0/16']
+    assert ioc_snapshot.metadata['feeds']['feed.csv']['e-tag'] == '1234'
+
+
+def test_open_invalid_snapshot(tmp_path):
+    path = tmp_path / 'ioc-snapshot.bin'
+    assert IoCSnapshot.open(str(path)) is None
+    path.write_bytes(b'not a snapshot')
+    assert IoCSnapshot.open(str(path)) is None
+
+
+def test_reader(tmp_path):
+    path = str(tmp_path / 'ioc-snapshot.bin')
+    opened = []
+    reader = IoCSnapshotReader(path, check_interval=0, on_open=opened.append)
+    assert reader.get() is None
+
+    IoCSnapshot.write(tables, {}, path)
+    ioc_snapshot = reader.get()
+    assert ioc_snapshot.get('ips', '8.8.8.8') == ip_info
+    assert reader.get() is ioc_snapshot
+
+    # the update manager wrote a new snapshot
+    IoCSnapshot.write({'ips': {'1.1.1.1': ip_info}}, {}, path)
+    assert ioc_snapshot.is_outdated(path)
+    ioc_snapshot = reader.get()
+    assert ioc_snapshot.get('ips', '1.1.1.1') == ip_info
+    assert ioc_snapshot.get('ips', '8.8.8.8') is None
+    assert len(opened) == 2
+
+
+def test_items(tmp_path):
+    path = str(tmp_path / 'ioc-snapshot.bin')
+    IoCSnapshot.write(tables, {}, path)
+    ioc_snapshot = IoCSnapshot.open(path)
+    assert dict(ioc_snapshot.items('ips')) == {
+        '8.8.8.8': ip_info,
+        '2001:db8::1': ip_info,
+    }
+    assert dict(ioc_snapshot.items('tranco_whitelist')) == {'google.com': ''}
+
+
+class CacheDB:
+    """the IoCs stored in the cache db of the database"""
+    def __init__(self, iocs: dict, runtime_ips: dict):
+        self.iocs = iocs
+        self.runtime_ips = runtime_ips
+
+    def get_all_TI_files_info(self):
+        return {'feed.csv': {'e-tag': '1234'}}
+
+    def get_all_IoCs(self):
+        return self.iocs
+
+    def get_runtime_IPs_in_IoC(self):
+        return self.runtime_ips
+
+    def delete_runtime_ips_from_IoC(self, ips):
+        for ip in ips:
+            del self.runtime_ips[ip]
+
+
+def test_write_from_db(tmp_path):
+    path = str(tmp_path / 'ioc-snapshot.bin')
+    db = CacheDB(tables, {'8.8.8.8': ip_info})
+    IoCSnapshot.write_from_db(db, path)
+    ioc_snapshot = IoCSnapshot.open(path)
+    assert ioc_snapshot.get('ips', '8.8.8.8') == ip_info
+    assert ioc_snapshot.metadata['feeds'] == {'feed.csv': {'e-tag': '1234'}}
+    # the runtime ip is in the snapshot now
+    assert db.runtime_ips == {}
@@ -48,6 +48,16 @@ def test_cache_ip_range(database):
     ASN_info = create_ASN_Info_instance()
     assert ASN_info.cache_ip_range('8.8.8.8') == {'asn': {'number': 'AS15169', 'org': 'GOOGLE, US'}}
 
+def test_get_cached_asn(database):
+    ASN_info = create_ASN_Info_instance()
+    database.set_asn_cache('Test', '192.168.0.0/16', '123')
+    database.set_asn_cache('Test 2', '192.168.1.0/24', '456')
+    ASN_info.load_asn_cache()
+    # the most specific range wins
+    assert ASN_info.get_cached_asn('192.168.1.5') == {'asn': {'org': 'Test 2', 'number': 'AS456'}}
+    assert ASN_info.get_cached_asn('192.168.2.5') == {'asn': {'org': 'Test', 'number': 'AS123'}}
+    assert ASN_info.get_cached_asn('10.0.0.1') is None
+
 # GEOIP unit tests
 def test_get_geocountry(outputQueue, database):
     ip_info = create_ip_info_instance(outputQueue)
@@ -0,0 +1,32 @@
+from ..slips_files.core.database.ip_info_buffer import IPInfoBuffer
+
+ip = '8.8.8.8'
+
+
+def create_ip_info_buffer_instance():
+    # the timer thread doesn't flush anything during the tests
+    return IPInfoBuffer(None, 3600)
+
+
+def test_add():
+    ip_info_buffer = create_ip_info_buffer_instance()
+    ip_info_buffer.add(ip, {'geocountry': 'US'})
+    ip_info_buffer.add(ip, {'asn': {'number': 'AS15169'}})
+    # the latest info of the same type wins
+    ip_info_buffer.add(ip, {'geocountry': 'Unknown'})
+    assert ip_info_buffer.get(ip) == {
+        'geocountry': 'Unknown',
+        'asn': {'number': 'AS15169'},
+    }
+    assert ip_info_buffer.get('1.1.1.1') == {}
+
+
+def test_pop_all():
+    ip_info_buffer = create_ip_info_buffer_instance()
+    ip_info_buffer.add(ip, {'geocountry': 'US'})
+    ip_info_buffer.add('1.1.1.1', {'reverse_dns': 'one.one.one.one'})
+    assert ip_info_buffer.pop_all() == {
+        ip: {'geocountry': 'US'},
+        '1.1.1.1': {'reverse_dns': 'one.one.one.one'},
+    }
+    assert len(ip_info_buffer) == 0
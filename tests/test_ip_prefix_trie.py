@@ -0,0 +1,34 @@
+from ..slips_files.common.ip_prefix_trie import IPPrefixTrie
+import pytest
+
+
+def create_trie_instance():
+    trie = IPPrefixTrie()
+    trie.insert('10.0.0.0/8', 'big range')
+    trie.insert('10.1.0.0/16', 'small range')
+    trie.insert('2001:db8::/32')
+    return trie
+
+
+@pytest.mark.parametrize(
+    'ip,expected_match',
+    [
+        ('10.1.2.3', ('10.1.0.0/16', 'small range')),
+        ('10.2.2.3', ('10.0.0.0/8', 'big range')),
+        ('11.0.0.1', False),
+        ('2001:db8::1', ('2001:db8::/32', '2001:db8::/32')),
+        ('2001:db9::1', False),
+        ('not an ip', False),
+    ],
+)
+def test_longest_match(ip, expected_match):
+    trie = create_trie_instance()
+    assert trie.longest_match(ip) == expected_match
+
+
+def test_remove():
+    trie = create_trie_instance()
+    assert trie.remove('10.1.0.0/16')
+    assert not trie.remove('10.1.0.0/16')
+    assert trie.longest_match('10.1.2.3') == ('10.0.0.0/8', 'big range')
+    assert len(trie) == 2
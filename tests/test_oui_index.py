@@ -0,0 +1,29 @@
+from ..slips_files.common.oui_index import OUIIndex
+
+mac_db = [
+    '{"macPrefix":"08:00:27","vendorName":"PCS Systemtechnik GmbH","private":false}',
+    '{"macPrefix":"70:B3:D5:1D:F","vendorName":"Longer prefix vendor","private":false}',
+    '{"macPrefix":"70:B3:D5","vendorName":"IEEE Registration Authority","private":false}',
+    '{"macPrefix":"8C:1F:64:0A:1","vendorName":"Only longer prefix vendor","private":false}',
+    'not a json line',
+]
+
+
+def test_get_vendor():
+    oui_index = OUIIndex.from_mac_db(mac_db)
+    assert oui_index.get_vendor('08:00:27:7f:09:e1') == 'PCS Systemtechnik GmbH'
+    # the longest prefix wins over the OUI
+    assert oui_index.get_vendor('70:b3:d5:1d:f0:00') == 'Longer prefix vendor'
+    assert oui_index.get_vendor('70:b3:d5:1e:00:00') == 'IEEE Registration Authority'
+    assert oui_index.get_vendor('8c:1f:64:0a:10:00') == 'Only longer prefix vendor'
+    assert oui_index.get_vendor('8c:1f:64:0b:10:00') is False
+    assert oui_index.get_vendor('00:11:22:33:44:55') is False
+    assert len(oui_index) == 4
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / 'macaddress-db-index.json')
+    OUIIndex.from_mac_db(mac_db).save(path)
+    oui_index = OUIIndex.load(path)
+    assert oui_index.get_vendor('08:00:27:7f:09:e1') == 'PCS Systemtechnik GmbH'
+    assert oui_index.get_vendor('70:b3:d5:1d:f0:00') == 'Longer prefix vendor'
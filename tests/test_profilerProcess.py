@@ -187,3 +187,26 @@ def test_add_flow_to_profile(outputQueue, inputQueue, file, type_, database):
             database.get_altflow_from_uid(profileid, twid, uid) is not None
         )
     assert added_flow is not None
+
+
+def test_handle_flow_sharding(outputQueue, inputQueue):
+    profilerProcess = create_profilerProcess_instance(outputQueue, inputQueue)
+    profilerProcess.workers_queues = [inputQueue, inputQueue, inputQueue]
+    profilerProcess.workers_batches = [[], [], []]
+    profilerProcess.analysis_direction = 'out'
+    with open('dataset/test9-mixed-zeek-dir/conn.log') as f:
+        for _ in range(10):
+            sample_flow = {
+                'data': json.loads(f.readline()),
+                'type': 'conn'
+            }
+            assert profilerProcess.process_zeek_input(sample_flow)
+            profilerProcess.handle_flow()
+
+    # all flows of the same profile should be sent to the same worker
+    workers_of_each_ip = {}
+    for worker, batch in enumerate(profilerProcess.workers_batches):
+        for flow in batch:
+            workers_of_each_ip.setdefault(flow.saddr, set()).add(worker)
+    assert all(len(workers) == 1 for workers in workers_of_each_ip.values())
+    assert sum(len(batch) for batch in profilerProcess.workers_batches) == 10
@@ -0,0 +1,55 @@
+from ..modules.ip_info.rdns_resolver import RDNSResolver
+import time
+
+
+def stub_resolver(ip):
+    """a local resolver that knows 1 ip and is slow with another"""
+    if ip == '8.8.8.8':
+        return 'dns.google'
+    if ip == '1.2.3.4':
+        time.sleep(1)
+        return 'slow.example.com'
+    return False
+
+
+def test_lookup():
+    found = {}
+    resolver = RDNSResolver(
+        on_result=lambda ip, rdns: found.update({ip: rdns}),
+        resolve=stub_resolver,
+        timeout=0.5,
+    )
+    assert resolver.lookup('8.8.8.8').result() == 'dns.google'
+    assert found == {'8.8.8.8': 'dns.google'}
+    assert resolver.lookup('10.0.0.1').result() is False
+    # ips without a reverse dns aren't looked up again
+    assert resolver.lookup('10.0.0.1') is None
+    resolver.stop()
+
+
+def test_timeout():
+    resolver = RDNSResolver(resolve=stub_resolver, timeout=0.1)
+    slow_lookup = resolver.lookup('1.2.3.4')
+    # the slow lookup doesn't block the others
+    assert resolver.lookup('8.8.8.8').result() == 'dns.google'
+    assert slow_lookup.result() is False
+    assert resolver.is_negatively_cached('1.2.3.4')
+    resolver.stop()
+
+
+def test_waiting_for_a_thread():
+    resolver = RDNSResolver(resolve=stub_resolver, max_concurrent=1, timeout=0.5)
+    slow_lookup = resolver.lookup('1.2.3.4')
+    # waits for the slow lookup to finish, the time waiting doesn't count as timeout
+    assert resolver.lookup('8.8.8.8').result() == 'dns.google'
+    assert slow_lookup.result() is False
+    resolver.stop()
+
+
+def test_negative_cache_size():
+    resolver = RDNSResolver(resolve=stub_resolver, max_negative_cache=2)
+    for ip in ('10.0.0.1', '10.0.0.2', '10.0.0.3'):
+        resolver.lookup(ip).result()
+    # the oldest ip is forgotten
+    assert list(resolver.negative_cache) == ['10.0.0.2', '10.0.0.3']
+    resolver.stop()
@@ -0,0 +1,41 @@
+from ..slips_files.core.database.tw_scheduler import TWScheduler
+
+profileid_twid = 'profile_192.168.1.1_timewindow1'
+
+
+def create_tw_scheduler_instance():
+    # the timer thread doesn't flush anything during the tests
+    return TWScheduler(None, 3600)
+
+
+def test_modified():
+    tw_scheduler = create_tw_scheduler_instance()
+    # the first modification is published right away
+    assert tw_scheduler.modified([profileid_twid]) == [profileid_twid]
+    # the next ones in the same interval are published later
+    assert tw_scheduler.modified([profileid_twid]) == []
+    assert tw_scheduler.pending == {profileid_twid}
+    assert tw_scheduler.get_due() == []
+
+
+def test_get_due():
+    tw_scheduler = create_tw_scheduler_instance()
+    other_profileid_twid = 'profile_192.168.1.2_timewindow1'
+    tw_scheduler.modified([profileid_twid, other_profileid_twid])
+    tw_scheduler.modified([profileid_twid])
+    # the interval passed
+    tw_scheduler.last_published = {profileid_twid: 0, other_profileid_twid: 0}
+    assert tw_scheduler.get_due() == [profileid_twid]
+    assert tw_scheduler.pending == set()
+    # tws that weren't modified again are forgotten
+    assert list(tw_scheduler.last_published) == [profileid_twid]
+
+
+def test_get_due_all_pending():
+    tw_scheduler = create_tw_scheduler_instance()
+    tw_scheduler.modified([profileid_twid])
+    tw_scheduler.modified([profileid_twid])
+    # when stopping, the pending tws are published before the interval passes
+    assert tw_scheduler.get_due() == []
+    assert tw_scheduler.get_due(all_pending=True) == [profileid_twid]
+    assert tw_scheduler.pending == set()
@@ -93,3 +93,29 @@ def test_read_ports_info(outputQueue, database):
     org = json.loads(database.get_organization_of_port('65432/tcp'))
     assert 'org_name' in org
     assert org['org_name'] == 'Apple'
+
+
+def test_parse_ti_feed(outputQueue, database, tmp_path):
+    update_manager = create_update_manager_instance(outputQueue)
+    # store the feed in more than 1 chunk
+    update_manager.ti_chunk_size = 2
+    url = 'https://example.com/test_feed.csv'
+    update_manager.url_feeds = {url: {'threat_level': 'medium', 'tags': ['test']}}
+    feed = tmp_path / 'test_feed.csv'
+    feed.write_text(
+        '# ip,description\n'
+        '23.253.126.58,malicious ip\n'
+        '23.253.126.58,same ip twice\n'
+        '192.168.1.1,private ip\n'
+        'example-malicious.com,malicious domain\n'
+        '91.240.0.0/16,malicious range\n'
+    )
+    assert update_manager.parse_ti_feed(url, str(feed)) is True
+
+    ip_info = json.loads(database.search_IP_in_IoC('23.253.126.58'))
+    assert ip_info['source'] == 'test_feed.csv'
+    assert ip_info['threat_level'] == 'medium'
+    assert database.search_IP_in_IoC('192.168.1.1') is False
+    assert database.rcache.hget('IoC_domains', 'example-malicious.com')
+    assert database.rcache.hget('IoC_ip_ranges', '91.240.0.0/16')
+    assert update_manager.ips_ctr['23.253.126.58']['times_found'] == 1
@@ -46,3 +46,35 @@ def test_load_org_IPs(org, outputQueue, inputQueue, subnet):
     first_octet = subnet.split('.')[0]
     assert first_octet in whitelist.load_org_IPs(org)
     assert subnet in whitelist.load_org_IPs(org)[first_octet]
+
+
+def test_compiled_whitelist(outputQueue, inputQueue, database):
+    whitelist = create_whitelist_instance(outputQueue)
+    whitelist.read_whitelist()
+    compiled_whitelist = whitelist.get_compiled_whitelist()
+    assert '91.121.83.118' in compiled_whitelist.ips
+    assert 'microsoft' in compiled_whitelist.orgs
+    # subdomains of whitelisted domains are whitelisted too
+    assert compiled_whitelist.is_whitelisted_domain('www.apple.com', 'flows')
+    assert not compiled_whitelist.is_whitelisted_domain('notapple.com', 'flows')
+    assert compiled_whitelist.is_whitelisted_domain(
+        'example.com', 'flows', src_domains_of_flow=['apple.com']
+    )
+    # the alerts are checked using the compiled whitelist too
+    assert whitelist.is_whitelisted_domain('www.apple.com', '10.0.0.1', '1.1.1.1', 'alerts')
+    assert not whitelist.is_whitelisted_domain('notapple.com', '10.0.0.1', '1.1.1.1', 'alerts')
+    # re-reading whitelist.conf discards the compiled whitelist
+    whitelist.read_whitelist()
+    assert whitelist.compiled_whitelist is None
+
+
+def test_compiled_whitelist_version(outputQueue, inputQueue, database):
+    whitelist = create_whitelist_instance(outputQueue)
+    whitelist.version_check_interval = 0
+    whitelist.read_whitelist()
+    compiled_whitelist = whitelist.get_compiled_whitelist()
+    assert whitelist.get_compiled_whitelist() is compiled_whitelist
+    # another process stored a new whitelist
+    database.set_whitelist('IPs', {})
+    assert whitelist.get_compiled_whitelist() is not compiled_whitelist
+    assert not whitelist.get_compiled_whitelist().ips
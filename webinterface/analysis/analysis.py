@@ -172,10 +172,9 @@ def set_intuples(profile, timewindow):
     :return: (tuple, string, ip_info)
     """
     data = []
-    if intuples := __database__.db.hget(
-        f"profile_{profile}_{timewindow}", 'InTuples'
+    if intuples := __database__.get_tuples(
+        f"profile_{profile}", timewindow, 'InTuples'
     ):
-        intuples = json.loads(intuples)
         for key, value in intuples.items():
             ip, port, protocol = key.split("-")
             ip_info = get_ip_info(ip)
@@ -198,10 +197,9 @@ def set_outtuples(profile, timewindow):
     """
 
     data = []
-    if outtuples := __database__.db.hget(
-        f"profile_{profile}_{timewindow}", 'OutTuples'
+    if outtuples := __database__.get_tuples(
+        f"profile_{profile}", timewindow, 'OutTuples'
     ):
-        outtuples = json.loads(outtuples)
 
         for key, value in outtuples.items():
             ip, port, protocol = key.split("-")
@@ -222,12 +220,8 @@ def set_timeline_flows(profile, timewindow):
     :return: list of timeline flows as set initially in database
     """
     data = []
-    if timeline_flows := __database__.db.hgetall(
-        f"profile_{profile}_{timewindow}_flows"
-    ):
-        for key, value in timeline_flows.items():
-            value = json.loads(value)
-
+    if timeline_flows := __database__.get_flows(f"profile_{profile}", timewindow):
+        for value in timeline_flows:
             # convert timestamp to date
             timestamp = value["ts"]
             dt_obj = ts_to_date(timestamp, seconds=True)
@@ -322,10 +316,12 @@ def set_evidence(profile, timewindow, alert_id):
         alerts = json.loads(alerts)
         alerts_tw = alerts[timewindow]
         evidence_ID_list = alerts_tw[alert_id]
-        evidences = __database__.db.hget("evidence" + "profile_" + profile, timewindow)
-        evidences = json.loads(evidences)
+        evidences = __database__.get_evidence(f"profile_{profile}", timewindow)
 
         for evidence_ID in evidence_ID_list:
+            if evidence_ID not in evidences:
+                # deleted after the alert, it was whitelisted
+                continue
             temp_evidence = json.loads(evidences[evidence_ID])
             if "source_target_tag" not in temp_evidence:
                 temp_evidence["source_target_tag"] = "-"
@@ -342,10 +338,7 @@ def set_evidence_general(profile, timewindow):
     :return: {"data": data} where data is a list of evidences
     """
     data = []
-    if evidence := __database__.db.hget(
-        "evidence" + "profile_" + profile, timewindow
-    ):
-        evidence = json.loads(evidence)
+    if evidence := __database__.get_evidence(f"profile_{profile}", timewindow):
         for id, content in evidence.items():
             content = json.loads(content)
             if "source_target_tag" not in content:
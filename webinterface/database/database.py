@@ -1,4 +1,9 @@
 import redis
+import json
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
 from .signals import message_sent
 from utils import *
 
@@ -6,24 +11,77 @@ from utils import *
 class Database(object):
     def __init__(self):
         self.db = self.init_db()
+        # msgpack flows aren't utf-8, they're read without decoding the responses
+        self.rawdb = self.init_db(decode_responses=False)
         self.cachedb = self.connect_to_database(port=6379, db_number=1) # default cache
 
     def set_db(self, port, db_number):
         self.db = self.connect_to_database(port, db_number)
+        self.rawdb = self.connect_to_database(port, db_number, decode_responses=False)
 
     def set_cachedb(self, port, db_number):
         self.cachedb = self.connect_to_database(port, db_number)
 
-    def init_db(self):
+    def init_db(self, decode_responses=True):
         available_dbs = read_db_file()
         port, db_number = 6379, 0
    
         if len(available_dbs) >= 1:
             port = available_dbs[-1]["redis_port"]
         
-        return self.connect_to_database(port, db_number)
+        return self.connect_to_database(port, db_number, decode_responses=decode_responses)
 
-    def connect_to_database(self, port=6379, db_number=0):
+    def get_tuples(self, profileid, twid, direction) -> dict:
+        """
+        returns the tuples of this tw in the format {tupleid: [letters, previous_two_timestamps]}
+        slips stores the letters of each tuple in its own key
+        :param direction: 'InTuples' or 'OutTuples'
+        """
+        tuples_key = f'{profileid}_{twid}_{direction}'
+        timestamps = self.db.hgetall(tuples_key)
+        tupleids = list(timestamps)
+        if not tupleids:
+            return {}
+        letters = self.db.mget([f'{tuples_key}_{tupleid}' for tupleid in tupleids])
+        return {
+            tupleid: [tuple_letters, json.loads(timestamps[tupleid])]
+            for tupleid, tuple_letters in zip(tupleids, letters)
+        }
+
+    def get_evidence(self, profileid, twid) -> dict:
+        """
+        returns the evidence of this tw in the format {evidence ID: serialized evidence}
+        slips stores each evidence in its own field of the tw evidence hash,
+        dbs saved by older versions have all of them in the evidence<profileid> hash
+        """
+        evidence_key = f'{profileid}_{twid}_evidence'
+        IDs = self.db.zrange(f'{evidence_key}_order', 0, -1)
+        if not IDs:
+            if legacy_evidence := self.db.hget(f'evidence{profileid}', twid):
+                return json.loads(legacy_evidence)
+            return {}
+        evidence = self.db.hmget(evidence_key, IDs)
+        return {
+            ID: evidence_details
+            for ID, evidence_details in zip(IDs, evidence)
+            if evidence_details
+        }
+
+    def get_flows(self, profileid, twid) -> list:
+        """
+        returns the flows of this tw as a list of dicts
+        slips stores them as json or msgpack depending on the flow_codec in slips.conf,
+        json flows start with '{'
+        """
+        flows = []
+        for flow in self.rawdb.hvals(f'{profileid}_{twid}_flows'):
+            if flow[:1] == b'{':
+                flows.append(json.loads(flow))
+            else:
+                flows.append(msgpack.unpackb(flow, raw=False))
+        return flows
+
+    def connect_to_database(self, port=6379, db_number=0, decode_responses=True):
 
         return redis.StrictRedis(host='localhost',
                                  port=port,
@@ -31,7 +89,7 @@ class Database(object):
                                  charset="utf-8",
                                  socket_keepalive=True,
                                  retry_on_timeout=True,
-                                 decode_responses=True,
+                                 decode_responses=decode_responses,
                                  health_check_interval=30)
 
 
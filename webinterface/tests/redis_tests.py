@@ -59,18 +59,17 @@ def test_type_tws_correct():
 
 
 def test_type_outtuples_correct():
-  test_key = "profile_188.110.58.51_timewindow1"
-  test_field = "OutTuples"
+  # the previous_two_timestamps of each tuple
+  test_key = "profile_188.110.58.51_timewindow1_OutTuples"
   assert __database__.type(test_key) == TYPE_HASH
 
-  outtuples = __database__.hget(test_key, test_field)
-  assert is_json(outtuples) is True
+  outtuples = __database__.hgetall(test_key)
+  tupleid, timestamps = list(outtuples.items())[0]
+  assert is_json(timestamps) is True
+  assert type(json.loads(timestamps)) is list
 
-  outtuples = json.loads(outtuples)
-  assert type(outtuples) is dict
-
-  first_keypair = list(outtuples.items())[0]
-  assert type(first_keypair[1]) is list
+  # the letters of each tuple are stored in their own key
+  assert __database__.type(f"{test_key}_{tupleid}") == 'string'
 
 
 def test_type_IPsInfo_correct():